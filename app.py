@@ -1,12 +1,31 @@
+import argparse
 import json
 import os
-from flask import Flask, render_template, request
+import re
+import sys
+import tempfile
+from flask import Flask, Response, jsonify, render_template, request, stream_with_context
 from datetime import datetime, timedelta
 from collections import defaultdict
 import pytz  # For timezone handling, if needed in the future
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from utils.backfill import AGGREGATES, Backfill
+from utils.export import DATASETS, FORMATS, Exporter, resolve_format
+from utils.focus_sessions import FocusSessionStore
+from utils.json_stream import ArrayIndex, iter_json_array, iter_log
+from utils.merge import ActivityMerger, DeviceSource
+from utils.metrics import metrics, render_prometheus
+from utils.retention import WINDOW_TYPES
+from utils.search_index import SearchIndex
+from utils.rollups import GRANULARITIES, RollupStore
+
 app = Flask(__name__)
 
+LOGS_DIR = os.path.join(os.path.dirname(__file__), "logs")
+USERS_DIR = os.path.join(os.path.dirname(__file__), "users")
+USER_NAME_PATTERN = re.compile(r"^[\w-][\w.-]*$")
+
 
 # --- Helper Functions ---
 def format_timedelta(td):
@@ -37,35 +56,19 @@ def format_datetime_obj(dt_obj, format_str="%Y-%m-%d %H:%M:%S"):
 
 def load_and_process_data(filepath, selected_date_str=None):
     """Loads and processes the activity log data for a selected date."""
-    try:
-        with open(filepath, "r") as f:
-            all_logs_raw = json.load(f)
-    except FileNotFoundError:
+    if not os.path.exists(filepath):
         return {"error": "Data file not found. Please create logs/activity_data.json"}
-    except json.JSONDecodeError:
-        return {"error": "Error decoding JSON data. Please check the file format."}
-
-    if not isinstance(all_logs_raw, list):
-        return {"error": "Data should be a list of log entries."}
-
-    # Parse all logs and extract available dates
-    parsed_logs = []
-    available_dates = set()
-    for log_raw in all_logs_raw:
-        try:
-            ts_obj = datetime.fromisoformat(log_raw["timestamp"])
-            parsed_logs.append({**log_raw, "timestamp_obj": ts_obj})
-            available_dates.add(ts_obj.strftime("%Y-%m-%d"))
-        except (KeyError, TypeError, ValueError) as e:
-            # Skip logs with invalid timestamps but log an issue (optional)
-            print(
-                f"Skipping log due to timestamp error: {e} in {log_raw}"
-            )  # Server-side log
-            continue
 
+    # Dates come from the log's offset index, only the selected day is read
+    index = ArrayIndex(filepath)
+    try:
+        index.refresh()
+    except ValueError as e:
+        return {"error": f"Error reading the data file: {e}"}
+    available_dates = index.days()
     sorted_available_dates = sorted(list(available_dates), reverse=True)
 
-    if not parsed_logs:
+    if not available_dates:
         return {
             "error": "No valid log entries found in the data file.",
             "available_dates": [],
@@ -75,21 +78,26 @@ def load_and_process_data(filepath, selected_date_str=None):
     # Determine current selected date
     if selected_date_str and selected_date_str in available_dates:
         current_selected_date = selected_date_str
-    elif sorted_available_dates:
+    else:
         current_selected_date = sorted_available_dates[
             0
         ]  # Default to the latest date with data
-    else:  # Should not happen if parsed_logs is not empty, but as a fallback
-        current_selected_date = datetime.now().strftime(
-            "%Y-%m-%d"
-        )  # Fallback to actual today
-
-    # Filter logs for the selected date
-    logs_for_day = [
-        log
-        for log in parsed_logs
-        if log["timestamp_obj"].strftime("%Y-%m-%d") == current_selected_date
-    ]
+
+    # Read the logs for the selected date
+    day_begin = datetime.strptime(current_selected_date, "%Y-%m-%d")
+    day_finish = day_begin + timedelta(days=1)
+    logs_for_day = []
+    for log_raw in iter_log(filepath, day_begin, day_finish, index=index):
+        try:
+            ts_obj = datetime.fromisoformat(log_raw["timestamp"])
+        except (KeyError, TypeError, ValueError) as e:
+            # Skip logs with invalid timestamps but log an issue (optional)
+            print(
+                f"Skipping log due to timestamp error: {e} in {log_raw}"
+            )  # Server-side log
+            continue
+        if day_begin <= ts_obj < day_finish:
+            logs_for_day.append({**log_raw, "timestamp_obj": ts_obj})
     logs_for_day.sort(
         key=lambda x: x["timestamp_obj"]
     )  # Ensure logs for the day are sorted
@@ -108,59 +116,49 @@ def load_and_process_data(filepath, selected_date_str=None):
         day_start_time = logs_for_day[0]["timestamp_obj"]
         day_end_time = logs_for_day[-1]["timestamp_obj"]
 
-        # --- Process Focus Sessions for the day ---
-        current_focus_session = None
-        for log in logs_for_day:
-            timestamp = log["timestamp_obj"]
-            if log["type"] == "focus_mode_start":
-                current_focus_session = {
-                    "start": timestamp,
-                    "description": log.get("data", {}).get(
-                        "description", "No description"
-                    ),
+        # --- Focus Sessions overlapping the day, counted only for the part inside it ---
+        store = load_focus_sessions(os.path.dirname(filepath))
+        for session in store.sessions_between(day_begin, day_finish):
+            end = session["end"]
+            duration = min(end or session["last_seen"], day_finish) - max(session["start"], day_begin)
+            focus_sessions.append(
+                {
+                    "start": session["start"],
+                    "end": end,
+                    "description": session["description"] or "No description",
+                    "interruptions": session["interruptions"],
+                    "duration": duration,
+                    "duration_str": format_timedelta(duration) + (" so far" if end is None else ""),
                 }
-            elif log["type"] == "focus_mode_end" and current_focus_session:
-                # Ensure the focus session started on the same day or before, and ended on this day
-                if (
-                    current_focus_session["start"].strftime("%Y-%m-%d")
-                    <= current_selected_date
-                ):
-                    current_focus_session["end"] = timestamp
-                    duration = (
-                        current_focus_session["end"] - current_focus_session["start"]
-                    )
-                    current_focus_session["duration"] = duration
-                    current_focus_session["duration_str"] = format_timedelta(duration)
-                    total_focus_duration += duration
-                    focus_sessions.append(current_focus_session)
-                current_focus_session = None
-        # If a focus session is still active at the end of the day's logs (or data)
-        if (
-            current_focus_session
-            and current_focus_session["start"].strftime("%Y-%m-%d")
-            == current_selected_date
-        ):
-            # Optionally, mark as ongoing or calculate duration up to day_end_time
-            # For simplicity, we'll only count fully ended sessions within the day or those ending on the day.
-            pass
+            )
+            total_focus_duration += duration
 
         # --- Process Application Usage for the day ---
-        for i in range(len(logs_for_day) - 1):
-            current_log = logs_for_day[i]
-            next_log = logs_for_day[i + 1]
-            if current_log["type"] == "window_info":
-                try:
-                    start_time = current_log["timestamp_obj"]
-                    end_time = next_log["timestamp_obj"]
-                    duration = end_time - start_time
-                    if duration > timedelta(seconds=0):
-                        data = current_log.get("data", {})
-                        process_name = data.get("process_name", "Unknown Process")
-                        window_title = data.get("window_title", "Unknown Title")
-                        app_usage_data[process_name][window_title] += duration
-                        total_screen_time += duration
-                except (KeyError, TypeError, ValueError):
+        for i, current_log in enumerate(logs_for_day):
+            try:
+                data = current_log.get("data", {})
+                if current_log["type"] == "window_info" and i + 1 < len(logs_for_day):
+                    duration = logs_for_day[i + 1]["timestamp_obj"] - current_log["timestamp_obj"]
+                elif current_log["type"] == "window_run":
+                    # Samples merged by retention carry the time they covered
+                    duration = timedelta(seconds=data.get("duration", 0))
+                else:
                     continue
+                if duration > timedelta(seconds=0):
+                    process_name = data.get("process_name", "Unknown Process")
+                    window_title = data.get("window_title", "Unknown Title")
+                    app_usage_data[process_name][window_title] += duration
+                    total_screen_time += duration
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        # Window entries of days past retention are gone, their totals live on in the rollups
+        if not any(log["type"] in WINDOW_TYPES for log in logs_for_day):
+            bucket = load_rollups(os.path.dirname(filepath)).levels["day"].get(current_selected_date)
+            if bucket:
+                for process_name, seconds in bucket["apps"].items():
+                    app_usage_data[process_name]["(window titles expired)"] += timedelta(seconds=seconds)
+                total_screen_time += timedelta(seconds=bucket["screen"])
 
         # --- Process AI Analysis for Distractions for the day ---
         for i, log in enumerate(logs_for_day):
@@ -169,7 +167,7 @@ def load_and_process_data(filepath, selected_date_str=None):
                 if analysis_data.get("is_distracted", False):
                     window_title, process_name = "N/A", "N/A"
                     for j in range(i - 1, -1, -1):
-                        if logs_for_day[j]["type"] == "window_info":
+                        if logs_for_day[j]["type"] in WINDOW_TYPES:
                             window_data = logs_for_day[j].get("data", {})
                             window_title = window_data.get("window_title", "N/A")
                             process_name = window_data.get("process_name", "N/A")
@@ -199,6 +197,11 @@ def load_and_process_data(filepath, selected_date_str=None):
                 details = "Focus session ended."
             elif log_entry["type"] == "window_info":
                 details = f"App: {data.get('process_name', 'N/A')} - Title: {data.get('window_title', 'N/A')}"
+            elif log_entry["type"] == "window_run":
+                details = (
+                    f"App: {data.get('process_name', 'N/A')} - Title: {data.get('window_title', 'N/A')} "
+                    f"({format_timedelta(timedelta(seconds=data.get('duration', 0)))}, {data.get('samples', 0)} samples)"
+                )
             elif log_entry["type"] == "ai_analysis":
                 analysis = data.get("analysis", {})
                 status = (
@@ -206,6 +209,9 @@ def load_and_process_data(filepath, selected_date_str=None):
                 )
                 reason = analysis.get("reason", "")
                 details = f"Status: {status}. Reason: {reason[:100]}{'...' if len(reason) > 100 else ''}"
+            elif log_entry["type"] == "warning":
+                warning = data.get("warning", {})
+                details = f"Repeat warning, lockout {warning.get('timeout', 0)}s (strike {warning.get('strikes', 1)})"
             timeline_events.append(
                 {"timestamp_str": ts_str, "type": event_type, "details": details}
             )
@@ -270,14 +276,181 @@ def load_and_process_data(filepath, selected_date_str=None):
     }
 
 
+def get_logs_dir(user=None):
+    """Returns the logs directory for a merged per-user store, or the local one."""
+    if not user:
+        return LOGS_DIR
+    if not USER_NAME_PATTERN.match(user):
+        raise ValueError(f"Invalid user name: {user}")
+    return os.path.join(USERS_DIR, user, "logs")
+
+
+def merge_into_user_store(user, sources):
+    """Merges device sources into a user's store and returns the merge stats."""
+    store_dir = os.path.dirname(get_logs_dir(user))
+    return ActivityMerger(store_dir).merge(sources)
+
+
+def iter_activity_log(logs_dir):
+    """Streams the raw log entries, stopping at the first malformed part."""
+    try:
+        yield from iter_json_array(os.path.join(logs_dir, "activity_data.json"), strict=False)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error reading activity log: {e}")
+
+
+def load_rollups(logs_dir, force_rebuild=False):
+    """Loads the pre-aggregated rollups, building them from the raw log if missing."""
+    store = RollupStore(os.path.join(logs_dir, "rollups.json"))
+    if force_rebuild or not store.load():
+        store.rebuild(iter_activity_log(logs_dir))
+        store.flush()
+    return store
+
+
+def load_focus_sessions(logs_dir, force_rebuild=False):
+    """Loads the focus session index, building it from the raw log if missing."""
+    store = FocusSessionStore(os.path.join(logs_dir, "focus_sessions.json"))
+    if force_rebuild or not store.load():
+        store.rebuild(iter_activity_log(logs_dir))
+        store.save()
+    return store
+
+
+# Search indexes stay loaded between requests until the file changes
+_search_indexes = {}
+
+
+def load_search_index(logs_dir, force_rebuild=False):
+    """Loads the window title search index, building it from the raw log if missing."""
+    path = os.path.join(logs_dir, "search_index.json")
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    cached = _search_indexes.get(path)
+    if cached and cached[0] == mtime and mtime is not None and not force_rebuild:
+        return cached[1]
+    store = SearchIndex(path)
+    if force_rebuild or not store.load():
+        store.rebuild(iter_activity_log(logs_dir))
+        store.flush()
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    _search_indexes[path] = (mtime, store)
+    return store
+
+
+def process_search_data(store, query, from_str=None, to_str=None):
+    """Builds the search results for a query, optionally limited to a date range."""
+    try:
+        from_date = datetime.strptime(from_str, "%Y-%m-%d") if from_str else None
+        # The end date is inclusive, so search up to the start of the next day
+        to_date = datetime.strptime(to_str, "%Y-%m-%d") + timedelta(days=1) if to_str else None
+    except ValueError:
+        return {"error": "Dates must be in YYYY-MM-DD format."}
+
+    result = store.search(query, from_date, to_date) if query else {
+        "total_seconds": 0, "window_count": 0, "matches": []
+    }
+    max_seconds = max((match["total_seconds"] for match in result["matches"]), default=1) or 1
+    for match in result["matches"]:
+        match["total_duration_str"] = format_timedelta(timedelta(seconds=match["total_seconds"]))
+        for span in match["spans"]:
+            start = datetime.fromisoformat(span["start"])
+            end = datetime.fromisoformat(span["end"])
+            span["start_str"] = format_datetime_obj(start, "%Y-%m-%d %H:%M")
+            span["end_str"] = format_datetime_obj(end, "%H:%M")
+            span["date"] = start.strftime("%Y-%m-%d")
+
+    return {
+        "query": query,
+        "from_date": from_str or "",
+        "to_date": to_str or "",
+        "total_seconds": result["total_seconds"],
+        "total_duration_str": format_timedelta(timedelta(seconds=result["total_seconds"])),
+        "window_count": result["window_count"],
+        "matches": result["matches"],
+        "max_seconds": max_seconds,
+    }
+
+
+def process_range_data(store, from_str=None, to_str=None, granularity="day"):
+    """Builds the template context for a multi-day range from the rollups."""
+    if granularity not in GRANULARITIES:
+        return {"error": f"Unknown granularity '{granularity}'. Use one of: {', '.join(GRANULARITIES)}."}
+
+    try:
+        latest_date = (
+            store.last_timestamp.date() if store.last_timestamp else datetime.now().date()
+        )
+        to_date = datetime.strptime(to_str, "%Y-%m-%d").date() if to_str else latest_date
+        from_date = (
+            datetime.strptime(from_str, "%Y-%m-%d").date()
+            if from_str
+            else to_date - timedelta(days=6)
+        )
+    except ValueError:
+        return {"error": "Dates must be in YYYY-MM-DD format."}
+
+    result = store.query(from_date, to_date, granularity)
+    totals = result["totals"]
+
+    app_totals = sorted(totals["apps"].items(), key=lambda x: x[1], reverse=True)
+    max_app_seconds = int(app_totals[0][1]) if app_totals else 1
+    app_usage = [
+        {
+            "name": name,
+            "total_duration_seconds": int(seconds),
+            "total_duration_str": format_timedelta(timedelta(seconds=seconds)),
+        }
+        for name, seconds in app_totals
+        if int(seconds) > 0
+    ]
+
+    series = []
+    for key, bucket in result["series"]:
+        top_app = max(bucket["apps"].items(), key=lambda x: x[1])[0] if bucket["apps"] else "N/A"
+        series.append(
+            {
+                "bucket": key.replace("T", " "),
+                "screen_time_str": format_timedelta(timedelta(seconds=bucket["screen"])),
+                "screen_seconds": int(bucket["screen"]),
+                "focus_str": format_timedelta(timedelta(seconds=bucket["focus"])),
+                "distractions": bucket["distractions"],
+                "top_app": top_app,
+            }
+        )
+    max_bucket_seconds = max((row["screen_seconds"] for row in series), default=1) or 1
+
+    return {
+        "from_date": from_date.strftime("%Y-%m-%d"),
+        "to_date": to_date.strftime("%Y-%m-%d"),
+        "granularity": granularity,
+        "granularities": GRANULARITIES,
+        "summary_stats": {
+            "total_screen_time_str": format_timedelta(timedelta(seconds=totals["screen"])),
+            "total_focus_duration_str": format_timedelta(timedelta(seconds=totals["focus"])),
+            "total_distractions": totals["distractions"],
+            "total_analyses": totals["analyses"],
+        },
+        "app_usage": app_usage,
+        "max_app_seconds": max_app_seconds,
+        "series": series,
+        "max_bucket_seconds": max_bucket_seconds,
+    }
+
+
 @app.route("/")
 def index():
-    data_filepath = os.path.join(
-        os.path.dirname(__file__), "logs", "activity_data.json"
-    )
+    try:
+        logs_dir = get_logs_dir(request.args.get("user"))
+    except ValueError as e:
+        return render_template("error.html", message=str(e))
+    data_filepath = os.path.join(logs_dir, "activity_data.json")
     selected_date_str = request.args.get("date")  # Get date from URL query parameter
 
-    processed_data = load_and_process_data(data_filepath, selected_date_str)
+    with metrics.timer("dashboard_render_seconds", "Time to build dashboard views", view="index"):
+        processed_data = load_and_process_data(data_filepath, selected_date_str)
 
     if "error" in processed_data and processed_data["error"] not in [
         "No valid log entries found in the data file."
@@ -287,8 +460,196 @@ def index():
     return render_template("index.html", **processed_data)
 
 
-if __name__ == "__main__":
-    logs_dir = os.path.join(os.path.dirname(__file__), "logs")
+@app.route("/range")
+def range_view():
+    try:
+        logs_dir = get_logs_dir(request.args.get("user"))
+    except ValueError as e:
+        return render_template("error.html", message=str(e))
+    with metrics.timer("dashboard_render_seconds", view="range"):
+        store = load_rollups(logs_dir, force_rebuild=request.args.get("rebuild") == "1")
+        processed_data = process_range_data(
+            store,
+            request.args.get("from"),
+            request.args.get("to"),
+            request.args.get("granularity", "day"),
+        )
+    if "error" in processed_data:
+        return render_template("error.html", message=processed_data["error"])
+    return render_template("range.html", **processed_data)
+
+
+@app.route("/search")
+def search_view():
+    """Window title search; ?q= takes words, word* prefixes and "quoted phrases"."""
+    try:
+        logs_dir = get_logs_dir(request.args.get("user"))
+    except ValueError as e:
+        return render_template("error.html", message=str(e))
+    with metrics.timer("dashboard_render_seconds", view="search"):
+        store = load_search_index(logs_dir, force_rebuild=request.args.get("rebuild") == "1")
+        processed_data = process_search_data(
+            store,
+            request.args.get("q", "").strip(),
+            request.args.get("from"),
+            request.args.get("to"),
+        )
+    if "error" in processed_data:
+        if request.args.get("format") == "json":
+            return jsonify(processed_data), 400
+        return render_template("error.html", message=processed_data["error"])
+    if request.args.get("format") == "json":
+        return jsonify(processed_data)
+    return render_template("search.html", **processed_data)
+
+
+@app.route("/metrics")
+def metrics_view():
+    """Prometheus text export of the monitor's latest snapshot plus the dashboard's own metrics."""
+    try:
+        with open(os.path.join(LOGS_DIR, "metrics.json"), "r") as f:
+            monitor_snapshot = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        monitor_snapshot = {}
+    body = render_prometheus(monitor_snapshot) + render_prometheus(metrics.snapshot())
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
+def iter_file_and_remove(path, block_size=1024 * 1024):
+    """Streams a file in blocks and deletes it once it has been sent."""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                yield block
+    finally:
+        os.remove(path)
+
+
+@app.route("/export")
+def export_view():
+    """Flat export of a dataset; ?dataset=, format=csv|parquet|npz|columnar, from=, to= and repeated type=."""
+    try:
+        logs_dir = get_logs_dir(request.args.get("user"))
+        dataset = request.args.get("dataset", "events")
+        export_format = resolve_format(request.args.get("format", "csv"))
+        exporter = Exporter(
+            logs_dir, dataset,
+            start=request.args.get("from") or None,
+            end=request.args.get("to") or None,
+            types=request.args.getlist("type"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filename = f"{dataset}.{export_format}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if export_format == "csv":
+        return Response(stream_with_context(exporter.iter_csv()), mimetype="text/csv", headers=headers)
+
+    # Columnar files are only complete once closed, so they are written to a temporary file first
+    fd, export_path = tempfile.mkstemp(suffix=f".{export_format}")
+    os.close(fd)
+    try:
+        with metrics.timer("dashboard_render_seconds", view="export"):
+            exporter.write(export_path, export_format)
+    except ValueError as e:
+        os.remove(export_path)
+        return jsonify({"error": str(e)}), 400
+    return Response(iter_file_and_remove(export_path), mimetype="application/octet-stream", headers=headers)
+
+
+@app.route("/ingest", methods=["POST"])
+def ingest():
+    """Merges an uploaded activity_data.json export from one device into a user store."""
+    user = request.form.get("user", "")
+    device = request.form.get("device", "")
+    upload = request.files.get("file")
+    if not USER_NAME_PATTERN.match(user) or not USER_NAME_PATTERN.match(device):
+        return jsonify({"error": "Both 'user' and 'device' are required."}), 400
+    if upload is None:
+        return jsonify({"error": "No export file uploaded."}), 400
+
+    fd, upload_path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        upload.save(upload_path)
+        stats = merge_into_user_store(user, [DeviceSource(device, upload_path)])
+    except (ValueError, json.JSONDecodeError) as e:
+        return jsonify({"error": f"Could not read export: {e}"}), 400
+    finally:
+        os.remove(upload_path)
+    return jsonify(stats)
+
+
+def parse_device_arg(value):
+    """Parses a NAME=PATH device argument."""
+    name, sep, path = value.partition("=")
+    if not sep or not USER_NAME_PATTERN.match(name):
+        raise argparse.ArgumentTypeError("devices must be given as NAME=PATH")
+    return DeviceSource(name, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Screen Nanny activity dashboard")
+    subparsers = parser.add_subparsers(dest="command")
+    merge_parser = subparsers.add_parser(
+        "merge", help="Merge logs from several device directories into a user store"
+    )
+    merge_parser.add_argument("--user", required=True)
+    merge_parser.add_argument(
+        "--device", action="append", type=parse_device_arg, required=True,
+        help="NAME=PATH of a device directory or exported activity_data.json",
+    )
+    backfill_parser = subparsers.add_parser(
+        "backfill", help="Rebuild the rollups, search index and focus sessions from the log on every core"
+    )
+    backfill_parser.add_argument("--user", help="a merged user store instead of the local logs")
+    backfill_parser.add_argument("--workers", type=int, help="worker processes, defaults to the number of cores")
+    backfill_parser.add_argument(
+        "--only", action="append", choices=sorted(AGGREGATES),
+        help="only rebuild this store, can be given more than once",
+    )
+    export_parser = subparsers.add_parser(
+        "export", help="Export events, window runs, focus sessions or verdicts to CSV, Parquet or .npz"
+    )
+    export_parser.add_argument("dataset", choices=DATASETS)
+    export_parser.add_argument("--out", required=True, help="output file, its extension picks the format")
+    export_parser.add_argument(
+        "--format", choices=FORMATS + ("columnar",),
+        help="columnar is Parquet if pyarrow is installed, .npz otherwise",
+    )
+    export_parser.add_argument("--from", dest="start", help="first day, YYYY-MM-DD")
+    export_parser.add_argument("--to", dest="end", help="last day, YYYY-MM-DD")
+    export_parser.add_argument("--type", action="append", help="only events of this type, can be given more than once")
+    export_parser.add_argument("--user", help="a merged user store instead of the local logs")
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        stats = merge_into_user_store(args.user, args.device)
+        print(json.dumps(stats, indent=2))
+        return
+    if args.command == "backfill":
+        stats = Backfill(get_logs_dir(args.user), aggregates=args.only, workers=args.workers).run()
+        print(json.dumps(stats, indent=2) if stats else "No activity log to backfill from")
+        return
+
+    if args.command == "export":
+        try:
+            exporter = Exporter(get_logs_dir(args.user), args.dataset, args.start, args.end, args.type)
+            stats = exporter.write(args.out, args.format)
+        except ValueError as e:
+            parser.error(str(e))
+        print(json.dumps(stats, indent=2))
+        return
+
+    serve()
+
+
+def serve():
+    logs_dir = LOGS_DIR
     if not os.path.exists(logs_dir):
         os.makedirs(logs_dir)
         print(f"Created directory: {logs_dir}")
@@ -312,3 +673,7 @@ if __name__ == "__main__":
             """
             )
     app.run(debug=True, port=4729)
+
+
+if __name__ == "__main__":
+    main()
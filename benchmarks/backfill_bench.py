@@ -0,0 +1,101 @@
+"""
+Backfill scaling: rebuilding the rollups, search index and focus sessions
+from a synthetic year of activity with 1, 2, 4, ... worker processes (see
+src/utils/backfill.py), against the single-process rebuild the monitor does
+at startup.
+
+Every run starts cold, without the log's offset index or checkpoints.
+Speedup is relative to one worker and efficiency is speedup per worker, so
+near-linear scaling shows up as an efficiency close to 1 up to the number
+of cores.
+
+    python benchmarks/backfill_bench.py --days 365 --active-hours 1
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from utils.backfill import Backfill
+from utils.focus_sessions import FocusSessionStore
+from utils.json_stream import iter_json_array
+from utils.rollups import RollupStore
+from utils.search_index import SearchIndex
+from utils.synthetic import SyntheticActivity
+
+
+def reset(log_dir):
+    """Remove everything but the log, so the next run starts cold"""
+    for name in os.listdir(log_dir):
+        if name == "activity_data.json":
+            continue
+        path = os.path.join(log_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def sequential(log_dir):
+    log_path = os.path.join(log_dir, "activity_data.json")
+    start = time.perf_counter()
+    for store in (RollupStore(os.path.join(log_dir, "rollups.json")),
+                  SearchIndex(os.path.join(log_dir, "search_index.json")),
+                  FocusSessionStore(os.path.join(log_dir, "focus_sessions.json"))):
+        store.rebuild(iter_json_array(log_path))
+    return time.perf_counter() - start
+
+
+def worker_counts(maximum):
+    counts = [1]
+    while counts[-1] * 2 <= maximum:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != maximum:
+        counts.append(maximum)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--active-hours", type=int, default=1, help="hours of activity per synthetic day")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="screen-nanny-backfill-")
+    try:
+        log_path = os.path.join(workdir, "activity_data.json")
+        entries = SyntheticActivity(days=args.days, active_hours=args.active_hours, seed=1).write(log_path)
+        print(f"{entries:,} entries over {args.days} days, {os.path.getsize(log_path) / 1e6:.1f} MB, "
+              f"{os.cpu_count()} cores")
+
+        results = {"backfill.sequential": {"value": sequential(workdir), "unit": "s"}}
+        reset(workdir)
+        single = None
+        for workers in worker_counts(args.max_workers):
+            stats = Backfill(workdir, workers=workers, progress=lambda progress: None).run()
+            reset(workdir)
+            single = single or stats["seconds"]
+            speedup = single / stats["seconds"]
+            results[f"backfill.workers_{workers}"] = {"value": stats["seconds"], "unit": "s"}
+            results[f"backfill.workers_{workers}.throughput"] = {"value": stats["entries_per_second"], "unit": "entries/s"}
+            results[f"backfill.workers_{workers}.speedup"] = {"value": speedup, "unit": "x"}
+            results[f"backfill.workers_{workers}.efficiency"] = {"value": speedup / workers, "unit": "ratio"}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, value in results.items():
+        print(f"{name:40} {value['value']:>12.6g} {value['unit']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Export throughput: every dataset of src/utils/export.py written as CSV and
+each installed columnar format (Parquet with pyarrow, .npz with NumPy)
+from a synthetic year of activity.
+
+Throughput is given both in rows written and in log entries read, since
+the derived datasets have far fewer rows than the log has entries. Each
+export runs in a fresh interpreter so its peak RSS can be reported; with
+chunked writers it should stay flat whatever the size of the log.
+
+    python benchmarks/export_bench.py --days 365 --active-hours 1
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from importlib.util import find_spec
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+
+from utils.export import DATASETS
+from utils.synthetic import SyntheticActivity
+
+# Prints the export stats and the peak RSS in bytes. On Linux ru_maxrss carries the parent's peak over fork and
+# exec, so it is read from VmHWM, which exec resets; on macOS ru_maxrss is already in bytes
+EXPORT_CODE = """
+import json, resource, sys
+from utils.export import Exporter
+stats = Exporter(sys.argv[1], sys.argv[2]).write(sys.argv[3], sys.argv[4])
+if sys.platform.startswith("linux"):
+    with open("/proc/self/status") as status:
+        stats["peak_rss"] = next(int(line.split()[1]) * 1024 for line in status if line.startswith("VmHWM:"))
+else:
+    stats["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps(stats))
+"""
+
+
+def formats():
+    available = ["csv"]
+    if find_spec("pyarrow"):
+        available.append("parquet")
+    if find_spec("numpy"):
+        available.append("npz")
+    return available
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--active-hours", type=int, default=1, help="hours of activity per synthetic day")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="screen-nanny-export-")
+    results = {}
+    try:
+        log_path = os.path.join(workdir, "activity_data.json")
+        entries = SyntheticActivity(days=args.days, active_hours=args.active_hours, seed=1).write(log_path)
+        print(f"{entries:,} entries over {args.days} days, {os.path.getsize(log_path) / 1e6:.1f} MB")
+
+        for dataset in DATASETS:
+            for export_format in formats():
+                out = os.path.join(workdir, f"{dataset}.{export_format}")
+                proc = subprocess.run([sys.executable, "-c", EXPORT_CODE, workdir, dataset, out, export_format],
+                                      cwd=SRC, capture_output=True, text=True, check=True)
+                stats = json.loads(proc.stdout.strip().splitlines()[-1])
+                name = f"export.{dataset}.{export_format}"
+                results[f"{name}.seconds"] = {"value": stats["seconds"], "unit": "s"}
+                results[f"{name}.rows_per_second"] = {"value": stats["rows_per_second"], "unit": "rows/s"}
+                results[f"{name}.entries_per_second"] = {"value": stats["entries_per_second"], "unit": "entries/s"}
+                results[f"{name}.bytes"] = {"value": stats["bytes"], "unit": "bytes"}
+                results[f"{name}.peak_rss"] = {"value": stats["peak_rss"], "unit": "bytes"}
+                os.remove(out)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, value in results.items():
+        print(f"{name:50} {value['value']:>14.6g} {value['unit']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Global hotkey overhead: what the user's typing costs the monitor with a
+hotkey registered with the OS (X11 XGrabKey, Windows RegisterHotKey) versus
+a global keyboard hook that sees every key, and how long a press takes to
+reach its callback on the UI thread.
+
+Both run on the fake backend of src/ui/hotkeys.py, so no display or root is
+needed; the difference between them is which key events reach Python. The
+time per event runs from its arrival on the hotkeys thread until it has been
+handled. With --load another thread keeps the interpreter busy with JSON
+encoding meanwhile, like an activity log rewrite, so events also wait for
+the GIL the way a real hook callback would (noisy on a single core).
+
+    python benchmarks/hotkey_bench.py --keys 2000 --presses 50
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from ui.hotkeys import FakeHotkeyBackend, HotkeyManager
+
+
+class UIThread:
+    """Stands in for the UI engine: runs submitted callables on its own thread"""
+
+    def __init__(self):
+        self.tasks = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            fn, args = self.tasks.get()
+            if fn is None:
+                return
+            fn(*args)
+
+    def submit(self, fn, *args):
+        self.tasks.put((fn, args))
+
+    def stop(self):
+        self.tasks.put((None, ()))
+        self.thread.join()
+
+
+def busy(stop):
+    """Keep the interpreter busy the way a JSON rewrite does"""
+    entries = [{"id": i, "type": "window_info", "data": {"window_title": f"Window {i}"}} for i in range(2000)]
+    while not stop.is_set():
+        json.dumps(entries)
+
+
+def run(sees_all_keys, keys, presses, load):
+    backend = FakeHotkeyBackend(sees_all_keys=sees_all_keys)
+    ui = UIThread()
+    manager = HotkeyManager(backend, dispatch=ui.submit)
+    pressed = threading.Semaphore(0)
+    manager.add("ctrl+alt+f", pressed.release)
+    manager.start()
+
+    stop = threading.Event()
+    worker = threading.Thread(target=busy, args=(stop,), daemon=True)
+    if load:
+        worker.start()
+    started = time.perf_counter()
+    per_press = max(1, keys // presses)
+    for _ in range(presses):
+        for _ in range(per_press):
+            backend.type_text("x")
+            # Roughly typing speed, so events don't just pile up in the queue
+            time.sleep(0.0005)
+        backend.press("ctrl+alt+f")
+        pressed.acquire(timeout=5)
+    backend.wait_idle()
+    seconds = time.perf_counter() - started
+    stop.set()
+    if load:
+        worker.join()
+    manager.stop()
+    ui.stop()
+    return manager.stats(), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=2000, help="ordinary keystrokes typed")
+    parser.add_argument("--presses", type=int, default=50, help="hotkey presses spread among them")
+    parser.add_argument("--load", action="store_true", help="keep the interpreter busy meanwhile")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for mode, sees_all_keys in (("grab", False), ("hook", True)):
+        stats, seconds = run(sees_all_keys, args.keys, args.presses, args.load)
+        name = f"hotkey.{mode}"
+        results[f"{name}.events_in_python"] = {"value": stats["keystrokes"], "unit": "events"}
+        results[f"{name}.keystroke_mean"] = {"value": stats["keystroke_mean_us"], "unit": "us"}
+        results[f"{name}.keystroke_p99"] = {"value": stats["keystroke_p99_us"], "unit": "us"}
+        # Spread over everything typed, including the keys that never reached Python
+        total = stats["keystroke_mean_us"] * stats["keystrokes"]
+        results[f"{name}.per_typed_key"] = {"value": total / (args.keys + args.presses), "unit": "us"}
+        results[f"{name}.dispatch_p50"] = {"value": stats["dispatch_p50_ms"], "unit": "ms"}
+        results[f"{name}.dispatch_max"] = {"value": stats["dispatch_max_ms"], "unit": "ms"}
+        results[f"{name}.seconds"] = {"value": seconds, "unit": "s"}
+
+    for name, value in results.items():
+        print(f"{name:40} {value['value']:>12.6g} {value['unit']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
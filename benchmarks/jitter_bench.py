@@ -0,0 +1,118 @@
+"""
+Sampling jitter under load: how late each sample is taken versus its
+deadline, with the sampler in the monitoring process or in its own process.
+
+The load stands in for analysis and dashboard work: serializing a synthetic
+activity history over and over, which holds the GIL for milliseconds at a
+time. In-process it runs on a thread next to the sampling loop; in the
+multi-process layout it runs in another process while run_sampler (see
+src/supervisor.py) writes samples to a shared-memory ring, and the lags are
+read back from the ring.
+
+    python benchmarks/jitter_bench.py --seconds 10 --interval 0.05
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from screen_monitor.platforms import FakeWindowBackend
+from screen_monitor.process_cache import ProcessInfoCache
+from screen_monitor.platforms import read_window_info
+from supervisor import WorkerContext, run_sampler
+from utils.event_ring import EventRing
+from utils.scheduler import AdaptiveScheduler
+from utils.synthetic import SyntheticActivity
+
+
+def make_history(hours):
+    return list(SyntheticActivity(days=1, active_hours=hours, seed=1).iter_entries())
+
+
+def burn(stop, hours):
+    """The load: serialize an activity history until stopped"""
+    history = make_history(hours)
+    while not stop.is_set():
+        json.dumps(history)
+
+
+def in_process(seconds, interval, load_hours):
+    stop = threading.Event()
+    load = threading.Thread(target=burn, args=(stop, load_hours), daemon=True)
+    load.start()
+    time.sleep(1)  # let it build the history first
+
+    backend = FakeWindowBackend()
+    process_cache = ProcessInfoCache()
+    scheduler = AdaptiveScheduler(min_interval=interval, max_interval=interval)
+    lags = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        window_info = read_window_info(backend, process_cache)
+        scheduler.on_sample((window_info.get("window_title"), window_info.get("process_name")))
+        lags.append(scheduler.wait())
+    stop.set()
+    load.join()
+    return lags
+
+
+def separate_processes(seconds, interval, load_hours):
+    ring = EventRing(capacity=max(1024, int(seconds / interval) * 2), record_size=1024, create=True)
+    stop = multiprocessing.Event()
+    load = multiprocessing.Process(target=burn, args=(stop, load_hours), daemon=True)
+    load.start()
+    time.sleep(1)
+
+    context = WorkerContext("sampler", 0, multiprocessing.Array("d", 1, lock=False), stop)
+    sampler = multiprocessing.Process(target=run_sampler, daemon=True,
+                                      args=(context, ring.name, 30, interval, interval, "fake"))
+    reader = ring.reader()
+    sampler.start()
+    time.sleep(seconds)
+    stop.set()
+    sampler.join(5)
+    load.join(5)
+    lags = [record["lag"] for record in reader.read(limit=ring.capacity) if record.get("lag") is not None]
+    ring.close()
+    ring.unlink()
+    # The first lag is the sampler's own startup, not jitter
+    return lags[1:]
+
+
+def summary(name, lags):
+    ordered = sorted(lags)
+    return {
+        f"{name}.samples": {"value": len(lags), "unit": "samples"},
+        f"{name}.p50": {"value": statistics.median(ordered), "unit": "s"},
+        f"{name}.p99": {"value": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], "unit": "s"},
+        f"{name}.max": {"value": ordered[-1], "unit": "s"},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--interval", type=float, default=0.05, help="sampling interval in seconds")
+    parser.add_argument("--load-hours", type=int, default=8, help="hours of history serialized by the load")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    results.update(summary("jitter.in_process", in_process(args.seconds, args.interval, args.load_hours)))
+    results.update(summary("jitter.processes", separate_processes(args.seconds, args.interval, args.load_hours)))
+
+    for name, value in results.items():
+        print(f"{name:40} {value['value']:>12.6g} {value['unit']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
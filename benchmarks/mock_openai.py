@@ -0,0 +1,133 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+Answers every request with a fixed verdict, except that every Nth request gets
+a 429 with retry-after headers and every Mth one is slow, so the client's
+retry, backoff and timeout handling can be exercised without a key:
+
+    python benchmarks/mock_openai.py --port 8089 --rate-limit-every 4 --slow-every 10
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=test python src/main.py
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockOpenAIServer:
+    def __init__(self, port=0, latency=0.0, rate_limit_every=0, retry_after=0.1, slow_every=0, slow_latency=1.0,
+                 completion="- Is_Distracted: false\n- Reason: Mock verdict\n- Timeout: 0"):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.slow_every = slow_every
+        self.slow_latency = slow_latency
+        self.completion = completion
+        self.counter = itertools.count(1)
+        self.stats = {"requests": 0, "rate_limited": 0, "slow": 0}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body, headers=None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client timed out on a slow response and hung up
+                    pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                number = next(server.counter)
+                with server.lock:
+                    server.stats["requests"] += 1
+
+                if server.rate_limit_every and number % server.rate_limit_every == 0:
+                    with server.lock:
+                        server.stats["rate_limited"] += 1
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}}, {
+                        "retry-after": str(max(1, round(server.retry_after))),
+                        "retry-after-ms": str(int(server.retry_after * 1000)),
+                    })
+                    return
+
+                delay = server.latency
+                if server.slow_every and number % server.slow_every == 0:
+                    delay = server.slow_latency
+                    with server.lock:
+                        server.stats["slow"] += 1
+                if delay:
+                    time.sleep(delay)
+
+                self._send_json(200, {
+                    "id": f"chatcmpl-mock-{number}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": "gpt-4o-mini",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": server.completion},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 120, "completion_tokens": 20, "total_tokens": 140},
+                }, {"x-ratelimit-remaining-requests": "100", "x-ratelimit-reset-requests": "1s"})
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--slow-every", type=int, default=0)
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(port=args.port, latency=args.latency, rate_limit_every=args.rate_limit_every,
+                              retry_after=args.retry_after, slow_every=args.slow_every,
+                              slow_latency=args.slow_latency)
+    print(f"Mock OpenAI API on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Prompt token report for the window title analysis.
+
+Compares the prompt analyze_window_title used to build (one user message,
+rebuilt from an indented f-string every call) with the compiled templates in
+src/ai/prompts.py, for default and focus mode, with and without the recent
+activity summary. "cacheable" is the fixed system prefix shared by every call
+of a template. Uses tiktoken when installed, otherwise a 4 chars/token estimate.
+
+    python benchmarks/prompt_tokens.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from ai import prompts
+from ai.context import estimate_tokens
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text):
+        return len(_encoding.encode(text))
+except ImportError:
+    count_tokens = estimate_tokens
+
+# Per-message overhead of the chat format
+MESSAGE_OVERHEAD = 4
+
+WINDOW = {"window_title": "Pull requests - GitHub - Google Chrome", "process_name": "chrome.exe"}
+FOCUS = "Finish the screen-nanny release notes"
+CONTEXT = ("Last 10m top windows: main.py - screen-nanny - Visual Studio Code (Code.exe) 6m; "
+           "Pull requests - GitHub - Google Chrome (chrome.exe) 3m; bash (WindowsTerminal.exe) 45s\n"
+           "Window switches: 0.8/min\nIn current window for 40s\nFocus session: 25m in, 0/4 checks distracted")
+
+
+# Kept verbatim, source indentation included, since that is what was sent
+def legacy_format_window_info(window_info, context=None):
+        """Format window information, and the recent activity summary if any, for display"""
+        text = f"""
+        Window Title: {window_info['window_title']}
+        Process Name: {window_info['process_name']}
+        """
+        if context:
+            text += f"""
+        Recent activity (use it to judge patterns, the verdict is about the current window):
+        {context}
+        """
+        return text
+
+
+def legacy_window_prompt(window_info, focus_description=None, context=None):
+        """The single user message analyze_window_title sent before prompts.py"""
+        if focus_description:
+            prompt = f"""You are a productivity assistant. The user is trying to focus on: {focus_description}
+
+            Important: 
+            - These items are Productive/Neutral (coding, documents, email, music, learning, etc.) (any music app or educational video is fine)
+            - Do not consider music or communication apps as a distraction.
+            - ONLY when the title is CLEAR that it is a distraction, mark it as a distraction.
+            - Do not mark it as a distraction if it is a broad assumption.
+            - When a title may indicate the user is taking a break, allow it.
+
+            Analyze this window information and determine if it's aligned with their goal:
+            {legacy_format_window_info(window_info, context)}
+            
+            Respond in this format:
+            - Is_Distracted: [true/false]
+            - Reason: [brief explanation]
+            - Timeout: [lock the user out for x seconds. ex: 5, 20]
+            """
+        else:
+            prompt = f"""You are a productivity assistant. Analyze this window information and determine if it appears to be:
+            1. Productive/Neutral (coding, documents, email, music, learning, etc.) (any music app or educational video is fine)
+            2. Distraction (social media, youtube, twitter, facebook, netflix, etc.) 
+            Important: 
+            - Do not consider music or communication apps as a distraction.
+            - ONLY when the title is CLEAR that it is a distraction, mark it as a distraction.
+            - Do not mark it as a distraction if it is a broad assumption.
+
+            {legacy_format_window_info(window_info, context)}
+            
+            Respond in this format:
+            - Is_Distracted: [true/false]
+            - Reason: [brief explanation, 1 tiny sentence, in australian accent]
+            - Timeout: [lock the user out for x seconds. ex: 5, 20]
+            """
+        return [{"role": "user", "content": prompt}]
+
+
+def message_tokens(messages):
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD for m in messages)
+
+
+def prompt_report():
+    """{case: {"before", "after", "cacheable"}} prompt tokens per call"""
+    report = {}
+    for mode, focus in (("default", None), ("focus", FOCUS)):
+        for with_context, context in (("", None), ("+context", CONTEXT)):
+            after = prompts.window_title_messages(WINDOW, focus, context)
+            report[mode + with_context] = {
+                "before": message_tokens(legacy_window_prompt(WINDOW, focus, context)),
+                "after": message_tokens(after),
+                "cacheable": message_tokens(after[:1]),
+            }
+    return report
+
+
+def main():
+    print(f"{'case':18} {'before':>8} {'after':>8} {'cacheable':>10} {'per-call':>9}")
+    for case, tokens in prompt_report().items():
+        per_call = tokens["after"] - tokens["cacheable"]
+        print(f"{case:18} {tokens['before']:>8} {tokens['after']:>8} {tokens['cacheable']:>10} {per_call:>9}")
+
+
+if __name__ == "__main__":
+    main()
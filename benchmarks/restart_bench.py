@@ -0,0 +1,115 @@
+"""
+Time-to-ready after a restart: how long ScreenNanny takes to construct on a
+large synthetic history in three situations.
+
+- cold: no derived stores and no state checkpoint, everything is rebuilt
+  from the full log
+- stores: the rollups, search index and focus sessions are loaded from their
+  JSON files (what a restart did before state checkpoints; anything logged
+  since their last flush and the in-memory aggregates are lost)
+- checkpoint: the state checkpoint is restored and only the --tail entries
+  logged after it are replayed
+
+Each start runs in a fresh interpreter; fast cases are repeated and the
+median reported.
+
+    python benchmarks/restart_bench.py --days 180 --active-hours 1 --tail 300
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+
+from utils.json_stream import append_to_json_array
+from utils.synthetic import SyntheticActivity
+
+# Builds a ScreenNanny on the log in the current directory and prints how long it took
+START_CODE = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+from main import ScreenNanny
+from screen_monitor.idle import FakeIdleBackend
+from screen_monitor.platforms import FakeWindowBackend
+from screen_monitor.system_info import SystemMonitor
+from utils.logger import ActivityLogger
+
+started = time.perf_counter()
+nanny = ScreenNanny(headless=True, logger=ActivityLogger("logs"),
+                    system_monitor=SystemMonitor(idle_backend=FakeIdleBackend(), window_backend=FakeWindowBackend()))
+seconds = time.perf_counter() - started
+if len(sys.argv) > 2:
+    # Setup: log one entry so there is a position, then write the stores and the checkpoint
+    nanny.logger.log_activity("window_info", {"window_title": "Restart benchmark", "process_name": "python"})
+    nanny.shutdown()
+print(json.dumps({"seconds": seconds}))
+"""
+
+
+def start(workdir, setup=False):
+    args = [sys.executable, "-c", START_CODE, SRC] + (["setup"] if setup else [])
+    proc = subprocess.run(args, cwd=workdir, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])["seconds"]
+
+
+def tail_entries(count, after):
+    """count window samples a second apart, logged after the checkpoint"""
+    for i in range(count):
+        ts = after + timedelta(seconds=i + 1)
+        yield {
+            "id": f"tail{i:08d}",
+            "timestamp": ts.isoformat(),
+            "type": "window_info",
+            "data": {"window_title": f"Tail window {i // 300}", "process_name": "Code.exe", "app_name": "Code.exe"},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--active-hours", type=int, default=1, help="hours of activity per synthetic day")
+    parser.add_argument("--tail", type=int, default=300,
+                        help="entries logged after the checkpoint, one checkpoint interval of 1 Hz samples by default")
+    parser.add_argument("--repeat", type=int, default=3, help="starts per fast case")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="screen-nanny-restart-")
+    results = {}
+    try:
+        log_dir = os.path.join(workdir, "logs")
+        os.makedirs(log_dir)
+        log_path = os.path.join(log_dir, "activity_data.json")
+        end = datetime.now().replace(microsecond=0) - timedelta(days=1)
+        entries = SyntheticActivity(days=args.days, active_hours=args.active_hours, seed=1, end=end).write(log_path)
+        print(f"{entries:,} entries over {args.days} days, {os.path.getsize(log_path) / 1e6:.1f} MB, "
+              f"{args.tail:,} entries after the checkpoint")
+
+        results["restart.cold.seconds"] = {"value": start(workdir, setup=True), "unit": "s"}
+        append_to_json_array(log_path, list(tail_entries(args.tail, end)))
+        results["restart.checkpoint.seconds"] = {
+            "value": statistics.median(start(workdir) for _ in range(args.repeat)), "unit": "s"}
+        results["restart.checkpoint.bytes"] = {
+            "value": os.path.getsize(os.path.join(log_dir, "state.ckpt")), "unit": "bytes"}
+        os.remove(os.path.join(log_dir, "state.ckpt"))
+        results["restart.stores.seconds"] = {
+            "value": statistics.median(start(workdir) for _ in range(args.repeat)), "unit": "s"}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, value in results.items():
+        print(f"{name:40} {value['value']:>12.6g} {value['unit']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+"""
+Benchmark suite for the storage, stats and dashboard paths.
+
+Generates a synthetic activity history, times the hot paths against it and
+writes a JSON report. Pass --baseline to compare against an earlier report
+and exit non-zero when something regressed past --threshold.
+
+    python benchmarks/run.py --days 3 --out bench.json
+    python benchmarks/run.py --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.db import Database
+from utils.logger import ActivityLogger
+from utils.stats import UserStats
+from utils.synthetic import SyntheticActivity
+
+
+def timed(fn, repeat):
+    """Run fn repeat times and return the per-call timings in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def result(value, unit, better="lower"):
+    return {"value": value, "unit": unit, "better": better}
+
+
+def latency_results(name, timings):
+    return {
+        f"{name}.median": result(statistics.median(timings), "s"),
+        f"{name}.max": result(max(timings), "s"),
+    }
+
+
+def bench_logger_append(workdir, history_path, appends):
+    """ActivityLogger.log_activity on top of the existing history"""
+    log_dir = os.path.join(workdir, "append")
+    os.makedirs(log_dir, exist_ok=True)
+    shutil.copy(history_path, os.path.join(log_dir, "activity_data.json"))
+    logger = ActivityLogger(log_dir=log_dir)
+    data = {"window_title": "Benchmark", "process_name": "bench.exe", "pid": 1,
+            "timestamp": datetime.now().isoformat()}
+    return latency_results("logger.log_activity", timed(lambda: logger.log_activity("window_info", data), appends))
+
+
+def bench_get_logs(history_path, end, repeat):
+    """ActivityLogger.get_logs for the last hour, and filtered by type"""
+    logger = ActivityLogger(log_dir=os.path.dirname(history_path))
+    start = end - timedelta(hours=1)
+    results = latency_results("logger.get_logs.last_hour",
+                              timed(lambda: logger.get_logs(start_time=start, end_time=end), repeat))
+    results.update(latency_results("logger.get_logs.ai_analysis",
+                                   timed(lambda: logger.get_logs(activity_type="ai_analysis"), repeat)))
+    return results
+
+
+def bench_most_used_windows(history_path, repeat):
+    logger = ActivityLogger(log_dir=os.path.dirname(history_path))
+    stats = UserStats(logger)
+    return latency_results("stats.get_most_used_windows", timed(lambda: stats.get_most_used_windows(10, 3), repeat))
+
+
+def bench_dashboard(history_path, days, end):
+    """app.load_and_process_data for each day, with peak Python memory"""
+    import app
+
+    timings = []
+    peaks = []
+    for offset in range(days):
+        date_str = (end - timedelta(days=offset)).strftime("%Y-%m-%d")
+        tracemalloc.start()
+        start = time.perf_counter()
+        app.load_and_process_data(history_path, date_str)
+        timings.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    results = latency_results("app.load_and_process_data", timings)
+    results["app.load_and_process_data.peak_memory"] = result(max(peaks), "bytes")
+    return results
+
+
+def bench_database(workdir, operations):
+    """Database.get/set throughput against a scratch db.json"""
+    # A fresh instance on the scratch file, the shared one (and src/db.json) is left alone
+    shared = Database._instance
+    Database._instance = None
+    try:
+        db = Database(os.path.join(workdir, "db.json"))
+        for i in range(20):
+            db.set(f"key_{i}", {"value": i, "items": list(range(50))})
+
+        start = time.perf_counter()
+        for i in range(operations):
+            db.set("focus_state", {"active": bool(i % 2), "description": "bench"})
+        set_rate = operations / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(operations):
+            db.get("focus_state")
+        get_rate = operations / (time.perf_counter() - start)
+    finally:
+        Database._instance = shared
+    return {
+        "db.set.throughput": result(set_rate, "ops/s", "higher"),
+        "db.get.throughput": result(get_rate, "ops/s", "higher"),
+    }
+
+
+def bench_focus_sessions(history_path, days, end, repeat):
+    """FocusSessionStore rebuild from the history, and per-day lookups"""
+    from utils.focus_sessions import FocusSessionStore
+    from utils.json_stream import iter_json_array
+
+    entries = list(iter_json_array(history_path))
+    store = FocusSessionStore(os.path.join(os.path.dirname(history_path), "focus_sessions.json"))
+    results = latency_results("focus_sessions.rebuild", timed(lambda: store.rebuild(entries), 1))
+    dates = [(end - timedelta(days=offset)).date() for offset in range(days)]
+    results.update(latency_results("focus_sessions.sessions_on",
+                                   timed(lambda: [store.sessions_on(date) for date in dates], repeat)))
+    return results
+
+
+def bench_context(history_path, every=60):
+    """ActivityContext fed from the whole history, with the size of its summaries"""
+    from ai.context import ActivityContext, estimate_tokens
+    from utils.json_stream import iter_json_array
+
+    entries = list(iter_json_array(history_path))
+    context = ActivityContext()
+    tokens = []
+    start = time.perf_counter()
+    for i, entry in enumerate(entries):
+        context.on_event(entry)
+        if i % every == 0:
+            tokens.append(estimate_tokens(context.summary("Work on screen-nanny")))
+    elapsed = time.perf_counter() - start
+    return {
+        "context.on_event.throughput": result(len(entries) / elapsed, "events/s", "higher"),
+        "context.summary.tokens.median": result(statistics.median(tokens), "tokens"),
+        "context.summary.tokens.max": result(max(tokens), "tokens"),
+    }
+
+
+def bench_window_durations(history_path, repeat):
+    """WindowDurationTracker fed every window sample of the history, and top-10 queries"""
+    from screen_monitor.window_durations import WindowDurationTracker
+    from utils.json_stream import iter_json_array
+    from utils.scheduler import VirtualClock
+
+    samples = [
+        (datetime.fromisoformat(entry["timestamp"]).timestamp(), entry["data"].get("window_title"))
+        for entry in iter_json_array(history_path) if entry.get("type") == "window_info"
+    ]
+    clock = VirtualClock(samples[0][0] if samples else 0)
+    tracker = WindowDurationTracker(clock=clock)
+    start = time.perf_counter()
+    for t, title in samples:
+        clock.advance(max(0, t - clock.now()))
+        tracker.update(title)
+    elapsed = time.perf_counter() - start
+    results = {"window_durations.update.throughput": result(len(samples) / elapsed, "samples/s", "higher")}
+    results.update(latency_results("window_durations.top10", timed(lambda: tracker.top(10), repeat)))
+    results["window_durations.tracked"] = result(len(tracker.durations), "windows")
+    return results
+
+
+def bench_search(history_path, end, repeat):
+    """SearchIndex rebuild from the history, and queries over the last 30 days and everything"""
+    from utils.json_stream import iter_json_array
+    from utils.search_index import SearchIndex
+
+    entries = list(iter_json_array(history_path))
+    index = SearchIndex(os.path.join(os.path.dirname(history_path), "search_index.json"))
+    results = latency_results("search.rebuild", timed(lambda: index.rebuild(entries), 1))
+    queries = ("chrome", "screen-nanny", "py*", '"visual studio"')
+    month_ago = end - timedelta(days=30)
+    results.update(latency_results("search.query.30d",
+                                   timed(lambda: [index.search(q, month_ago, end) for q in queries], repeat)))
+    results.update(latency_results("search.query.all", timed(lambda: [index.search(q) for q in queries], repeat)))
+    return results
+
+
+def bench_retention(workdir, history_path, days, end):
+    """One retention pass over a copy of the history, downsampling all but the last day"""
+    from utils.retention import RetentionPolicy
+
+    retention_dir = os.path.join(workdir, "retention")
+    os.makedirs(retention_dir, exist_ok=True)
+    shutil.copy(history_path, os.path.join(retention_dir, "activity_data.json"))
+    policy = RetentionPolicy(log_dir=retention_dir, raw_days=0, run_days=days, now=lambda: end)
+    start = time.perf_counter()
+    stats = policy.run()
+    elapsed = time.perf_counter() - start
+    return {
+        "retention.run": result(elapsed, "s"),
+        "retention.size_ratio": result(stats["bytes_after"] / stats["bytes_before"], "ratio"),
+        "retention.lock_held": result(stats["lock_seconds"], "s"),
+    }
+
+
+# Prints the process's peak RSS in bytes. On Linux ru_maxrss carries the parent's peak over fork and exec,
+# so it is read from VmHWM, which exec resets; on macOS ru_maxrss is already in bytes
+PEAK_RSS_CODE = """
+import resource, sys
+if sys.platform.startswith("linux"):
+    with open("/proc/self/status") as status:
+        peak = next(int(line.split()[1]) * 1024 for line in status if line.startswith("VmHWM:"))
+else:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(peak)
+"""
+
+
+def bench_streaming_memory(history_path, end):
+    """Peak RSS of reading the log whole with json.load versus streaming it, relative to the file size"""
+    try:
+        import resource  # noqa: F401
+    except ImportError:
+        return {}
+    src_dir = os.path.join(ROOT, "src")
+    since = (end - timedelta(hours=1)).isoformat()
+    cases = {
+        "baseline": "pass",
+        "json_load": "import json; json.load(open(PATH))",
+        "stream": "from utils.json_stream import iter_json_array\nfor _ in iter_json_array(PATH): pass",
+        "get_logs_last_hour": (
+            "from datetime import datetime\nfrom utils.logger import ActivityLogger\n"
+            f"ActivityLogger(os.path.dirname(PATH)).get_logs(start_time=datetime.fromisoformat('{since}'))"
+        ),
+    }
+    size = os.path.getsize(history_path)
+    results = {"log.file_size": result(size, "bytes")}
+    peaks = {}
+    for name, body in cases.items():
+        code = f"import os, sys\nPATH = {history_path!r}\n{body}\n{PEAK_RSS_CODE}"
+        proc = subprocess.run([sys.executable, "-c", code], cwd=src_dir, capture_output=True, text=True, check=True)
+        peaks[name] = int(proc.stdout.strip().splitlines()[-1])
+    for name in ("json_load", "stream", "get_logs_last_hour"):
+        extra = max(0, peaks[name] - peaks["baseline"])
+        results[f"log.{name}.peak_rss"] = result(peaks[name], "bytes")
+        results[f"log.{name}.rss_to_file_size"] = result(extra / size, "ratio")
+    return results
+
+
+def bench_prompt_tokens():
+    """Prompt tokens per window title analysis, see benchmarks/prompt_tokens.py"""
+    from prompt_tokens import prompt_report
+
+    results = {}
+    for case, tokens in prompt_report().items():
+        results[f"prompts.{case}.tokens"] = result(tokens["after"], "tokens")
+        results[f"prompts.{case}.uncached_tokens"] = result(tokens["after"] - tokens["cacheable"], "tokens")
+    return results
+
+
+def bench_startup(repeat):
+    """Import cost of the headless entry point, measured in fresh interpreters"""
+    src_dir = os.path.join(ROOT, "src")
+    code = "import main; import screen_monitor.system_info"
+    wall = []
+    cumulative = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=src_dir,
+                              capture_output=True, text=True, check=True)
+        wall.append(time.perf_counter() - start)
+        # importtime lines: "import time: self [us] | cumulative | imported package"
+        total = 0
+        for line in proc.stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() in ("main", "screen_monitor.system_info"):
+                total += int(parts[1])
+        cumulative.append(total / 1e6)
+    results = latency_results("startup.interpreter", wall)
+    results["startup.import_main"] = result(statistics.median(cumulative), "s")
+    return results
+
+
+def bench_ai_client(requests, workers=4):
+    """OpenAIClient against the local mock server, with 429s and requests slower than the timeout"""
+    from ai.client import OpenAIClient
+    from mock_openai import MockOpenAIServer
+
+    server = MockOpenAIServer(latency=0.01, rate_limit_every=5, retry_after=0.05, slow_every=11,
+                              slow_latency=0.5).start()
+    client = OpenAIClient(api_key="bench", base_url=server.base_url, timeout=0.25, max_concurrency=workers,
+                          max_connections=workers, backoff_base=0.05)
+    messages = [{"role": "user", "content": "Window Title: Benchmark"}]
+
+    def call():
+        start = time.perf_counter()
+        try:
+            client.chat(messages)
+            return time.perf_counter() - start, True
+        except Exception:
+            return time.perf_counter() - start, False
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(lambda _: call(), range(requests)))
+    finally:
+        client.close()
+        server.stop()
+
+    results = latency_results("ai_client.chat", [elapsed for elapsed, _ in outcomes])
+    results["ai_client.success_rate"] = result(sum(ok for _, ok in outcomes) / requests, "ratio", "higher")
+    results["ai_client.attempts_per_request"] = result(client.stats["requests"] / requests, "ratio")
+    return results
+
+
+def compare(report, baseline, threshold):
+    """Return a list of (name, baseline, current, ratio) that regressed past threshold"""
+    regressions = []
+    for name, current in report["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or not previous["value"]:
+            continue
+        if current["better"] == "lower":
+            ratio = current["value"] / previous["value"]
+        else:
+            ratio = previous["value"] / current["value"] if current["value"] else float("inf")
+        if ratio > 1 + threshold:
+            regressions.append((name, previous["value"], current["value"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--active-hours", type=float, default=8)
+    parser.add_argument("--title-churn", type=float, default=0.05)
+    parser.add_argument("--focus-sessions", type=int, default=2)
+    parser.add_argument("--distraction-rate", type=float, default=0.15)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--appends", type=int, default=20)
+    parser.add_argument("--db-operations", type=int, default=500)
+    parser.add_argument("--ai-requests", type=int, default=40)
+    parser.add_argument("--out", default="bench_output.json")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown before a result counts as a regression (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    end = datetime.now().replace(microsecond=0)
+    generator = SyntheticActivity(
+        days=args.days, active_hours=args.active_hours, title_churn=args.title_churn,
+        focus_sessions_per_day=args.focus_sessions, distraction_rate=args.distraction_rate,
+        seed=args.seed, end=end,
+    )
+
+    workdir = tempfile.mkdtemp(prefix="screen-nanny-bench-")
+    try:
+        history_path = os.path.join(workdir, "activity_data.json")
+        start = time.perf_counter()
+        entries = generator.write(history_path)
+        print(f"Generated {entries} entries ({os.path.getsize(history_path) / 1e6:.1f} MB) "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        results = {}
+        for label, run in (
+            ("logger append", lambda: bench_logger_append(workdir, history_path, args.appends)),
+            ("get_logs", lambda: bench_get_logs(history_path, end, args.repeat)),
+            ("most used windows", lambda: bench_most_used_windows(history_path, args.repeat)),
+            ("dashboard", lambda: bench_dashboard(history_path, args.days, end)),
+            ("database", lambda: bench_database(workdir, args.db_operations)),
+            ("focus sessions", lambda: bench_focus_sessions(history_path, args.days, end, args.repeat)),
+            ("context", lambda: bench_context(history_path)),
+            ("window durations", lambda: bench_window_durations(history_path, args.repeat)),
+            ("search", lambda: bench_search(history_path, end, args.repeat)),
+            ("retention", lambda: bench_retention(workdir, history_path, args.days, end)),
+            ("streaming memory", lambda: bench_streaming_memory(history_path, end)),
+            ("prompt tokens", bench_prompt_tokens),
+            ("startup", lambda: bench_startup(args.repeat)),
+            ("ai client", lambda: bench_ai_client(args.ai_requests)),
+        ):
+            print(f"Running {label}...")
+            results.update(run())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "entries": entries,
+            "params": vars(args),
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name, value in sorted(results.items()):
+        print(f"{name:45} {value['value']:>14.6g} {value['unit']}")
+    print(f"Report written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for name, previous, current, ratio in regressions:
+            print(f"REGRESSION {name}: {previous:.6g} -> {current:.6g} ({ratio:.2f}x worse)")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+UI engine benchmark: startup, time-to-visible for the warning modal and the
+focus dialog, and CPU used by the UI thread while nothing is shown.
+
+Needs a display. Without DISPLAY it starts a private Xvfb server if one is
+installed, so it also runs on headless machines and CI:
+
+    python benchmarks/ui_bench.py --messages 20 --idle 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+def start_xvfb(display=":97"):
+    """Start Xvfb and point DISPLAY at it, returns the process or None"""
+    if not shutil.which("Xvfb"):
+        return None
+    proc = subprocess.Popen(["Xvfb", display, "-screen", "0", "1280x800x24", "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    time.sleep(0.5)
+    return proc
+
+
+def wait_for(engine, read, timeout=5):
+    """Poll a value on the UI thread until it is set"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        value = engine.call(read)
+        if value is not None:
+            return value
+        time.sleep(0.005)
+    raise TimeoutError("window never became visible")
+
+
+def run(messages, idle_seconds):
+    from ui.engine import UIEngine
+    from ui.focus_dialog import FocusDialog
+    from ui.modal import ModalWindow
+
+    start = time.perf_counter()
+    engine = UIEngine()
+    modal = ModalWindow(engine)
+    dialog = FocusDialog(engine)
+    startup = time.perf_counter() - start
+
+    modal_times = []
+    for i in range(messages):
+        modal.last_time_to_visible = None
+        modal.show_message(f"Benchmark warning {i}", duration=1, is_fullscreen=False)
+        modal_times.append(wait_for(engine, lambda: modal.last_time_to_visible))
+    modal.hide()
+
+    dialog.last_time_to_visible = None
+    dialog.show_dialog(lambda description: None)
+    dialog_time = wait_for(engine, lambda: dialog.last_time_to_visible)
+    dialog.cleanup()
+
+    # Let the modal's countdown finish so the UI is really at rest
+    time.sleep(1.5)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    time.sleep(idle_seconds)
+    idle_cpu = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start)
+    engine.stop()
+
+    return {
+        "ui.startup": {"value": startup, "unit": "s"},
+        "ui.modal.time_to_visible.median": {"value": statistics.median(modal_times), "unit": "s"},
+        "ui.modal.time_to_visible.max": {"value": max(modal_times), "unit": "s"},
+        "ui.focus_dialog.time_to_visible": {"value": dialog_time, "unit": "s"},
+        "ui.idle_cpu": {"value": idle_cpu, "unit": "cpu fraction"},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--idle", type=float, default=5.0, help="seconds to measure CPU at rest")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    xvfb = None
+    if not os.environ.get("DISPLAY"):
+        xvfb = start_xvfb()
+        if xvfb is None:
+            sys.exit("No DISPLAY and Xvfb is not installed")
+    try:
+        results = run(args.messages, args.idle)
+    finally:
+        if xvfb:
+            xvfb.terminate()
+
+    for name, value in results.items():
+        print(f"{name:40} {value['value']:>12.6g} {value['unit']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import os
+import random
+import re
+import threading
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+import httpx
+from openai import APIConnectionError, APIStatusError, OpenAI
+
+from utils.db import Database
+from utils.metrics import metrics
+from utils.scheduler import MonotonicClock
+
+
+class BudgetExhausted(Exception):
+    """Raised instead of calling the API once the token budget is spent"""
+
+
+class TokenBudget:
+    """
+    Tokens spent in the current clock hour and day, persisted in db.json so the
+    limits hold across restarts. A limit of None (or 0) means unlimited.
+    """
+
+    DB_KEY = "token_budget"
+
+    def __init__(self, hourly_limit=None, daily_limit=None, db=None, now=None):
+        self.hourly_limit = hourly_limit or None
+        self.daily_limit = daily_limit or None
+        self.db = db or Database()
+        self.now = now or datetime.now
+        self.lock = threading.Lock()
+        self.state = self.db.get(self.DB_KEY) or {}
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Limits from SCREEN_NANNY_TOKENS_PER_HOUR / SCREEN_NANNY_TOKENS_PER_DAY (0 disables)"""
+        return cls(
+            hourly_limit=int(os.getenv("SCREEN_NANNY_TOKENS_PER_HOUR", "30000")),
+            daily_limit=int(os.getenv("SCREEN_NANNY_TOKENS_PER_DAY", "200000")),
+            **kwargs
+        )
+
+    def _roll(self):
+        """Reset the counters whose hour or day has passed"""
+        now = self.now()
+        hour = now.strftime("%Y-%m-%dT%H")
+        day = now.strftime("%Y-%m-%d")
+        if self.state.get("hour") != hour:
+            self.state["hour"] = hour
+            self.state["hour_tokens"] = 0
+        if self.state.get("day") != day:
+            self.state["day"] = day
+            self.state["day_tokens"] = 0
+
+    def remaining(self):
+        """Tokens left before a limit is hit, None if unlimited"""
+        with self.lock:
+            self._roll()
+            left = []
+            if self.hourly_limit:
+                left.append(self.hourly_limit - self.state["hour_tokens"])
+            if self.daily_limit:
+                left.append(self.daily_limit - self.state["day_tokens"])
+        return max(0, min(left)) if left else None
+
+    def exhausted(self):
+        return self.remaining() == 0
+
+    def record(self, tokens):
+        with self.lock:
+            self._roll()
+            self.state["hour_tokens"] += tokens
+            self.state["day_tokens"] += tokens
+            state = dict(self.state)
+        self.db.set(self.DB_KEY, state)
+        metrics.gauge("token_budget_day_tokens", "Tokens spent today").set(state["day_tokens"])
+
+    def get_status(self):
+        remaining = self.remaining()
+        return {
+            "hour_tokens": self.state["hour_tokens"],
+            "day_tokens": self.state["day_tokens"],
+            "hourly_limit": self.hourly_limit,
+            "daily_limit": self.daily_limit,
+            "remaining": remaining,
+        }
+
+
+def parse_retry_after(headers):
+    """Seconds to wait from retry-after-ms / retry-after (seconds or HTTP date), or None"""
+    if headers is None:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds())
+
+
+def parse_reset(value):
+    """Parse OpenAI's x-ratelimit-reset-* durations like '1s', '6m0s' or '250ms'"""
+    if not value:
+        return None
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+class OpenAIClient:
+    """
+    Shared chat completions client.
+
+    Keeps one keep-alive HTTP pool, caps concurrent requests, and retries 429s,
+    5xx and connection errors with exponential backoff and full jitter. A
+    retry-after header (or exhausted x-ratelimit-remaining-requests) pauses
+    every caller until the server says it is ready again, instead of each
+    thread hammering it on its own schedule. Token spend is checked against
+    and recorded in the budget.
+    """
+
+    def __init__(self, api_key=None, base_url=None, model="gpt-4o-mini", budget=None, timeout=20,
+                 connect_timeout=5, max_connections=4, max_concurrency=2, max_retries=4,
+                 backoff_base=0.5, backoff_cap=20, clock=None, rng=None):
+        self.model = model
+        self.budget = budget
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.clock = clock or MonotonicClock()
+        self.rng = rng or random.Random()
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=60),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        )
+        # Retries are handled here so they can respect the shared pause and the budget
+        self.client = OpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client, max_retries=0)
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.lock = threading.Lock()
+        self.paused_until = 0.0
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "failures": 0}
+
+    def backoff(self, attempt):
+        """Full jitter: uniform between 0 and the capped exponential delay"""
+        return self.rng.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, self.clock.now() + seconds)
+
+    def _wait_for_pause(self):
+        # Loop because another caller may extend the pause while we sleep
+        delay = self.paused_until - self.clock.now()
+        while delay > 0:
+            self.clock.sleep(delay)
+            delay = self.paused_until - self.clock.now()
+
+    def _note_rate_limits(self, headers):
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        if remaining is not None and remaining.strip() == "0":
+            reset = parse_reset(headers.get("x-ratelimit-reset-requests"))
+            if reset:
+                self._pause(reset)
+
+    def chat(self, messages, max_tokens=150, kind="window_title"):
+        """Return a chat completion, raising BudgetExhausted or the last API error"""
+        if self.budget is not None and self.budget.exhausted():
+            raise BudgetExhausted("token budget exhausted")
+
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_pause()
+            self._count("requests")
+            try:
+                with self.slots, metrics.timer("api_latency_seconds", "OpenAI request latency", kind=kind):
+                    raw = self.client.chat.completions.with_raw_response.create(
+                        model=self.model, messages=messages, max_tokens=max_tokens,
+                    )
+            except APIStatusError as e:
+                metrics.counter("api_errors_total", "Failed OpenAI requests", status=str(e.status_code)).inc()
+                if e.status_code != 429 and e.status_code < 500:
+                    self._count("failures")
+                    raise
+                retry_after = parse_retry_after(e.response.headers)
+                if e.status_code == 429:
+                    self._count("rate_limited")
+                    if retry_after is not None:
+                        self._pause(retry_after)
+                delay = retry_after if retry_after is not None else self.backoff(attempt)
+                error = e
+            except APIConnectionError as e:
+                metrics.counter("api_errors_total", status="connection").inc()
+                delay = self.backoff(attempt)
+                error = e
+            else:
+                self._note_rate_limits(raw.headers)
+                response = raw.parse()
+                if self.budget is not None and response.usage is not None:
+                    self.budget.record(response.usage.total_tokens)
+                return response
+
+            if attempt == self.max_retries:
+                break
+            self._count("retries")
+            metrics.counter("api_retries_total", "Retried OpenAI requests").inc()
+            self.clock.sleep(delay)
+
+        self._count("failures")
+        raise error
+
+    def close(self):
+        self.http_client.close()
@@ -0,0 +1,158 @@
+from collections import deque
+from datetime import datetime
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+class ActivityContext:
+    """
+    Rolling summary of recent activity for the AI prompt.
+
+    Fed event by event as a logger listener, so building the summary never
+    scans the log. Each window_info sample credits the previous window with the
+    time since it (capped at max_gap, so idle gaps don't count), and samples
+    older than window_minutes are expired from the running totals. The summary
+    is cut to max_chars, which keeps its prompt cost flat however busy the
+    last few minutes were.
+    """
+
+    def __init__(self, window_minutes=10, top_n=3, max_gap=10, max_title_chars=40, max_chars=400):
+        self.window_seconds = window_minutes * 60
+        self.top_n = top_n
+        self.max_gap = max_gap
+        self.max_title_chars = max_title_chars
+        self.max_chars = max_chars
+
+        self.samples = deque()  # (timestamp, window_key, seconds credited)
+        self.totals = {}
+        self.switches = deque()
+        self.last_time = None
+        self.last_window = None
+        self.window_since = None
+        self.focus_started = None
+        self.focus_checks = 0
+        self.focus_distracted = 0
+
+    def on_event(self, entry):
+        """Logger listener"""
+        try:
+            ts = datetime.fromisoformat(entry["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return
+        entry_type = entry.get("type")
+        data = entry.get("data") or {}
+
+        if entry_type == "window_info" and "window_title" in data:
+            self._add_sample(ts, (data["window_title"], data.get("app_name") or data.get("process_name")))
+        elif entry_type == "focus_mode_start":
+            self.focus_started = ts
+            self.focus_checks = 0
+            self.focus_distracted = 0
+        elif entry_type == "focus_mode_end":
+            self.focus_started = None
+        elif entry_type == "ai_analysis" and self.focus_started is not None:
+            self.focus_checks += 1
+            if (data.get("analysis") or {}).get("is_distracted"):
+                self.focus_distracted += 1
+
+    def _add_sample(self, ts, key):
+        if self.last_window is not None:
+            seconds = min(max(0.0, (ts - self.last_time).total_seconds()), self.max_gap)
+            self.samples.append((ts, self.last_window, seconds))
+            self.totals[self.last_window] = self.totals.get(self.last_window, 0.0) + seconds
+        if key != self.last_window:
+            self.switches.append(ts)
+            self.window_since = ts
+        self.last_window = key
+        self.last_time = ts
+        self._expire(ts)
+
+    def _expire(self, now):
+        while self.samples and (now - self.samples[0][0]).total_seconds() > self.window_seconds:
+            _, key, seconds = self.samples.popleft()
+            remaining = self.totals[key] - seconds
+            if remaining <= 1e-9:
+                del self.totals[key]
+            else:
+                self.totals[key] = remaining
+        while self.switches and (now - self.switches[0]).total_seconds() > self.window_seconds:
+            self.switches.popleft()
+
+    def to_state(self):
+        """The rolling window as plain data, for state checkpoints"""
+        def iso(ts):
+            return ts.isoformat() if ts else None
+        return {
+            "samples": [[ts.isoformat(), list(key), seconds] for ts, key, seconds in self.samples],
+            "switches": [ts.isoformat() for ts in self.switches],
+            "last_time": iso(self.last_time),
+            "last_window": list(self.last_window) if self.last_window else None,
+            "window_since": iso(self.window_since),
+            "focus_started": iso(self.focus_started),
+            "focus_checks": self.focus_checks,
+            "focus_distracted": self.focus_distracted,
+        }
+
+    def load_state(self, state):
+        """Restore the rolling window from to_state"""
+        def parse(value):
+            return datetime.fromisoformat(value) if value else None
+        self.samples = deque((parse(ts), tuple(key), seconds) for ts, key, seconds in state.get("samples", []))
+        self.totals = {}
+        for _, key, seconds in self.samples:
+            self.totals[key] = self.totals.get(key, 0.0) + seconds
+        self.switches = deque(parse(ts) for ts in state.get("switches", []))
+        self.last_time = parse(state.get("last_time"))
+        self.last_window = tuple(state["last_window"]) if state.get("last_window") else None
+        self.window_since = parse(state.get("window_since"))
+        self.focus_started = parse(state.get("focus_started"))
+        self.focus_checks = state.get("focus_checks", 0)
+        self.focus_distracted = state.get("focus_distracted", 0)
+
+    def _short(self, title):
+        if len(title) <= self.max_title_chars:
+            return title
+        return title[:self.max_title_chars - 3] + "..."
+
+    def _duration(self, seconds):
+        return f"{seconds:.0f}s" if seconds < 120 else f"{seconds / 60:.0f}m"
+
+    def top_windows(self):
+        """[(window_key, seconds)] with the most time in the rolling window"""
+        return sorted(self.totals.items(), key=lambda item: -item[1])[:self.top_n]
+
+    def summary(self, focus_description=None, session=None):
+        """
+        Compact text for the prompt, empty until there is some history. The
+        focus session record, when given, covers sessions started before a restart.
+        """
+        if self.last_window is None:
+            return ""
+        minutes = self.window_seconds // 60
+        lines = []
+        top = self.top_windows()
+        if top:
+            windows = "; ".join(
+                f"{self._short(title)} ({app}) {self._duration(seconds)}" for (title, app), seconds in top
+            )
+            lines.append(f"Last {minutes}m top windows: {windows}")
+        lines.append(f"Window switches: {len(self.switches) / minutes:.1f}/min")
+        in_current = (self.last_time - self.window_since).total_seconds()
+        lines.append(f"In current window for {self._duration(in_current)}")
+        if focus_description:
+            if session is not None:
+                elapsed = (self.last_time - session["start"]).total_seconds() / 60
+                lines.append(f"Focus session: {elapsed:.0f}m in, {session['interruptions']} distractions so far")
+            elif self.focus_started is not None:
+                elapsed = (self.last_time - self.focus_started).total_seconds() / 60
+                lines.append(f"Focus session: {elapsed:.0f}m in, {self.focus_distracted}/{self.focus_checks} checks distracted")
+            else:
+                lines.append("Focus session: active")
+
+        text = "\n".join(lines)
+        if len(text) > self.max_chars:
+            text = text[:self.max_chars - 3] + "..."
+        return text
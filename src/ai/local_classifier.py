@@ -0,0 +1,48 @@
+import re
+
+DISTRACTING_KEYWORDS = (
+    "youtube", "reddit", "twitter", "facebook", "instagram", "tiktok", "netflix", "twitch",
+    "hulu", "disney+", "prime video", "9gag", "steam",
+)
+
+# Titles that make an otherwise distracting site fine, following the AI prompt's rules
+ALLOWED_KEYWORDS = (
+    "tutorial", "lecture", "course", "learn", "how to", "documentation", "podcast", "music", "lofi",
+)
+
+
+class LocalClassifier:
+    """
+    Keyword verdicts in VisionAnalyzer's format, used when the API can't be.
+
+    Deliberately conservative like the prompt: only well known distraction
+    sites are flagged, and a title that mentions the focus goal or looks
+    educational is let through.
+    """
+
+    def __init__(self, distracting_keywords=DISTRACTING_KEYWORDS, allowed_keywords=ALLOWED_KEYWORDS, timeout=10):
+        self.distracting_keywords = distracting_keywords
+        self.allowed_keywords = allowed_keywords
+        self.timeout = timeout
+
+    def classify(self, window_info, focus_description=None, reason_prefix="Local check"):
+        title = f"{window_info.get('window_title', '')} {window_info.get('process_name', '')}".lower()
+        match = next((word for word in self.distracting_keywords if word in title), None)
+
+        if match and any(word in title for word in self.allowed_keywords):
+            match = None
+        if match and focus_description:
+            goal_words = {word for word in re.findall(r"\w+", focus_description.lower()) if len(word) > 3}
+            if any(word in title for word in goal_words):
+                match = None
+
+        if match:
+            reason = f"{reason_prefix}: {match} looks like a distraction"
+        else:
+            reason = f"{reason_prefix}: nothing obviously distracting"
+        return {
+            "is_distracted": match is not None,
+            "reason": reason,
+            "timeout": self.timeout if match else 0,
+            "source": "local",
+        }
@@ -0,0 +1,107 @@
+import textwrap
+
+
+def compact(text):
+    """Dedent, strip every line and drop blank lines, so source indentation isn't sent as tokens"""
+    lines = (line.strip() for line in textwrap.dedent(text).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+class PromptTemplate:
+    """
+    A prompt compiled once into a fixed system message and a user message
+    template. Only the user message changes between calls, so every request
+    with the same template starts with an identical prefix, which is what
+    provider-side prompt caching matches on.
+    """
+
+    def __init__(self, name, system, user):
+        self.name = name
+        self.system = compact(system)
+        self.user = compact(user)
+
+    def messages(self, **values):
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user.format(**values)},
+        ]
+
+
+def window_values(window_info, focus_description=None, context=None):
+    """Values for the window title templates; the context section is left out when empty"""
+    return {
+        "window_title": window_info["window_title"],
+        "process_name": window_info["process_name"],
+        "focus_description": focus_description,
+        "context": f"\nRecent activity (context only, judge the current window):\n{context}" if context else "",
+    }
+
+
+RESPONSE_FORMAT = """
+    Respond in this format:
+    - Is_Distracted: [true/false]
+    - Reason: [{reason}]
+    - Timeout: [lock the user out for x seconds. ex: 5, 20]
+"""
+
+WINDOW_RULES = """
+    - Do not consider music or communication apps as a distraction.
+    - ONLY when the title is CLEAR that it is a distraction, mark it as a distraction.
+    - Do not mark it as a distraction if it is a broad assumption.
+"""
+
+WINDOW_TITLE = PromptTemplate(
+    "window_title",
+    system="""
+        You are a productivity assistant. Analyze the window information and determine if it appears to be:
+        1. Productive/Neutral (coding, documents, email, music, learning, etc.) (any music app or educational video is fine)
+        2. Distraction (social media, youtube, twitter, facebook, netflix, etc.)
+        Important:
+    """ + WINDOW_RULES + RESPONSE_FORMAT.format(reason="brief explanation, 1 tiny sentence, in australian accent"),
+    user="""
+        Window Title: {window_title}
+        Process Name: {process_name}{context}
+    """,
+)
+
+WINDOW_TITLE_FOCUS = PromptTemplate(
+    "window_title_focus",
+    system="""
+        You are a productivity assistant. The user is in a focus session on the goal given below.
+        Analyze the window information and determine if it's aligned with their goal.
+        Important:
+        - These items are Productive/Neutral (coding, documents, email, music, learning, etc.) (any music app or educational video is fine)
+    """ + WINDOW_RULES + """
+        - When a title may indicate the user is taking a break, allow it.
+    """ + RESPONSE_FORMAT.format(reason="brief explanation"),
+    user="""
+        Focus goal: {focus_description}
+        Window Title: {window_title}
+        Process Name: {process_name}{context}
+    """,
+)
+
+SCREEN = PromptTemplate(
+    "screen",
+    system="""
+        You are a productivity assistant. Analyze the screenshot and determine if the content appears to be:
+        1. Productive work (coding, documents, email, etc.)
+        2. General time-wasting (social media, entertainment, etc.)
+    """ + RESPONSE_FORMAT.format(reason="brief explanation"),
+    user="Screenshot attached.",
+)
+
+SCREEN_FOCUS = PromptTemplate(
+    "screen_focus",
+    system="""
+        You are a productivity assistant. The user is in a focus session on the goal given below.
+        Analyze the screenshot and determine if the content is aligned with their goal.
+        If it's not aligned, explain why it's distracting.
+    """ + RESPONSE_FORMAT.format(reason="brief explanation"),
+    user="Focus goal: {focus_description}",
+)
+
+
+def window_title_messages(window_info, focus_description=None, context=None):
+    template = WINDOW_TITLE_FOCUS if focus_description else WINDOW_TITLE
+    return template.messages(**window_values(window_info, focus_description, context))
@@ -1,74 +1,43 @@
-from openai import OpenAI
+from openai import APIError
 import base64
 import os
-from screen_monitor.system_info import SystemMonitor
 from dotenv import load_dotenv
+from ai.client import BudgetExhausted, OpenAIClient, TokenBudget
+from ai.local_classifier import LocalClassifier
+from ai import prompts
+from utils.metrics import metrics
 
 
 class VisionAnalyzer:
-    def __init__(self):
+    def __init__(self, client=None, budget=None, local_classifier=None):
         load_dotenv()
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.budget = budget or TokenBudget.from_env()
+        self.client = client or OpenAIClient(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL"),
+            budget=self.budget,
+        )
+        self.local_classifier = local_classifier or LocalClassifier()
         self.token_usage = {
             "total_tokens": 0,
             "prompt_tokens": 0,
             "completion_tokens": 0,
         }
 
-    def format_window_info(self, window_info):
-        """Format window information for display"""
-        return f"""
-        Window Title: {window_info['window_title']}
-        Process Name: {window_info['process_name']}
-        """
-
-    def analyze_window_title(self, window_info, focus_description=None):
+    def analyze_window_title(self, window_info, focus_description=None, context=None):
         """Analyze window title and process name to determine if it's distracting"""
-        if focus_description:
-            prompt = f"""You are a productivity assistant. The user is trying to focus on: {focus_description}
-
-            Important: 
-            - These items are Productive/Neutral (coding, documents, email, music, learning, etc.) (any music app or educational video is fine)
-            - Do not consider music or communication apps as a distraction.
-            - ONLY when the title is CLEAR that it is a distraction, mark it as a distraction.
-            - Do not mark it as a distraction if it is a broad assumption.
-            - When a title may indicate the user is taking a break, allow it.
-
-            Analyze this window information and determine if it's aligned with their goal:
-            {self.format_window_info(window_info)}
-            
-            Respond in this format:
-            - Is_Distracted: [true/false]
-            - Reason: [brief explanation]
-            - Timeout: [lock the user out for x seconds. ex: 5, 20]
-            """
-        else:
-            prompt = f"""You are a productivity assistant. Analyze this window information and determine if it appears to be:
-            1. Productive/Neutral (coding, documents, email, music, learning, etc.) (any music app or educational video is fine)
-            2. Distraction (social media, youtube, twitter, facebook, netflix, etc.) 
-            Important: 
-            - Do not consider music or communication apps as a distraction.
-            - ONLY when the title is CLEAR that it is a distraction, mark it as a distraction.
-            - Do not mark it as a distraction if it is a broad assumption.
-
-            {self.format_window_info(window_info)}
-            
-            Respond in this format:
-            - Is_Distracted: [true/false]
-            - Reason: [brief explanation, 1 tiny sentence, in australian accent]
-            - Timeout: [lock the user out for x seconds. ex: 5, 20]
-            """
-
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=150,
-        )
+        messages = prompts.window_title_messages(window_info, focus_description, context)
+
+        try:
+            response = self.client.chat(messages, max_tokens=150)
+        except BudgetExhausted:
+            return self._fallback(window_info, focus_description, "budget")
+        except APIError as e:
+            print(f"AI request failed, using local check: {e}")
+            return self._fallback(window_info, focus_description, "api_error")
 
         # Track token usage
-        self.token_usage["prompt_tokens"] += response.usage.prompt_tokens
-        self.token_usage["completion_tokens"] += response.usage.completion_tokens
-        self.token_usage["total_tokens"] += response.usage.total_tokens
+        self._track_usage(response.usage)
 
         return self._parse_response(response.choices[0].message.content)
 
@@ -86,34 +55,17 @@ class VisionAnalyzer:
         base64_image = self.encode_image(image_path)
 
         if focus_description:
-            prompt = f"""You are a productivity assistant. The user is trying to focus on: {focus_description}
-            
-            Analyze this screenshot and determine if the content is aligned with their goal.
-            If it's not aligned, explain why it's distracting.
-            
-            Respond in this format:
-            - Is_Distracted: [true/false]
-            - Reason: [brief explanation]
-            - Timeout: [lock the user out for x seconds. ex: 5, 20]
-            """
+            system, user = prompts.SCREEN_FOCUS.messages(focus_description=focus_description)
         else:
-            prompt = """You are a productivity assistant. Analyze this screenshot and determine if the content appears to be:
-            1. Productive work (coding, documents, email, etc.)
-            2. General time-wasting (social media, entertainment, etc.)
-            
-            Respond in this format:
-            - Is_Distracted: [true/false]
-            - Reason: [brief explanation]
-            - Timeout: [lock the user out for x seconds. ex: 5, 20]
-            """
-
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+            system, user = prompts.SCREEN.messages()
+
+        response = self.client.chat(
+            [
+                system,
                 {
                     "role": "user",
                     "content": [
-                        {"type": "text", "text": prompt},
+                        {"type": "text", "text": user["content"]},
                         {
                             "type": "image_url",
                             "image_url": {
@@ -124,15 +76,34 @@ class VisionAnalyzer:
                 }
             ],
             max_tokens=500,
+            kind="screen",
         )
 
         # Track token usage
-        self.token_usage["prompt_tokens"] += response.usage.prompt_tokens
-        self.token_usage["completion_tokens"] += response.usage.completion_tokens
-        self.token_usage["total_tokens"] += response.usage.total_tokens
+        self._track_usage(response.usage)
 
         return self._parse_response(response.choices[0].message.content)
 
+    def _fallback(self, window_info, focus_description, reason):
+        """Classify locally when the token budget is spent or the API keeps failing"""
+        metrics.counter("ai_fallbacks_total", "Analyses answered by the local classifier", reason=reason).inc()
+        prefix = "Token budget used up, local check" if reason == "budget" else "AI unavailable, local check"
+        return self.local_classifier.classify(window_info, focus_description, reason_prefix=prefix)
+
+    def _track_usage(self, usage):
+        """Add a response's token usage to the running totals and metrics"""
+        self.token_usage["prompt_tokens"] += usage.prompt_tokens
+        self.token_usage["completion_tokens"] += usage.completion_tokens
+        self.token_usage["total_tokens"] += usage.total_tokens
+        # Prompt tokens served from the provider's prefix cache, when the API reports them
+        details = getattr(usage, "prompt_tokens_details", None) or {}
+        cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", 0)
+        metrics.counter("tokens_total", kind="cached_prompt").inc(cached or 0)
+        metrics.histogram("prompt_tokens_per_call", "Prompt tokens of each OpenAI request",
+                          buckets=(100, 200, 300, 400, 600, 800, 1200, 2000)).observe(usage.prompt_tokens)
+        metrics.counter("tokens_total", "Tokens spent on OpenAI requests", kind="prompt").inc(usage.prompt_tokens)
+        metrics.counter("tokens_total", kind="completion").inc(usage.completion_tokens)
+
     def _parse_response(self, content):
         """Parse the AI response into a structured format"""
         lines = content.split("\n")
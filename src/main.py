@@ -1,47 +1,260 @@
-import time
-from screen_monitor.capture import ScreenCapture
-from screen_monitor.system_info import SystemMonitor
+import argparse
+import os
+from datetime import datetime
 from utils.logger import ActivityLogger
-from ui.modal import ModalWindow
-from ui.focus_dialog import FocusDialog
-import keyboard
-import threading
-from ai.vision_analyzer import VisionAnalyzer
 from utils.db import Database
 from utils.stats import UserStats
+from utils.rollups import RollupStore
+from utils.scheduler import AdaptiveScheduler
+from utils.metrics import metrics
+from utils.warning_policy import WarningPolicy
+from utils.checkpoint import StateCheckpoint
+from utils.focus_sessions import FocusSessionStore
+from utils.governor import MINIMAL, ResourceGovernor
+from utils.retention import RetentionPolicy, RetentionWorker
+from utils.search_index import SearchIndex
+from ai.context import ActivityContext
 
 class ScreenNanny:
-    def __init__(self, log_interval=5, analyze_interval=60, idle_threshold=30, ai_enabled=True):
+    # How often metrics are written to logs/metrics.json and the activity log
+    METRICS_INTERVAL = 300  # 5 minutes in seconds
+    # An open focus session with no activity for this long was left by a crash
+    FOCUS_STALE_AFTER = 900  # 15 minutes in seconds
+    # How often the rollups and search index are written out, stretched by the governor under load
+    STORE_FLUSH_INTERVAL = 60
+    # How often the in-memory aggregates are checkpointed to logs/state.ckpt
+    CHECKPOINT_INTERVAL = 300  # 5 minutes in seconds
+
+    def __init__(self, log_interval=5, analyze_interval=60, idle_threshold=30, ai_enabled=True, idle_backend=None,
+                 system_monitor=None, logger=None, vision_analyzer=None, modal=None, focus_dialog=None,
+                 clock=None, enable_hotkey=True, headless=False, log_owner=True, governor=None,
+                 hotkey_backend=None):
+        """
+        Components can be injected (fakes in the replay harness, tests); anything
+        left as None is built from the real, platform-specific implementation,
+        which is only imported when it's actually needed.
+
+        headless=True is the logging-only mode: no AI, modal, focus dialog or
+        hotkey, so customtkinter, keyboard and openai are never imported.
+
+        The hotkey backend is picked like the window backend (see
+        ui/hotkeys.py); SCREEN_NANNY_HOTKEY_BACKEND forces one.
+
+        log_owner=False is for worker processes (see supervisor.py) whose
+        events are logged by another process: the rollups and search index are
+        left to that process and focus sessions are only followed in memory.
+
+        The resource governor is only set up with the real SystemMonitor (or
+        when passed in), since it reads this process's own load; set
+        SCREEN_NANNY_GOVERNOR=0 to turn it off.
+        """
+        if headless:
+            ai_enabled = False
+            enable_hotkey = False
         self.analyze_interval = analyze_interval
         self.log_interval = log_interval
         self.ai_enabled=ai_enabled
-        self.screen_capture = ScreenCapture()
-        self.system_monitor = SystemMonitor()
-        self.logger = ActivityLogger()
-        self.modal = ModalWindow()
-        self.focus_dialog = FocusDialog()
+        self._screen_capture = None
+        if system_monitor is None:
+            from screen_monitor.system_info import SystemMonitor
+            system_monitor = SystemMonitor(idle_backend=idle_backend)
+        self.system_monitor = system_monitor
+        self.logger = logger or ActivityLogger()
+        if modal is None and not headless:
+            from ui.modal import ModalWindow
+            modal = ModalWindow()
+        self.modal = modal
+        if focus_dialog is None and enable_hotkey and not headless:
+            from ui.focus_dialog import FocusDialog
+            focus_dialog = FocusDialog()
+        self.focus_dialog = focus_dialog
         self.stats = UserStats(self.logger)
+        self.focus_sessions = FocusSessionStore(os.path.join(self.logger.log_dir, 'focus_sessions.json'))
+        self.rollups = None
+        self.search_index = None
+        self.retention = None
+        self.checkpoint = None
+        if log_owner:
+            self.rollups = RollupStore(os.path.join(self.logger.log_dir, 'rollups.json'), self.STORE_FLUSH_INTERVAL)
+            self.search_index = SearchIndex(os.path.join(self.logger.log_dir, 'search_index.json'),
+                                            self.STORE_FLUSH_INTERVAL)
+            self.logger.add_listener(self.rollups.add_event)
+            self.logger.add_listener(self.focus_sessions.on_event)
+            self.logger.add_listener(self.search_index.add_event)
+        else:
+            self.focus_sessions.load()
+            self.focus_sessions.autosave = False
+            self.logger.add_listener(self.focus_sessions.on_event)
+        # Recent-history summary sent along with each analysis
+        self.context = ActivityContext()
+        self.logger.add_listener(self.context.on_event)
         self.focus_mode = False
         self.focus_description = None
         self.screenshot_enabled = False
-        self.vision_analyzer = VisionAnalyzer()
+        if vision_analyzer is None and ai_enabled:
+            from ai.vision_analyzer import VisionAnalyzer
+            vision_analyzer = VisionAnalyzer()
+        self.vision_analyzer = vision_analyzer
         self.idle_threshold = idle_threshold
         self.db = Database()  # Initialize database
+        # Sample every second after a window switch, backing off to log_interval when stable
+        self.scheduler = AdaptiveScheduler(
+            clock=clock,
+            max_interval=log_interval,
+            analyze_interval=analyze_interval
+        )
+        self.min_interval = self.scheduler.min_interval
+        self.settle_delay = self.scheduler.settle_delay
+        self.warning_policy = WarningPolicy(clock=self.scheduler.clock)
+        if governor is None and hasattr(self.system_monitor, "get_system_metrics") \
+                and os.getenv("SCREEN_NANNY_GOVERNOR", "1") != "0":
+            governor = ResourceGovernor.from_env(self.system_monitor.get_system_metrics, clock=self.scheduler.clock)
+        self.governor = governor
+        if governor:
+            governor.on_change = self._on_throttle
+        self.metrics_path = os.path.join(self.logger.log_dir, 'metrics.json')
+        self.last_metrics_export = self.scheduler.clock.now()
+        self.last_checkpoint = self.scheduler.clock.now()
         
-        # Restore focus mode state if it exists
-        focus_state = self.db.get('focus_state', {})
-        self.focus_mode = focus_state.get('active', False)
-        self.focus_description = focus_state.get('description', None)
+        # Restore focus mode from an open session, closing it first if we crashed mid-session
+        if log_owner:
+            self._restore_state()
+            self._recover_focus_sessions()
+        session = self.focus_sessions.current()
+        self.focus_mode = session is not None
+        self.focus_description = session["description"] if session else None
         
         # Start hotkey listener
-        self._setup_hotkey()
+        self.hotkeys = None
+        if enable_hotkey:
+            self._setup_hotkey(hotkey_backend)
         
+        print(f"Idle detection backend: {self.system_monitor.idle_backend.name}")
         if not ai_enabled:
             print("AI mode disabled. Only logging window information.")
     
-    def _setup_hotkey(self):
-        """Setup the hotkey listener"""
-        keyboard.add_hotkey('ctrl+alt+f', self.toggle_focus_dialog)
+    def _restore_state(self):
+        """
+        Restore the in-memory aggregates from the state checkpoint and replay
+        only the log entries after it, or load and backfill the stores
+        """
+        self.checkpoint = StateCheckpoint(os.path.join(self.logger.log_dir, 'state.ckpt'), self.logger.json_log_path)
+        self.checkpoint.register("rollups", self.rollups.to_state, self.rollups.load_state)
+        self.checkpoint.register("search_index", self.search_index.to_state, self.search_index.load_state)
+        self.checkpoint.register("focus_sessions", self.focus_sessions.to_state, self.focus_sessions.load_state)
+        self.checkpoint.register("context", self.context.to_state, self.context.load_state)
+        tracker = getattr(self.system_monitor, "window_tracker", None)
+        if tracker is not None:
+            self.checkpoint.register("window_durations", tracker.to_state, tracker.load_state)
+        if self.vision_analyzer is not None:
+            token_usage = self.vision_analyzer.get_token_usage()
+            self.checkpoint.register("token_usage", lambda: dict(token_usage), token_usage.update)
+
+        stats = self.checkpoint.restore(self._replay_entry)
+        if stats is None:
+            self._load_stores()
+            # Checkpoint on the first tick that has a log position, so the next start is fast
+            self.last_checkpoint -= self.CHECKPOINT_INTERVAL
+            return
+        if tracker is not None:
+            tracker.resume()
+        self.rollups.dirty = self.search_index.dirty = self.focus_sessions.dirty = True
+        self.logger.position = self.logger.position or stats["position"]
+        print(f"Restored state checkpoint and {stats['tail_entries']} newer log entries "
+              f"in {stats['seconds'] * 1000:.0f} ms")
+
+    def _replay_entry(self, entry):
+        """Fold a log entry written after the state checkpoint into the restored aggregates"""
+        self.rollups.add_event(entry)
+        self.focus_sessions.on_event(entry)
+        self.search_index.add_event(entry)
+        self.context.on_event(entry)
+        data = entry.get("data") or {}
+        tracker = getattr(self.system_monitor, "window_tracker", None)
+        if tracker is not None and entry.get("type") == "window_info" and "window_title" in data:
+            try:
+                # Credited by the samples' own times instead of the clock
+                tracker.update(data["window_title"], datetime.fromisoformat(entry["timestamp"]).timestamp())
+            except (KeyError, TypeError, ValueError):
+                pass
+        if self.vision_analyzer is not None and entry.get("type") == "ai_analysis" and data.get("token_usage"):
+            # Logged usage is the running total at the time
+            self.vision_analyzer.get_token_usage().update(data["token_usage"])
+
+    def save_state(self, force=False):
+        """Checkpoint the in-memory aggregates every CHECKPOINT_INTERVAL (stretched under load), or now if forced"""
+        if self.checkpoint is None:
+            return
+        now = self.scheduler.clock.now()
+        interval = self.CHECKPOINT_INTERVAL * (self.governor.flush_multiplier if self.governor else 1)
+        if not force and now - self.last_checkpoint < interval:
+            return
+        # Taken while no entry is between being written and reaching the listeners
+        with self.logger.notify_lock:
+            position = self.logger.position
+            if position is None:
+                return
+            snapshot = self.checkpoint.snapshot(position)
+        self.last_checkpoint = now
+        with metrics.timer("stage_seconds", stage="checkpoint"):
+            size = self.checkpoint.write(snapshot)
+        if size:
+            metrics.gauge("checkpoint_bytes", "Size of the last state checkpoint").set(size)
+
+    def _load_stores(self):
+        """Load the stores derived from the log, backfilling any that are missing"""
+        # First run with one of them: backfill it once from the existing log, read as it goes
+        if not self.rollups.load():
+            self.rollups.rebuild(self.logger.iter_logs())
+            self.rollups.flush()
+        if not self.focus_sessions.load():
+            # Focus sessions used to exist only as log events
+            self.focus_sessions.rebuild(self.logger.iter_logs())
+            self.focus_sessions.save()
+        if not self.search_index.load():
+            self.search_index.rebuild(self.logger.iter_logs())
+            self.search_index.flush()
+
+    def _recover_focus_sessions(self):
+        """End open sessions with no activity for FOCUS_STALE_AFTER at their last activity"""
+        for session in self.focus_sessions.stale_sessions(self.logger.now(), self.FOCUS_STALE_AFTER):
+            print(f"Closing focus session left open since {session['last_seen']:%Y-%m-%d %H:%M}")
+            self.logger.log_activity("focus_mode_end", {
+                "recovered": True,
+                "ended_at": session["last_seen"].isoformat()
+            })
+
+    def _on_throttle(self, level, previous, reason):
+        """Scale the optional work to a new governor level and log the decision"""
+        # Fewer AI checks: re-checks further apart, and only windows that stay in front longer
+        self.scheduler.analyze_interval = self.analyze_interval * self.governor.analyze_multiplier
+        self.scheduler.settle_delay = self.settle_delay * self.governor.analyze_multiplier
+        self.scheduler.max_interval = self.log_interval * self.governor.sample_multiplier
+        # At minimal there is no fast sampling after a window switch either
+        self.scheduler.min_interval = self.scheduler.max_interval if level == MINIMAL else self.min_interval
+        if self.rollups:
+            flush_interval = self.STORE_FLUSH_INTERVAL * self.governor.flush_multiplier
+            self.rollups.flush_interval = flush_interval
+            self.search_index.flush_interval = flush_interval
+        print(f"Throttle: {previous} -> {level} ({reason})")
+        self.logger.log_activity("throttle", {**self.governor.state(), "previous": previous})
+
+    @property
+    def screen_capture(self):
+        """Screen capture is only set up (and Pillow imported) once screenshots are used"""
+        if self._screen_capture is None:
+            from screen_monitor.capture import ScreenCapture
+            self._screen_capture = ScreenCapture()
+        return self._screen_capture
+    
+    def _setup_hotkey(self, backend=None):
+        """Register Ctrl+Alt+F with the platform, the toggle runs on the UI thread"""
+        from ui.hotkeys import HotkeyManager
+        engine = getattr(self.focus_dialog, "engine", None)
+        self.hotkeys = HotkeyManager(backend, dispatch=engine.submit if engine else None)
+        self.hotkeys.add('ctrl+alt+f', self.toggle_focus_dialog)
+        self.hotkeys.start()
+        print(f"Hotkey backend: {self.hotkeys.backend.name}")
     
     def toggle_focus_dialog(self):
         """Toggle between starting and ending focus mode"""
@@ -55,11 +268,7 @@ class ScreenNanny:
         def on_focus_set(description):
             self.focus_mode = True
             self.focus_description = description
-            # Save focus state to db
-            self.db.set('focus_state', {
-                'active': True,
-                'description': description
-            })
+            # Logging the event opens the session in the focus session store
             self.logger.log_activity("focus_mode_start", {"description": description})
         
         self.focus_dialog.show_dialog(on_focus_set)
@@ -69,11 +278,6 @@ class ScreenNanny:
         def on_cancel():
             self.focus_mode = False
             self.focus_description = None
-            # Clear focus state from db
-            self.db.set('focus_state', {
-                'active': False,
-                'description': None
-            })
             self.logger.log_activity("focus_mode_end", {})
         
         self.focus_dialog.show_dialog(
@@ -85,63 +289,113 @@ class ScreenNanny:
     
     def analyze_and_warn(self, screenshot_path, window_info):
         """Analyze activity and show warning if distracted"""
+        window_key = (window_info.get("window_title"), window_info.get("process_name"))
+
+        # Sustained distraction on the same window reuses the last verdict instead of asking again
+        analysis = self.warning_policy.cached_verdict(window_key)
+        if analysis is not None:
+            metrics.counter("analyses_reused_total", "Distracted verdicts reused instead of calling the AI").inc()
+            decision = self.warning_policy.decide(window_key, analysis, reused=True)
+            if decision["action"] == WarningPolicy.SHOWN:
+                self.logger.log_activity("warning", {"analysis": analysis, "warning": decision})
+            self._warn(analysis, decision)
+            return analysis
+
         # Use window title analysis by default (cheaper)
-        analysis = self.vision_analyzer.analyze_window_title(
-            window_info,
-            self.focus_description if self.focus_mode else None
-        )
+        with metrics.timer("stage_seconds", "Time spent in each monitoring stage", stage="ai_call"):
+            focus_description = self.focus_description if self.focus_mode else None
+            analysis = self.vision_analyzer.analyze_window_title(
+                window_info,
+                focus_description,
+                context=self.context.summary(focus_description, self.focus_sessions.current())
+            )
+        metrics.counter("analyses_total", "AI analyses performed").inc()
+        decision = self.warning_policy.decide(window_key, analysis)
         
         # Log the analysis and token usage
         self.logger.log_activity("ai_analysis", {
             "analysis": analysis,
             "token_usage": self.vision_analyzer.get_token_usage(),
-            "analysis_type": "window_title"
+            "analysis_type": "window_title",
+            "warning": decision
         })
 
         print(analysis)
+        self._warn(analysis, decision)
+        return analysis
+
+    def _warn(self, analysis, decision):
+        """Show the modal if the warning policy says so"""
+        metrics.counter("warning_decisions_total", "Warning policy decisions", action=decision["action"]).inc()
+        if decision["action"] != WarningPolicy.SHOWN:
+            return
+
+        message = "Focus\n\n"
+        if self.focus_mode:
+            message += f"Remember, you're supposed to be focusing on:\n{self.focus_description}\n\n"
+        message += f"Reason: {analysis['reason']}"
+        if decision["strikes"] > 1:
+            message += f"\n\nWarning {decision['strikes']} in the last half hour"
+
+        with metrics.timer("stage_seconds", stage="modal_dispatch"):
+            self.modal.show_message(message, duration=decision["timeout"])
+        metrics.counter("warnings_total", "Distraction warnings shown").inc()
+    
+    def tick(self):
+        """Run one sampling step, the scheduler decides when the next one happens"""
+        metrics.counter("ticks_total", "Monitoring loop iterations").inc()
+        if self.scheduler.clock.now() - self.last_metrics_export >= self.METRICS_INTERVAL:
+            self.export_metrics()
+        if self.governor:
+            with metrics.timer("stage_seconds", stage="governor"):
+                self.governor.update()
+        self.save_state()
         
-        if analysis["is_distracted"]:
-            message = "Focus\n\n"
-            if self.focus_mode:
-                message += f"Remember, you're supposed to be focusing on:\n{self.focus_description}\n\n"
-            message += f"Reason: {analysis['reason']}"
+        # Check if system is idle
+        with metrics.timer("stage_seconds", stage="idle_check"):
+            idle_time = self.system_monitor.get_idle_time()
+        is_idle = int(idle_time) > self.idle_threshold
+        
+        if is_idle:
+            metrics.counter("idle_ticks_total", "Ticks skipped because the user was idle").inc()
+            if self.scheduler.on_idle():
+                print(f"System idle for {idle_time} seconds")
+            return
+        
+        # Get the window info
+        with metrics.timer("stage_seconds", stage="window_query"):
+            window_info = self.system_monitor.update_window_info()
+        with metrics.timer("stage_seconds", stage="log_write"):
+            self.logger.log_activity("window_info", window_info)
+        window_key = (window_info.get("window_title"), window_info.get("process_name"))
+        if self.scheduler.on_sample(window_key):
+            print(window_info)
+        
+        # Analyze using window title once the window has settled or is due a re-check
+        if self.ai_enabled and self.scheduler.analysis_due():
+            screenshot_path = None
+            if self.screenshot_enabled and (self.governor is None or self.governor.allows_screenshots()):
+                screenshot_path = self.screen_capture.capture()
+                self.logger.log_activity("screenshot", {"path": screenshot_path})
             
-            self.modal.show_message(message, duration=analysis["timeout"])
+            analysis = self.analyze_and_warn(screenshot_path, window_info)
+            self.scheduler.on_analyzed(analysis["is_distracted"])
+    
+    def export_metrics(self):
+        """Write a metrics snapshot for the dashboard and a compact copy to the activity log"""
+        self.last_metrics_export = self.scheduler.clock.now()
+        if not metrics.enabled:
+            return
+        metrics.write_snapshot(self.metrics_path)
+        self.logger.log_activity("metrics", metrics.compact_snapshot())
     
     def start_monitoring(self):
         """Start the monitoring loop"""
+        self.start_retention()
         try:
             while True:
-                # Check if system is idle
-                idle_time = self.system_monitor.get_idle_time()
-                is_idle = int(idle_time) > self.idle_threshold
-                
-                # When the user is present
-                if not is_idle:
-                    screenshot_path = None
-                    
-                    if self.screenshot_enabled:
-                        screenshot_path = self.screen_capture.capture()
-                        self.logger.log_activity("screenshot", {"path": screenshot_path})
-
-                    # Get the window info
-                    window_info = self.system_monitor.get_active_window_info()
-                    self.logger.log_activity("window_info", window_info)
-                    print(window_info)
-                    
-                    #TODO: give the ai self.stats.get_most_used_windows(10, 3)
-                    
-                    # Analyze using window title
-                    if self.ai_enabled:
-                        self.analyze_and_warn(screenshot_path, window_info)
-    
-                    # Keep logging until we need to analyze the screen again
-                    for _ in range(self.analyze_interval):
-                        self.logger.log_activity("window_info", self.system_monitor.get_active_window_info())
-                        time.sleep(1)
-                else:
-                    print(f"System idle for {idle_time} seconds")
-                    time.sleep(self.analyze_interval)
+                self.tick()
+                self.scheduler.wait()
                 
         except KeyboardInterrupt:
             print("Monitoring stopped by user")
@@ -149,11 +403,46 @@ class ScreenNanny:
             print(f"Error during monitoring: {str(e)}")
             import traceback
             print(traceback.format_exc())
+        finally:
+            self.shutdown()
+
+    def start_retention(self):
+        """Downsample and expire old log entries in the background"""
+        self.retention = RetentionWorker(RetentionPolicy.from_env(
+            log_dir=self.logger.log_dir, lock=self.logger.lock, rollups=self.rollups
+        ), defer=self.governor.defer_background if self.governor else None)
+        self.retention.start()
+
+    def shutdown(self):
+        """Stop background work and write out what is only kept in memory"""
+        if self.retention:
+            self.retention.stop()
+        if self.hotkeys:
+            self.hotkeys.stop()
+        if self.rollups:
+            self.rollups.flush()
+            self.search_index.flush()
+        self.focus_sessions.save()
+        self.system_monitor.flush()
+        self.export_metrics()
+        self.save_state(force=True)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Screen Nanny monitor")
+    parser.add_argument("--headless", action="store_true",
+                        help="only log window activity, without AI, UI or hotkeys")
+    parser.add_argument("--processes", action="store_true",
+                        help="run the sampler, logger, analyzer and UI as supervised processes")
+    args = parser.parse_args()
     debug = False
     
-    if debug:
+    if args.processes:
+        from supervisor import run_supervised
+        run_supervised(headless=args.headless)
+    elif args.headless:
+        nanny = ScreenNanny(headless=True)
+        nanny.start_monitoring()
+    elif debug:
         nanny = ScreenNanny(ai_enabled=False)
         # nanny.start_monitoring() 
         print(nanny.stats.get_most_used_windows(10, 3))
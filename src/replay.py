@@ -0,0 +1,306 @@
+"""
+Deterministic replay of recorded or synthetic sessions through ScreenNanny.
+
+Window and idle state come from the recording, time is virtual, and the AI,
+modal and focus dialog are fakes, so the whole pipeline runs headless:
+
+    python src/replay.py --input logs/activity_data.json
+    python src/replay.py --synthetic-days 1 --speed 1000
+"""
+import argparse
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from main import ScreenNanny
+from screen_monitor.idle import FakeIdleBackend
+from screen_monitor.window_durations import WindowDurationTracker
+from utils.logger import ActivityLogger
+from utils.json_stream import iter_json_array
+from utils.scheduler import VirtualClock
+from utils.synthetic import DISTRACTING_WORDS, SyntheticActivity
+
+
+class ReplayClock(VirtualClock):
+    """Virtual clock anchored at the recording's start, optionally paced against real time"""
+
+    def __init__(self, start_datetime, speed=None):
+        super().__init__()
+        self.start_datetime = start_datetime
+        self.speed = speed
+
+    def sleep(self, seconds):
+        super().sleep(seconds)
+        if self.speed and seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def datetime(self):
+        return self.start_datetime + timedelta(seconds=self.current)
+
+
+class ReplayTimeline:
+    """Window samples and focus events as offsets in seconds from the first sample"""
+
+    def __init__(self, entries):
+        self.samples = []
+        self.focus_events = []
+        self.start = None
+        for entry in entries:
+            try:
+                ts = datetime.fromisoformat(entry["timestamp"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if self.start is None:
+                self.start = ts
+            offset = (ts - self.start).total_seconds()
+            data = entry.get("data") or {}
+            if entry.get("type") == "window_info" and "window_title" in data:
+                self.samples.append((offset, data))
+            elif entry.get("type") in ("focus_mode_start", "focus_mode_end"):
+                self.focus_events.append((offset, entry["type"], data.get("description")))
+        self.samples.sort(key=lambda sample: sample[0])
+        self.focus_events.sort(key=lambda event: event[0])
+
+    @property
+    def duration(self):
+        return self.samples[-1][0] if self.samples else 0.0
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(iter_json_array(path))
+
+    @classmethod
+    def synthetic(cls, **kwargs):
+        return cls(SyntheticActivity(**kwargs).iter_entries())
+
+
+class ReplaySystemMonitor:
+    """
+    Stands in for SystemMonitor, answering from the timeline at the clock's time.
+
+    A gap between recorded samples longer than max_sample_gap is treated as the
+    user being idle, with idle time counted from the last sample before it.
+    """
+
+    def __init__(self, timeline, clock, max_sample_gap=10):
+        self.samples = timeline.samples
+        self.clock = clock
+        self.max_sample_gap = max_sample_gap
+        self.index = 0
+        self.idle_backend = FakeIdleBackend()
+        self.idle_backend.name = "replay"
+        self.window_tracker = WindowDurationTracker(clock=clock)
+
+    def _advance(self):
+        now = self.clock.now()
+        while self.index + 1 < len(self.samples) and self.samples[self.index + 1][0] <= now:
+            self.index += 1
+
+    def get_idle_time(self):
+        self._advance()
+        now = self.clock.now()
+        offset = self.samples[self.index][0]
+        if self.index + 1 < len(self.samples):
+            gap = self.samples[self.index + 1][0] - offset
+        else:
+            gap = float("inf")
+        idle = now - offset if gap > self.max_sample_gap else 0.0
+        self.idle_backend.set_idle(idle)
+        return self.idle_backend.get_idle_time()
+
+    def get_active_window_info(self):
+        self._advance()
+        data = self.samples[self.index][1]
+        return {**data, "timestamp": self.clock.datetime().isoformat()}
+
+    def update_window_info(self):
+        window_info = self.get_active_window_info()
+        self.window_tracker.update(window_info.get("window_title"))
+        return window_info
+
+    def flush(self):
+        pass
+
+
+class MemoryActivityLogger(ActivityLogger):
+    """ActivityLogger that keeps entries in memory instead of rewriting the JSON file"""
+
+    def __init__(self, log_dir, now=None):
+        super().__init__(log_dir=log_dir, now=now)
+        self.entries = []
+
+    def _append_to_json(self, entry):
+        self.entries.append(entry)
+
+    def iter_logs(self, start_time=None, end_time=None, activity_type=None):
+        for log in self.entries:
+            log_time = datetime.fromisoformat(log["timestamp"])
+            if start_time and log_time < start_time:
+                continue
+            if end_time and log_time > end_time:
+                continue
+            if activity_type and log["type"] != activity_type:
+                continue
+            yield log
+
+
+class FakeAnalyzer:
+    """Keyword verdicts in VisionAnalyzer's format, with optional simulated latency"""
+
+    def __init__(self, distracting_words=DISTRACTING_WORDS, latency=0.0, timeout=10):
+        self.distracting_words = distracting_words
+        self.latency = latency
+        self.timeout = timeout
+        self.calls = 0
+        self.last_context = None
+        self.token_usage = {"total_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def analyze_window_title(self, window_info, focus_description=None, context=None):
+        self.calls += 1
+        self.last_context = context
+        if self.latency:
+            time.sleep(self.latency)
+        title = window_info.get("window_title", "")
+        is_distracted = any(word.lower() in title.lower() for word in self.distracting_words)
+        return {
+            "is_distracted": is_distracted,
+            "reason": f"Replay verdict for {title[:40]}",
+            "timeout": self.timeout if is_distracted else 0,
+        }
+
+    def get_token_usage(self):
+        return self.token_usage
+
+
+class FakeModal:
+    """Records warnings instead of drawing them"""
+
+    def __init__(self):
+        self.messages = []
+
+    def show_message(self, message, duration=5, is_fullscreen=True):
+        self.messages.append((message, duration))
+
+
+class FakeFocusDialog:
+    def show_dialog(self, on_focus_set, is_active=False, current_focus=None, on_cancel=None):
+        pass
+
+
+class ReplayHarness:
+    """Drives a ScreenNanny built from fakes through a timeline"""
+
+    def __init__(self, timeline, speed=None, analyzer=None, ai_enabled=True, quiet=True, **nanny_kwargs):
+        if not timeline.samples:
+            raise ValueError("Timeline has no window_info samples to replay")
+        self.timeline = timeline
+        self.quiet = quiet
+        self.clock = ReplayClock(timeline.start, speed)
+        self.log_dir = tempfile.mkdtemp(prefix="screen-nanny-replay-")
+        self.logger = MemoryActivityLogger(self.log_dir, now=self.clock.datetime)
+        self.analyzer = analyzer or FakeAnalyzer()
+        self.modal = FakeModal()
+        with self._output():
+            self.nanny = ScreenNanny(
+                ai_enabled=ai_enabled,
+                system_monitor=ReplaySystemMonitor(timeline, self.clock),
+                logger=self.logger,
+                vision_analyzer=self.analyzer,
+                modal=self.modal,
+                focus_dialog=FakeFocusDialog(),
+                clock=self.clock,
+                enable_hotkey=False,
+                **nanny_kwargs
+            )
+        # Replays start outside focus mode regardless of the local db
+        self.nanny.focus_mode = False
+        self.nanny.focus_description = None
+
+    def _output(self):
+        return contextlib.redirect_stdout(io.StringIO()) if self.quiet else contextlib.nullcontext()
+
+    def _apply_focus_events(self, focus_events):
+        now = self.clock.now()
+        while focus_events and focus_events[0][0] <= now:
+            _, event_type, description = focus_events.pop(0)
+            self.nanny.focus_mode = event_type == "focus_mode_start"
+            self.nanny.focus_description = description if self.nanny.focus_mode else None
+
+    def run(self):
+        """Replay the whole timeline and return a report"""
+        focus_events = list(self.timeline.focus_events)
+        end = self.timeline.duration
+        ticks = 0
+        wall_start = time.perf_counter()
+        try:
+            with self._output():
+                while self.clock.now() <= end:
+                    self._apply_focus_events(focus_events)
+                    self.nanny.tick()
+                    self.nanny.scheduler.wait()
+                    ticks += 1
+        finally:
+            wall_seconds = time.perf_counter() - wall_start
+            shutil.rmtree(self.log_dir, ignore_errors=True)
+
+        entries = self.logger.entries
+        decisions = [
+            {
+                "timestamp": entry["timestamp"],
+                "is_distracted": entry["data"]["analysis"]["is_distracted"],
+                "reason": entry["data"]["analysis"]["reason"],
+            }
+            for entry in entries if entry["type"] == "ai_analysis"
+        ]
+        window_samples = sum(1 for entry in entries if entry["type"] == "window_info")
+        return {
+            "virtual_seconds": end,
+            "wall_seconds": wall_seconds,
+            "speedup": end / wall_seconds if wall_seconds else float("inf"),
+            "ticks": ticks,
+            "ticks_per_second": ticks / wall_seconds if wall_seconds else float("inf"),
+            "recorded_samples": len(self.timeline.samples),
+            "window_samples_logged": window_samples,
+            "events_logged": len(entries),
+            "events_per_second": len(entries) / wall_seconds if wall_seconds else float("inf"),
+            "analyses": self.analyzer.calls,
+            "distracted_verdicts": sum(1 for d in decisions if d["is_distracted"]),
+            "warnings": len(self.modal.messages),
+            "decisions": decisions,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="recorded activity_data.json to replay")
+    source.add_argument("--synthetic-days", type=int, help="replay this many days of synthetic activity")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--speed", type=float, default=None,
+                        help="pace virtual time at this multiple of real time (default: as fast as possible)")
+    parser.add_argument("--no-ai", action="store_true", help="replay with AI analysis disabled")
+    parser.add_argument("--out", help="write the full report as JSON")
+    args = parser.parse_args()
+
+    if args.input:
+        timeline = ReplayTimeline.from_file(args.input)
+    else:
+        timeline = ReplayTimeline.synthetic(days=args.synthetic_days, seed=args.seed)
+
+    report = ReplayHarness(timeline, speed=args.speed, ai_enabled=not args.no_ai).run()
+
+    for key, value in report.items():
+        if key != "decisions":
+            print(f"{key:24} {value:,.2f}" if isinstance(value, float) else f"{key:24} {value}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
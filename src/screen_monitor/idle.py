@@ -0,0 +1,349 @@
+import ctypes
+import ctypes.util
+import glob
+import os
+import platform
+import time
+
+
+class IdleDetectionError(Exception):
+    """Raised by a backend when it cannot read the idle time"""
+
+
+class IdleBackend:
+    """
+    Base class for idle time sources.
+
+    Subclasses implement available() and _idle_seconds(). get_idle_time()
+    wraps the call so failures are counted instead of silently disabling idle
+    detection.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.last_error = None
+
+    def available(self):
+        return False
+
+    def _idle_seconds(self):
+        raise NotImplementedError
+
+    def get_idle_time(self):
+        """Returns the number of seconds since last user input, 0 if unknown"""
+        self.calls += 1
+        try:
+            return float(self._idle_seconds())
+        except Exception as e:
+            self.errors += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            return 0
+
+    def get_stats(self):
+        return {
+            "backend": self.name,
+            "calls": self.calls,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+class LASTINPUTINFO(ctypes.Structure):
+    _fields_ = [
+        ('cbSize', ctypes.c_uint),
+        ('dwTime', ctypes.c_uint),
+    ]
+
+
+class WindowsIdleBackend(IdleBackend):
+    """GetLastInputInfo from user32"""
+
+    name = "windows"
+
+    def __init__(self):
+        super().__init__()
+        self.windll = None
+        self.last_input_info = LASTINPUTINFO()
+        self.last_input_info.cbSize = ctypes.sizeof(self.last_input_info)
+
+    def available(self):
+        if platform.system() != "Windows":
+            return False
+        self.windll = ctypes.windll
+        return True
+
+    def _idle_seconds(self):
+        if not self.windll.user32.GetLastInputInfo(ctypes.byref(self.last_input_info)):
+            raise IdleDetectionError("GetLastInputInfo failed")
+        millis = self.windll.kernel32.GetTickCount() - self.last_input_info.dwTime
+        return millis / 1000.0  # Convert to seconds
+
+
+class MacIdleBackend(IdleBackend):
+    """CGEventSource idle time, requires pyobjc-framework-Quartz"""
+
+    name = "quartz"
+
+    def __init__(self):
+        super().__init__()
+        self.quartz = None
+
+    def available(self):
+        if platform.system() != "Darwin":
+            return False
+        try:
+            import Quartz
+        except ImportError:
+            return False
+        self.quartz = Quartz
+        return True
+
+    def _idle_seconds(self):
+        return self.quartz.CGEventSourceSecondsSinceLastEventType(
+            self.quartz.kCGEventSourceStateHIDSystemState,
+            self.quartz.kCGAnyInputEventType
+        )
+
+
+class XScreenSaverInfo(ctypes.Structure):
+    _fields_ = [
+        ('window', ctypes.c_ulong),
+        ('state', ctypes.c_int),
+        ('kind', ctypes.c_int),
+        ('til_or_since', ctypes.c_ulong),
+        ('idle', ctypes.c_ulong),
+        ('eventMask', ctypes.c_ulong),
+    ]
+
+
+class XScreenSaverIdleBackend(IdleBackend):
+    """
+    In-process XScreenSaver extension query through libX11/libXss.
+
+    The display connection and info struct are opened once, so each call is a
+    single round trip to the X server instead of forking xprintidle.
+    """
+
+    name = "xscreensaver"
+
+    def __init__(self):
+        super().__init__()
+        self.xss = None
+        self.display = None
+        self.root = None
+        self.info = None
+
+    def available(self):
+        if platform.system() != "Linux" or not os.environ.get("DISPLAY"):
+            return False
+        x11_path = ctypes.util.find_library("X11")
+        xss_path = ctypes.util.find_library("Xss")
+        if not x11_path or not xss_path:
+            return False
+        try:
+            xlib = ctypes.cdll.LoadLibrary(x11_path)
+            xss = ctypes.cdll.LoadLibrary(xss_path)
+        except OSError:
+            return False
+
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xss.XScreenSaverQueryExtension.argtypes = [
+            ctypes.c_void_p, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int)
+        ]
+        xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(XScreenSaverInfo)
+        xss.XScreenSaverQueryInfo.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XScreenSaverInfo)
+        ]
+
+        display = xlib.XOpenDisplay(None)
+        if not display:
+            return False
+        event_base, error_base = ctypes.c_int(), ctypes.c_int()
+        if not xss.XScreenSaverQueryExtension(display, ctypes.byref(event_base), ctypes.byref(error_base)):
+            return False
+
+        self.xss = xss
+        self.display = display
+        self.root = xlib.XDefaultRootWindow(display)
+        self.info = xss.XScreenSaverAllocInfo()
+        return True
+
+    def _idle_seconds(self):
+        if not self.xss.XScreenSaverQueryInfo(self.display, self.root, self.info):
+            raise IdleDetectionError("XScreenSaverQueryInfo failed")
+        return self.info.contents.idle / 1000.0
+
+
+class DevInputIdleBackend(IdleBackend):
+    """
+    Idle time from raw evdev devices, for Wayland sessions or X without libXss.
+
+    Only keyboards and pointers are opened (non-blocking), going by the
+    EV_KEY and EV_REL capabilities the kernel lists in sysfs; accelerometers,
+    lid switches and power buttons report events without the user being
+    there. Each call drains whatever events arrived since the last one; if
+    any did, the user was active. A device that fails to read (unplugged) is
+    dropped, and new devices are picked up every rescan_interval seconds.
+    Requires membership of the input group.
+    """
+
+    name = "dev_input"
+
+    # Bits of the capability bitmaps: KEY_Q..KEY_P, BTN_LEFT, BTN_TOUCH, REL_X and REL_Y
+    LETTER_KEYS = range(16, 26)
+    POINTER_BUTTONS = (272, 330)
+    POINTER_AXES = (0, 1)
+
+    def __init__(self, pattern="/dev/input/event*", clock=time.monotonic, sys_root="/sys/class/input",
+                 rescan_interval=10):
+        super().__init__()
+        self.pattern = pattern
+        self.clock = clock
+        self.sys_root = sys_root
+        self.rescan_interval = rescan_interval
+        self.devices = {}  # path -> fd
+        self.last_scan = None
+        self.last_input = None
+
+    def available(self):
+        if platform.system() != "Linux":
+            return False
+        self._scan()
+        self.last_input = self.clock()
+        return bool(self.devices)
+
+    def _capabilities(self, path, kind):
+        """A device's capability bitmap from sysfs, as an int (0 if unknown)"""
+        caps_path = os.path.join(self.sys_root, os.path.basename(path), "device", "capabilities", kind)
+        try:
+            with open(caps_path) as f:
+                words = f.read().split()
+        except OSError:
+            return 0
+        # Space separated longs, most significant first
+        bits = ctypes.sizeof(ctypes.c_long) * 8
+        value = 0
+        for word in words:
+            value = (value << bits) | int(word, 16)
+        return value
+
+    def _is_user_input(self, path):
+        keys = self._capabilities(path, "key")
+        if all(keys >> bit & 1 for bit in self.LETTER_KEYS):
+            return True
+        if any(keys >> bit & 1 for bit in self.POINTER_BUTTONS):
+            return True
+        rel = self._capabilities(path, "rel")
+        return all(rel >> bit & 1 for bit in self.POINTER_AXES)
+
+    def _scan(self):
+        self.last_scan = self.clock()
+        for path in glob.glob(self.pattern):
+            if path in self.devices or not self._is_user_input(path):
+                continue
+            try:
+                self.devices[path] = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            except OSError:
+                continue
+
+    def _idle_seconds(self):
+        now = self.clock()
+        if now - self.last_scan >= self.rescan_interval:
+            self._scan()
+        for path, fd in list(self.devices.items()):
+            try:
+                while os.read(fd, 4096):
+                    self.last_input = now
+            except BlockingIOError:
+                continue
+            except OSError:
+                # ENODEV once unplugged, and on every read after; a rescan reopens it if it comes back
+                del self.devices[path]
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        return now - self.last_input
+
+
+class NullIdleBackend(IdleBackend):
+    """Used when no backend works; every call is counted as an error"""
+
+    name = "none"
+
+    def available(self):
+        return True
+
+    def _idle_seconds(self):
+        raise IdleDetectionError("no idle backend available on this system")
+
+
+class FakeIdleBackend(IdleBackend):
+    """Scriptable idle source for tests and replays"""
+
+    name = "fake"
+
+    def __init__(self, idle_seconds=0.0):
+        super().__init__()
+        self.idle = idle_seconds
+
+    def available(self):
+        return True
+
+    def set_idle(self, seconds):
+        self.idle = seconds
+
+    def _idle_seconds(self):
+        if isinstance(self.idle, Exception):
+            raise self.idle
+        return self.idle
+
+
+IDLE_BACKENDS = [
+    WindowsIdleBackend,
+    MacIdleBackend,
+    XScreenSaverIdleBackend,
+    DevInputIdleBackend,
+]
+
+
+def select_idle_backend(candidates=None):
+    """Return the first backend that works on this system, chosen once at startup"""
+    for backend_class in candidates or IDLE_BACKENDS:
+        backend = backend_class()
+        try:
+            if backend.available():
+                return backend
+        except Exception as e:
+            print(f"Idle backend {backend.name} failed to start: {e}")
+    print("Warning: no idle detection backend available, idle time will always be 0")
+    return NullIdleBackend()
+
+
+def benchmark_backend(backend, iterations=1000):
+    """Measure the per-call cost of a backend in microseconds"""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        backend.get_idle_time()
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return {
+        "backend": backend.name,
+        "iterations": iterations,
+        "mean_us": sum(timings) / len(timings),
+        "p50_us": timings[len(timings) // 2],
+        "p99_us": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        "errors": backend.errors,
+    }
+
+
+if __name__ == "__main__":
+    backend = select_idle_backend()
+    print(benchmark_backend(backend))
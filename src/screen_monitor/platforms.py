@@ -0,0 +1,263 @@
+import ctypes
+import ctypes.util
+import os
+import platform
+from datetime import datetime
+
+
+class WindowBackend:
+    """
+    Base class for foreground window sources.
+
+    Platform modules are imported in available(), so importing this module
+    (and SystemMonitor) never pulls in win32 or Quartz on other systems.
+    """
+
+    name = "base"
+
+    def available(self):
+        return False
+
+    def get_foreground_window(self):
+        """Return (window_title, pid) of the focused window"""
+        raise NotImplementedError
+
+
+class Win32WindowBackend(WindowBackend):
+    name = "win32"
+
+    def available(self):
+        if platform.system() != "Windows":
+            return False
+        try:
+            import win32gui
+            import win32process
+        except ImportError:
+            return False
+        self.win32gui = win32gui
+        self.win32process = win32process
+        return True
+
+    def get_foreground_window(self):
+        window = self.win32gui.GetForegroundWindow()
+        _, pid = self.win32process.GetWindowThreadProcessId(window)
+        return self.win32gui.GetWindowText(window), pid
+
+
+class MacWindowBackend(WindowBackend):
+    """Frontmost app from NSWorkspace and its top window title from Quartz"""
+
+    name = "quartz"
+
+    def available(self):
+        if platform.system() != "Darwin":
+            return False
+        try:
+            import Quartz
+            from AppKit import NSWorkspace
+        except ImportError:
+            return False
+        self.quartz = Quartz
+        self.workspace = NSWorkspace.sharedWorkspace()
+        return True
+
+    def get_foreground_window(self):
+        app = self.workspace.frontmostApplication()
+        pid = app.processIdentifier()
+        title = app.localizedName() or ""
+        windows = self.quartz.CGWindowListCopyWindowInfo(
+            self.quartz.kCGWindowListOptionOnScreenOnly | self.quartz.kCGWindowListExcludeDesktopElements,
+            self.quartz.kCGNullWindowID
+        )
+        for window in windows:
+            if window.get("kCGWindowOwnerPID") == pid and window.get("kCGWindowLayer") == 0:
+                title = window.get("kCGWindowName") or title
+                break
+        return title, pid
+
+
+class X11WindowBackend(WindowBackend):
+    """EWMH _NET_ACTIVE_WINDOW lookup through libX11 via ctypes"""
+
+    name = "x11"
+
+    XA_CARDINAL = 6
+    XA_WINDOW = 33
+    ANY_PROPERTY_TYPE = 0
+
+    def available(self):
+        if platform.system() != "Linux" or not os.environ.get("DISPLAY"):
+            return False
+        x11_path = ctypes.util.find_library("X11")
+        if not x11_path:
+            return False
+        try:
+            xlib = ctypes.cdll.LoadLibrary(x11_path)
+        except OSError:
+            return False
+
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XInternAtom.restype = ctypes.c_ulong
+        xlib.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        xlib.XGetWindowProperty.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_long, ctypes.c_long,
+            ctypes.c_int, ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.POINTER(ctypes.c_ubyte)),
+        ]
+        xlib.XFree.argtypes = [ctypes.c_void_p]
+
+        display = xlib.XOpenDisplay(None)
+        if not display:
+            return False
+        self.xlib = xlib
+        self.display = display
+        self.root = xlib.XDefaultRootWindow(display)
+        self.atoms = {
+            name: xlib.XInternAtom(display, name.encode(), False)
+            for name in ("_NET_ACTIVE_WINDOW", "_NET_WM_NAME", "_NET_WM_PID", "UTF8_STRING", "WM_NAME")
+        }
+        return True
+
+    def _get_property(self, window, atom, req_type, length=1024):
+        """Return (format, item_count, raw bytes) of a window property, or None"""
+        actual_type = ctypes.c_ulong()
+        actual_format = ctypes.c_int()
+        nitems = ctypes.c_ulong()
+        bytes_after = ctypes.c_ulong()
+        data = ctypes.POINTER(ctypes.c_ubyte)()
+        status = self.xlib.XGetWindowProperty(
+            self.display, window, atom, 0, length, False, req_type,
+            ctypes.byref(actual_type), ctypes.byref(actual_format), ctypes.byref(nitems),
+            ctypes.byref(bytes_after), ctypes.byref(data)
+        )
+        if status != 0 or not data:
+            return None
+        try:
+            if nitems.value == 0:
+                return None
+            # Format 32 properties are stored as C longs in memory
+            item_size = ctypes.sizeof(ctypes.c_ulong) if actual_format.value == 32 else actual_format.value // 8
+            return actual_format.value, nitems.value, ctypes.string_at(data, nitems.value * item_size)
+        finally:
+            self.xlib.XFree(data)
+
+    def _get_cardinal(self, window, atom, req_type):
+        prop = self._get_property(window, atom, req_type, length=1)
+        if prop is None:
+            return None
+        return ctypes.c_ulong.from_buffer_copy(prop[2][:ctypes.sizeof(ctypes.c_ulong)]).value
+
+    def get_foreground_window(self):
+        window = self._get_cardinal(self.root, self.atoms["_NET_ACTIVE_WINDOW"], self.XA_WINDOW)
+        if not window:
+            return "", None
+        title_prop = (
+            self._get_property(window, self.atoms["_NET_WM_NAME"], self.atoms["UTF8_STRING"])
+            or self._get_property(window, self.atoms["WM_NAME"], self.ANY_PROPERTY_TYPE)
+        )
+        title = title_prop[2].decode("utf-8", "replace") if title_prop else ""
+        pid = self._get_cardinal(window, self.atoms["_NET_WM_PID"], self.XA_CARDINAL)
+        return title, pid
+
+
+class NullWindowBackend(WindowBackend):
+    """Used when no backend works, e.g. a headless server"""
+
+    name = "none"
+
+    def available(self):
+        return True
+
+    def get_foreground_window(self):
+        raise RuntimeError("no foreground window backend available on this system")
+
+
+class FakeWindowBackend(WindowBackend):
+    """Cycles through a list of titles, switching every switch_every calls, for tests and benchmarks"""
+
+    name = "fake"
+
+    def __init__(self, titles=("Fake window - Editor", "Fake window - Browser"), switch_every=10):
+        self.titles = titles
+        self.switch_every = switch_every
+        self.calls = 0
+
+    def available(self):
+        return True
+
+    def get_foreground_window(self):
+        title = self.titles[(self.calls // self.switch_every) % len(self.titles)]
+        self.calls += 1
+        return title, os.getpid()
+
+
+WINDOW_BACKENDS = {
+    "win32": Win32WindowBackend,
+    "quartz": MacWindowBackend,
+    "x11": X11WindowBackend,
+}
+# Only used when asked for by name, never picked automatically
+EXPLICIT_WINDOW_BACKENDS = {
+    "fake": FakeWindowBackend,
+}
+
+
+def register_window_backend(name, backend_class):
+    """Add a backend to the registry, it is tried before the built-in ones"""
+    global WINDOW_BACKENDS
+    WINDOW_BACKENDS = {name: backend_class, **{k: v for k, v in WINDOW_BACKENDS.items() if k != name}}
+
+
+def select_window_backend(name=None):
+    """
+    Return a working backend. If name (or SCREEN_NANNY_WINDOW_BACKEND) is set,
+    only that backend is tried.
+    """
+    name = name or os.getenv("SCREEN_NANNY_WINDOW_BACKEND")
+    if name:
+        known = {**WINDOW_BACKENDS, **EXPLICIT_WINDOW_BACKENDS}
+        if name not in known:
+            raise ValueError(f"Unknown window backend '{name}', expected one of {', '.join(known)}")
+        candidates = [known[name]]
+    else:
+        candidates = WINDOW_BACKENDS.values()
+
+    for backend_class in candidates:
+        backend = backend_class()
+        try:
+            if backend.available():
+                return backend
+        except Exception as e:
+            print(f"Window backend {backend.name} failed to start: {e}")
+    print("Warning: no foreground window backend available, window info will report errors")
+    return NullWindowBackend()
+
+
+def read_window_info(window_backend, process_cache):
+    """Foreground window title and process, or an error entry"""
+    try:
+        window_title, pid = window_backend.get_foreground_window()
+        if pid is None:
+            # e.g. X11 windows without _NET_WM_PID; psutil.Process(None) would be this process
+            process_name = app_name = "Unknown Process"
+        else:
+            process_info = process_cache.get(pid)
+            process_name = process_info.name
+            app_name = process_info.app_name
+        
+        return {
+            "window_title": window_title,
+            "process_name": process_name,
+            "app_name": app_name,
+            "pid": pid,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        return {
+            "error": str(e),
+            "timestamp": datetime.now().isoformat()
+        }
@@ -0,0 +1,150 @@
+import os
+import time
+from collections import OrderedDict
+
+import psutil
+
+# Processes that are never treated as the app a helper belongs to
+SESSION_ROOTS = {
+    "explorer.exe", "systemd", "init", "launchd", "gnome-shell", "kwin_x11",
+    "kwin_wayland", "plasmashell", "services.exe", "svchost.exe", "wininit.exe",
+    "bash", "zsh", "sh", "fish", "cmd.exe", "powershell.exe", "pwsh.exe",
+}
+
+
+class ProcessInfo:
+    """Metadata for one process instance, filled in lazily"""
+
+    __slots__ = ("pid", "create_time", "name", "_process", "_exe", "_cmdline", "_app_name")
+
+    def __init__(self, process, name, create_time):
+        self.pid = process.pid
+        self.create_time = create_time
+        self.name = name
+        self._process = process
+        self._exe = None
+        self._cmdline = None
+        self._app_name = None
+
+    def is_running(self):
+        """False once the process has exited or its pid belongs to a new process"""
+        try:
+            # psutil compares the pid's create_time with the one read at creation
+            return self._process.is_running()
+        except psutil.Error:
+            return False
+
+    @property
+    def exe(self):
+        if self._exe is None:
+            try:
+                self._exe = self._process.exe()
+            except (psutil.Error, OSError):
+                self._exe = ""
+        return self._exe
+
+    @property
+    def cmdline(self):
+        if self._cmdline is None:
+            try:
+                self._cmdline = self._process.cmdline()
+            except (psutil.Error, OSError):
+                self._cmdline = []
+        return self._cmdline
+
+    @property
+    def app_name(self):
+        """
+        Name of the app this process belongs to.
+
+        Helper processes (browser renderers, Electron GPU processes) are
+        launched by the main app with the same executable, so walk up the
+        parents while they run the same exe and use the top-most one.
+        """
+        if self._app_name is None:
+            self._app_name = self.name
+            try:
+                exe = self.exe
+                parent = self._process.parent()
+                while parent is not None and exe:
+                    parent_name = parent.name()
+                    if parent_name.lower() in SESSION_ROOTS or parent.exe() != exe:
+                        break
+                    self._app_name = parent_name
+                    parent = parent.parent()
+            except (psutil.Error, OSError):
+                pass
+        return self._app_name
+
+
+class ProcessInfoCache:
+    """
+    Bounded cache of process metadata keyed by pid.
+
+    The foreground window usually belongs to the same process for long
+    stretches, so the psutil lookup only has to happen once per process
+    instance. A hit checks the cached Process is still running, which
+    compares the pid's create_time with the cached one, so a reused pid is
+    never reported with the old process's name.
+    """
+
+    def __init__(self, max_size=256, sweep_interval=60, clock=time.monotonic):
+        self.max_size = max_size
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.last_sweep = clock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, pid):
+        """Return the ProcessInfo for a pid, raises psutil.Error if it's gone"""
+        now = self.clock()
+        info = self.entries.get(pid)
+        if info is not None and info.is_running():
+            self.hits += 1
+            self.entries.move_to_end(pid)
+        else:
+            if info is not None:
+                # Exited, or the pid now belongs to another process
+                del self.entries[pid]
+                self.evictions += 1
+            self.misses += 1
+            process = psutil.Process(pid)
+            info = ProcessInfo(process, process.name(), process.create_time())
+            self.entries[pid] = info
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+        if now - self.last_sweep >= self.sweep_interval:
+            self.sweep()
+        return info
+
+    def sweep(self):
+        """Drop entries for processes that have exited"""
+        self.last_sweep = self.clock()
+        for pid, info in list(self.entries.items()):
+            if not info.is_running():
+                del self.entries[pid]
+                self.evictions += 1
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    cache = ProcessInfoCache()
+    start = time.perf_counter()
+    for _ in range(1000):
+        info = cache.get(os.getpid())
+    print(f"{(time.perf_counter() - start) * 1000:.1f} us per lookup")
+    print(info.name, info.exe, info.app_name, cache.get_stats())
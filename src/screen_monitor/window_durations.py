@@ -0,0 +1,172 @@
+import heapq
+
+from utils.scheduler import MonotonicClock
+
+
+class WindowDurationTracker:
+    """
+    Total (lifetime) and consecutive seconds per window title.
+
+    Each sample credits the time since the previous one to the current window,
+    so an update is O(1) and totals are always current. Gaps longer than
+    max_gap (idle, sleep) aren't credited.
+
+    - Top-N: totals are pushed onto a max-heap when a window loses focus;
+      entries that no longer match the window's total are dropped when a
+      query pops them, so queries don't sort every window.
+    - Compaction: windows are kept in least-recently-active order and each
+      update looks at a few of the oldest. One inactive for compact_after
+      seconds is dropped if its total is under min_total, otherwise it is
+      left alone until it's active again.
+    - Checkpoints: the durations are written to db at most every
+      checkpoint_interval seconds, and by flush().
+    """
+
+    def __init__(self, durations=None, db=None, clock=None, max_gap=10, checkpoint_interval=60,
+                 compact_after=1800, min_total=60, compact_batch=8):
+        self.clock = clock or MonotonicClock()
+        self.db = db
+        self.max_gap = max_gap
+        self.checkpoint_interval = checkpoint_interval
+        self.compact_after = compact_after
+        self.min_total = min_total
+        self.compact_batch = compact_batch
+        self.durations = {}  # title -> {"total", "consecutive"}
+        self.heap = []  # (-total, title), stale entries included
+        self.recent = {}  # title -> last active time, least recent first
+        self.current_title = None
+        self.last_sample = None
+        now = self.clock.now()
+        self.last_checkpoint = now
+        self.dirty = False
+        # Between load_state() and resume(), when samples come with times on another clock
+        self.replaying = False
+        for title, data in (durations or {}).items():
+            self.durations[title] = {"total": data.get("total", 0), "consecutive": 0}
+            heapq.heappush(self.heap, (-self.durations[title]["total"], title))
+            self.recent[title] = now
+
+    def update(self, title, now=None):
+        """Record a sample of the foreground window, taken now unless a time on another clock is given"""
+        now = self.clock.now() if now is None else now
+        if self.last_sample is not None and self.current_title is not None:
+            elapsed = min(now - self.last_sample, self.max_gap)
+            current = self.durations.get(self.current_title)
+            if current is not None and elapsed > 0:
+                current["total"] += elapsed
+                current["consecutive"] += elapsed
+                self.dirty = True
+        self.last_sample = now
+
+        if title != self.current_title:
+            previous = self.durations.get(self.current_title)
+            if previous is not None:
+                previous["consecutive"] = 0
+                heapq.heappush(self.heap, (-previous["total"], self.current_title))
+            if title not in self.durations:
+                self.durations[title] = {"total": 0, "consecutive": 0}
+            self.current_title = title
+
+        # Move to the end, the most recently active
+        self.recent.pop(title, None)
+        self.recent[title] = now
+
+        if self.replaying:
+            # recent and last_checkpoint are on the tracker's clock, not the samples'
+            return
+        self._compact(now)
+        if self.dirty and now - self.last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint(now)
+
+    def _compact(self, now):
+        for _ in range(self.compact_batch):
+            title = next(iter(self.recent), None)
+            if title is None or title == self.current_title or now - self.recent[title] < self.compact_after:
+                break
+            del self.recent[title]
+            if self.durations[title]["total"] < self.min_total:
+                del self.durations[title]
+                self.dirty = True
+        # Stale heap entries pile up with every switch, drop them once they outnumber the live ones
+        if len(self.heap) > 2 * len(self.durations) + 64:
+            self.heap = [(-data["total"], title) for title, data in self.durations.items()]
+            heapq.heapify(self.heap)
+
+    def get(self, title):
+        data = self.durations.get(title)
+        if data is None:
+            return {"total": 0, "consecutive": 0}
+        return {"total": int(data["total"]), "consecutive": int(data["consecutive"])}
+
+    def top(self, n=-1, min_total=0):
+        """[(title, {"total", "consecutive"})] by total, longest first"""
+        found = []
+        seen = set()
+        valid = []
+        current = self.durations.get(self.current_title)
+        while self.heap and (n == -1 or len(found) < n):
+            neg_total, title = self.heap[0]
+            data = self.durations.get(title)
+            if data is None or title == self.current_title or title in seen or -neg_total != data["total"]:
+                heapq.heappop(self.heap)
+                continue
+            if (current is not None and self.current_title not in seen
+                    and current["total"] > data["total"] and current["total"] >= min_total):
+                # The focused window's total changes every sample so it's never in the heap
+                found.append((self.current_title, self.get(self.current_title)))
+                seen.add(self.current_title)
+                continue
+            if data["total"] < min_total:
+                break
+            valid.append(heapq.heappop(self.heap))
+            found.append((title, self.get(title)))
+            seen.add(title)
+        for entry in valid:
+            heapq.heappush(self.heap, entry)
+        if (current is not None and self.current_title not in seen and current["total"] >= min_total
+                and (n == -1 or len(found) < n)):
+            found.append((self.current_title, self.get(self.current_title)))
+        return found
+
+    def snapshot(self):
+        return {title: self.get(title) for title in self.durations}
+
+    def to_state(self):
+        """Exact totals plus the focused window's run, for state checkpoints"""
+        return {
+            "durations": self.durations,
+            "current_title": self.current_title,
+        }
+
+    def load_state(self, state):
+        """
+        Restore from to_state. Samples replayed afterwards may pass their own
+        times to update(); compaction and checkpoints wait for resume().
+        """
+        now = self.clock.now()
+        self.durations = {title: dict(data) for title, data in state.get("durations", {}).items()}
+        self.current_title = state.get("current_title")
+        self.heap = [(-data["total"], title) for title, data in self.durations.items()]
+        heapq.heapify(self.heap)
+        self.recent = dict.fromkeys(self.durations, now)
+        self.last_sample = None
+        self.replaying = True
+
+    def resume(self):
+        """Go back to the tracker's own clock after samples were replayed with their own times"""
+        now = self.clock.now()
+        self.recent = dict.fromkeys(self.recent, now)
+        self.last_sample = None
+        self.last_checkpoint = now
+        self.replaying = False
+
+    def checkpoint(self, now=None):
+        """Write the durations to db if anything changed"""
+        self.last_checkpoint = self.clock.now() if now is None else now
+        if not self.dirty or self.db is None:
+            return
+        if self.db.set("window_durations", self.snapshot()):
+            self.dirty = False
+
+    def flush(self):
+        self.checkpoint()
@@ -0,0 +1,418 @@
+"""
+Runs Screen Nanny as separate, supervised processes:
+
+- sampler: polls idle time and the foreground window, and writes each sample
+  into a shared-memory ring (utils/event_ring.py). It only runs the idle and
+  window backends, the process cache and its scheduler; it doesn't use the
+  activity log, the database or the stores, and shares no GIL or lock with
+  the processes that do, so their work can't delay it.
+- logger: the only process that writes the activity log and the stores
+  derived from it (rollups, focus sessions, search index, window durations).
+- analyzer: asks the AI about windows and applies the warning policy.
+- ui: the warning modal, focus dialog and hotkey.
+
+The analyzer and UI publish their log events and commands into a second ring
+that the logger and the other consumers follow. Each consumer reads at its
+own pace and saves its position in the ring, so a worker that crashes or
+stops sending heartbeats is restarted and carries on where it left off.
+
+    python src/supervisor.py
+    python src/main.py --processes [--headless]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from datetime import datetime
+
+from utils.event_ring import EventRing, RecordTooLarge
+from utils.logger import ActivityLogger
+from utils.metrics import metrics
+
+# Saved cursor slot of each consumer in the rings
+CONSUMERS = {"logger": 0, "analyzer": 1, "ui": 2}
+POLL_INTERVAL = 0.05
+
+
+def make_record(kind, record_type, data, origin, timestamp=None, **extra):
+    """
+    A ring record. kind is "event" for what the logger should write,
+    "sample" for samples that are not logged (idle) and "command" for requests
+    to another worker (show_warning).
+    """
+    return {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "type": record_type,
+        "timestamp": timestamp or datetime.now().isoformat(),
+        "data": data,
+        "origin": origin,
+        **extra,
+    }
+
+
+def _entry(record):
+    """The activity log entry a record stands for"""
+    return {key: record[key] for key in ("id", "timestamp", "type", "data")}
+
+
+class WorkerContext:
+    """Handed to each worker: its heartbeat slot and the shared stop flag"""
+
+    def __init__(self, name, index, heartbeats, stop_event):
+        self.name = name
+        self.index = index
+        self.heartbeats = heartbeats
+        self.stop_event = stop_event
+
+    def beat(self):
+        self.heartbeats[self.index] = time.monotonic()
+
+    def stopping(self):
+        return self.stop_event.is_set()
+
+
+def _run_worker(target, context, args):
+    context.beat()
+    try:
+        target(context, *args)
+    except KeyboardInterrupt:
+        pass
+
+
+class Supervisor:
+    """
+    Starts the worker processes and restarts any that exit or stop sending
+    heartbeats for heartbeat_timeout seconds. Restarts back off from
+    min_backoff to max_backoff seconds, and the backoff resets once a worker
+    has stayed up for stable_after seconds.
+    """
+
+    def __init__(self, workers, heartbeat_timeout=120, min_backoff=1, max_backoff=30, stable_after=60):
+        self.workers = workers  # (name, target, args)
+        self.heartbeat_timeout = heartbeat_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.heartbeats = multiprocessing.Array("d", len(workers), lock=False)
+        self.stop_event = multiprocessing.Event()
+        self.processes = [None] * len(workers)
+        self.started_at = [0.0] * len(workers)
+        self.restart_at = [None] * len(workers)
+        self.backoff = [min_backoff] * len(workers)
+        self.restarts = [0] * len(workers)
+
+    def start(self):
+        for index in range(len(self.workers)):
+            self._spawn(index)
+
+    def _spawn(self, index):
+        name, target, args = self.workers[index]
+        self.heartbeats[index] = time.monotonic()
+        context = WorkerContext(name, index, self.heartbeats, self.stop_event)
+        process = multiprocessing.Process(target=_run_worker, args=(target, context, args),
+                                          name=f"screen-nanny-{name}", daemon=True)
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic()
+        self.restart_at[index] = None
+
+    def check(self):
+        """Restart workers that died or hung, call every second or so"""
+        now = time.monotonic()
+        for index, process in enumerate(self.processes):
+            name = self.workers[index][0]
+            if process is None:
+                if self.restart_at[index] is not None and now >= self.restart_at[index]:
+                    self._spawn(index)
+                continue
+
+            hung = now - self.heartbeats[index] > self.heartbeat_timeout
+            if process.is_alive() and not hung:
+                if now - self.started_at[index] >= self.stable_after:
+                    self.backoff[index] = self.min_backoff
+                continue
+
+            if process.is_alive():
+                print(f"Worker {name} sent no heartbeat for {now - self.heartbeats[index]:.0f}s, killing it")
+                process.terminate()
+                process.join(5)
+            backoff = self.backoff[index]
+            print(f"Worker {name} exited with code {process.exitcode}, restarting in {backoff}s")
+            metrics.counter("worker_restarts_total", "Worker processes restarted by the supervisor",
+                            worker=name).inc()
+            self.restarts[index] += 1
+            self.processes[index] = None
+            self.restart_at[index] = now + backoff
+            self.backoff[index] = min(backoff * 2, self.max_backoff)
+
+    def run(self, poll_interval=1):
+        self.start()
+        try:
+            while True:
+                self.check()
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            print("Monitoring stopped by user")
+        finally:
+            self.stop()
+
+    def stop(self, timeout=10):
+        """Ask every worker to finish, killing the ones that don't in time"""
+        self.stop_event.set()
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            if process is not None:
+                process.join(max(0.0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.terminate()
+
+
+# --- Stand-ins for in-process components, used by the consumer workers ---
+
+class RingLogger(ActivityLogger):
+    """ActivityLogger whose entries are published to the events ring for the logger process to write"""
+
+    def __init__(self, ring, lock, origin, log_dir="logs"):
+        super().__init__(log_dir=log_dir)
+        self.ring = ring
+        self.ring_lock = lock
+        self.origin = origin
+
+    def _append_to_json(self, entry):
+        try:
+            self.ring.publish({**entry, "kind": "event", "origin": self.origin}, self.ring_lock)
+        except RecordTooLarge as e:
+            print(f"Dropping {entry['type']} event: {e}")
+
+
+class RingModal:
+    """Forwards warnings to the UI process"""
+
+    def __init__(self, ring, lock, origin):
+        self.ring = ring
+        self.lock = lock
+        self.origin = origin
+
+    def show_message(self, message, duration=5, is_fullscreen=True):
+        data = {"message": message, "duration": duration, "is_fullscreen": is_fullscreen}
+        self.ring.publish(make_record("command", "show_warning", data, self.origin), self.lock)
+
+
+class RingSystemMonitor:
+    """Stands in for SystemMonitor in consumer processes, answering from the last sample read from the ring"""
+
+    def __init__(self, window_tracker=None):
+        from screen_monitor.idle import FakeIdleBackend
+
+        self.latest = {}
+        self.window_tracker = window_tracker
+        self.idle_backend = FakeIdleBackend()
+        self.idle_backend.name = "ring"
+
+    def get_idle_time(self):
+        return self.idle_backend.get_idle_time()
+
+    def get_active_window_info(self):
+        return self.latest
+
+    def update_window_info(self, window_info=None):
+        if window_info is not None:
+            self.latest = window_info
+        if self.window_tracker is not None and "error" not in self.latest:
+            self.window_tracker.update(self.latest.get("window_title"))
+        return self.latest
+
+    def flush(self):
+        if self.window_tracker is not None:
+            self.window_tracker.flush()
+
+
+def _follow(nanny, record, origin):
+    """Keep a consumer's focus state and listeners in step with events from other workers"""
+    if record.get("kind") != "event" or record.get("origin") == origin:
+        return
+    if record["type"] == "focus_mode_start":
+        nanny.focus_mode = True
+        nanny.focus_description = record["data"].get("description")
+    elif record["type"] == "focus_mode_end":
+        nanny.focus_mode = False
+        nanny.focus_description = None
+    nanny.logger.notify(_entry(record))
+
+
+# --- Workers ---
+
+def _worker_logging(name, log_dir):
+    """Text log of a worker that doesn't own the activity log, kept out of activity.log"""
+    os.makedirs(os.path.join(log_dir, "workers"), exist_ok=True)
+    logging.basicConfig(
+        filename=os.path.join(log_dir, "workers", f"{name}.log"),
+        level=logging.INFO,
+        format="%(asctime)s - %(message)s"
+    )
+
+
+def run_sampler(context, samples_name, idle_threshold=30, min_interval=1, log_interval=5, window_backend=None):
+    """Sample idle time and the foreground window into the samples ring"""
+    from screen_monitor.idle import select_idle_backend
+    from screen_monitor.platforms import read_window_info, select_window_backend
+    from screen_monitor.process_cache import ProcessInfoCache
+    from utils.scheduler import AdaptiveScheduler
+
+    ring = EventRing(samples_name)
+    idle_backend = select_idle_backend()
+    backend = select_window_backend(window_backend)
+    process_cache = ProcessInfoCache()
+    scheduler = AdaptiveScheduler(min_interval=min_interval, max_interval=log_interval)
+    lag = 0.0
+    while not context.stopping():
+        context.beat()
+        idle_time = idle_backend.get_idle_time()
+        if int(idle_time) > idle_threshold:
+            if scheduler.on_idle():
+                ring.publish(make_record("sample", "idle", {"idle_seconds": idle_time}, context.name, lag=lag))
+        else:
+            window_info = read_window_info(backend, process_cache)
+            # How late this sample was taken, for measuring sampling jitter
+            ring.publish(make_record("event", "window_info", window_info, context.name, lag=lag))
+            scheduler.on_sample((window_info.get("window_title"), window_info.get("process_name")))
+        lag = scheduler.wait()
+
+
+def run_logger(context, samples_name, events_name, log_dir="logs"):
+    """Write every event from both rings to the activity log and the derived stores"""
+    from main import ScreenNanny
+    from screen_monitor.window_durations import WindowDurationTracker
+    from utils.db import Database
+
+    samples = EventRing(samples_name).reader(CONSUMERS["logger"])
+    events = EventRing(events_name).reader(CONSUMERS["logger"])
+    db = Database()
+    tracker = WindowDurationTracker(db.get('window_durations', {}), db=db)
+    nanny = ScreenNanny(headless=True, system_monitor=RingSystemMonitor(tracker), logger=ActivityLogger(log_dir))
+    lag = metrics.histogram("sampler_lag_seconds", "Lateness of each sample taken by the sampler process")
+    nanny.start_retention()
+    try:
+        while not context.stopping():
+            context.beat()
+            handled = 0
+            for reader in (samples, events):
+                for record in reader.read():
+                    handled += 1
+                    if record.get("lag") is not None:
+                        lag.observe(record["lag"])
+                    if record.get("kind") == "event":
+                        if record["type"] == "window_info":
+                            nanny.system_monitor.update_window_info(record["data"])
+                        nanny.logger.log_activity(record["type"], record["data"],
+                                                  timestamp=record["timestamp"], entry_id=record["id"])
+                    # Saved after each record, so a restart repeats at most the one it crashed on
+                    reader.commit()
+            if nanny.scheduler.clock.now() - nanny.last_metrics_export >= nanny.METRICS_INTERVAL:
+                nanny.export_metrics()
+            nanny.save_state()
+            if not handled:
+                time.sleep(POLL_INTERVAL)
+    finally:
+        nanny.shutdown()
+
+
+def run_analyzer(context, samples_name, events_name, events_lock, log_dir="logs"):
+    """Analyze windows as they settle and send warnings to the UI"""
+    from main import ScreenNanny
+
+    _worker_logging(context.name, log_dir)
+    events_ring = EventRing(events_name)
+    samples = EventRing(samples_name).reader(CONSUMERS["analyzer"])
+    events = events_ring.reader(CONSUMERS["analyzer"])
+    nanny = ScreenNanny(
+        system_monitor=RingSystemMonitor(),
+        logger=RingLogger(events_ring, events_lock, context.name, log_dir),
+        modal=RingModal(events_ring, events_lock, context.name),
+        enable_hotkey=False,
+        log_owner=False,
+    )
+    while not context.stopping():
+        context.beat()
+        for record in events.read():
+            _follow(nanny, record, context.name)
+            events.commit()
+
+        batch = samples.read()
+        for record in batch:
+            if record["type"] == "idle":
+                nanny.scheduler.on_idle()
+            elif record["type"] == "window_info" and "error" not in record["data"]:
+                window_info = nanny.system_monitor.update_window_info(record["data"])
+                nanny.logger.notify(_entry(record))
+                nanny.scheduler.on_sample((window_info.get("window_title"), window_info.get("process_name")))
+        # Only the latest window is worth asking about when we have fallen behind
+        if batch and nanny.scheduler.analysis_due():
+            analysis = nanny.analyze_and_warn(None, nanny.system_monitor.get_active_window_info())
+            nanny.scheduler.on_analyzed(analysis["is_distracted"])
+        samples.commit()
+        if not batch:
+            time.sleep(POLL_INTERVAL)
+
+
+def run_ui(context, events_name, events_lock, log_dir="logs"):
+    """Show warnings and run the focus dialog and its hotkey"""
+    from main import ScreenNanny
+
+    _worker_logging(context.name, log_dir)
+    events_ring = EventRing(events_name)
+    events = events_ring.reader(CONSUMERS["ui"])
+    nanny = ScreenNanny(
+        ai_enabled=False,
+        system_monitor=RingSystemMonitor(),
+        logger=RingLogger(events_ring, events_lock, context.name, log_dir),
+        log_owner=False,
+    )
+    while not context.stopping():
+        context.beat()
+        records = events.read()
+        for record in records:
+            if record.get("kind") == "command" and record["type"] == "show_warning":
+                data = record["data"]
+                nanny.modal.show_message(data["message"], duration=data["duration"],
+                                         is_fullscreen=data.get("is_fullscreen", True))
+            else:
+                _follow(nanny, record, context.name)
+            events.commit()
+        if not records:
+            time.sleep(POLL_INTERVAL)
+
+
+def run_supervised(headless=False, ai_enabled=True, log_dir="logs", window_backend=None):
+    """Create the rings and run the workers until interrupted"""
+    samples = EventRing(capacity=4096, record_size=1024, create=True)
+    events = EventRing(capacity=1024, record_size=4096, create=True)
+    events_lock = multiprocessing.Lock()
+    workers = [
+        ("sampler", run_sampler, (samples.name, 30, 1, 5, window_backend)),
+        ("logger", run_logger, (samples.name, events.name, log_dir)),
+    ]
+    if ai_enabled and not headless:
+        workers.append(("analyzer", run_analyzer, (samples.name, events.name, events_lock, log_dir)))
+    if not headless:
+        workers.append(("ui", run_ui, (events.name, events_lock, log_dir)))
+    try:
+        Supervisor(workers).run()
+    finally:
+        for ring in (samples, events):
+            ring.close()
+            ring.unlink()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--headless", action="store_true", help="only the sampler and logger")
+    parser.add_argument("--no-ai", action="store_true", help="no analyzer process")
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--window-backend", help="e.g. fake, to try it without a desktop")
+    args = parser.parse_args()
+    run_supervised(headless=args.headless, ai_enabled=not args.no_ai, log_dir=args.log_dir,
+                   window_backend=args.window_backend)
@@ -0,0 +1,109 @@
+import queue
+import threading
+import time
+
+import customtkinter as ctk
+
+from utils.metrics import metrics
+
+
+class UIEngine:
+    """
+    One persistent Tk root running mainloop on its own thread.
+
+    Other threads hand work to it with submit(); the callable is queued and
+    the root is woken with a virtual event, so nothing polls while there's
+    nothing to show. Widgets (modal, focus dialog) are built once on this
+    thread and shown or hidden afterwards.
+    """
+
+    WAKE_EVENT = "<<ScreenNannyWake>>"
+
+    def __init__(self):
+        self.tasks = queue.SimpleQueue()
+        self.root = None
+        self.error = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="ui", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error:
+            raise self.error
+
+    def _run(self):
+        try:
+            self.root = ctk.CTk()
+        except Exception as e:
+            # e.g. no display; surfaced to the constructor instead of hanging it
+            self.error = e
+            self.ready.set()
+            return
+        self.root.withdraw()
+        self.root.bind(self.WAKE_EVENT, self._drain)
+        self.ready.set()
+        self.root.mainloop()
+
+    def _drain(self, event=None):
+        while True:
+            try:
+                fn, args = self.tasks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Error in UI task: {e}")
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the UI thread"""
+        self.tasks.put((fn, args))
+        if threading.current_thread() is self.thread:
+            self.root.after_idle(self._drain)
+        else:
+            # Tcl forwards this to the interpreter's thread, which wakes mainloop
+            self.root.event_generate(self.WAKE_EVENT, when="tail")
+
+    def call(self, fn, *args, timeout=None):
+        """Run fn(*args) on the UI thread and wait for its result"""
+        done = threading.Event()
+        outcome = {}
+
+        def run():
+            try:
+                outcome["value"] = fn(*args)
+            except Exception as e:
+                outcome["error"] = e
+            done.set()
+
+        self.submit(run)
+        if not done.wait(timeout):
+            raise TimeoutError("UI thread did not respond")
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome.get("value")
+
+    def stop(self):
+        self.submit(self.root.quit)
+        self.thread.join(timeout=5)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """The process-wide UI engine, started on first use"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = UIEngine()
+        return _engine
+
+
+def record_time_to_visible(window, requested_at, kind):
+    """Flush pending drawing and record the seconds since the window was requested"""
+    window.update_idletasks()
+    elapsed = time.perf_counter() - requested_at
+    metrics.histogram("ui_time_to_visible_seconds", "Time from a UI request until the window is drawn",
+                      kind=kind).observe(elapsed)
+    return elapsed
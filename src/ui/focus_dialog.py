@@ -1,122 +1,140 @@
+import time
 import customtkinter as ctk
+from ui.engine import get_engine, record_time_to_visible
 
 class FocusDialog:
-    def __init__(self):
+    """
+    Focus session dialog, built once on the UI engine's thread with a "start"
+    and an "active" page. show_dialog swaps to the right page and shows the
+    window; closing it only hides it.
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine or get_engine()
         self.window = None
         self.callback = None
         self.cancel_callback = None
-        
+        self.last_time_to_visible = None
+        self.engine.call(self._build)
+
     def show_dialog(self, on_focus_set, is_active=False, current_focus=None, on_cancel=None):
         """Show the focus session dialog"""
         self.callback = on_focus_set
         self.cancel_callback = on_cancel
-        
-        # Create window
-        window = ctk.CTk()
+        self.engine.submit(self._show, is_active, current_focus, time.perf_counter())
+
+    def _build(self):
+        window = ctk.CTkToplevel(self.engine.root)
         self.window = window
+        window.withdraw()
         window.title("Focus Session")
         window.geometry("500x300")
-        window.attributes('-topmost', True)
-        
-        if not is_active:
-            # Show start focus session dialog
-            label = ctk.CTkLabel(
-                window,
-                text="What are you planning to work on?",
-                font=('Arial', 16)
-            )
-            label.pack(pady=20)
-            
-            # Add text area
-            self.text_area = ctk.CTkTextbox(
-                window,
-                width=400,
-                height=100
-            )
-            self.text_area.pack(pady=20)
-            
-            # Add buttons
-            button_frame = ctk.CTkFrame(window)
-            button_frame.pack(pady=20)
-            
-            start_btn = ctk.CTkButton(
-                button_frame,
-                text="Start Focus Session",
-                command=self._on_submit
-            )
-            start_btn.pack(side='left', padx=10)
-            
-            cancel_btn = ctk.CTkButton(
-                button_frame,
-                text="Cancel",
-                command=window.destroy
-            )
-            cancel_btn.pack(side='left', padx=10)
+        window.protocol("WM_DELETE_WINDOW", self._hide)
+
+        # Start focus session page
+        self.start_page = ctk.CTkFrame(window, fg_color="transparent")
+        label = ctk.CTkLabel(
+            self.start_page,
+            text="What are you planning to work on?",
+            font=('Arial', 16)
+        )
+        label.pack(pady=20)
+
+        self.text_area = ctk.CTkTextbox(
+            self.start_page,
+            width=400,
+            height=100
+        )
+        self.text_area.pack(pady=20)
+
+        button_frame = ctk.CTkFrame(self.start_page)
+        button_frame.pack(pady=20)
+
+        start_btn = ctk.CTkButton(
+            button_frame,
+            text="Start Focus Session",
+            command=self._on_submit
+        )
+        start_btn.pack(side='left', padx=10)
+
+        cancel_btn = ctk.CTkButton(
+            button_frame,
+            text="Cancel",
+            command=self._hide
+        )
+        cancel_btn.pack(side='left', padx=10)
+
+        # Active focus session page
+        self.active_page = ctk.CTkFrame(window, fg_color="transparent")
+        label = ctk.CTkLabel(
+            self.active_page,
+            text="Current Focus Session",
+            font=('Arial', 20, 'bold')
+        )
+        label.pack(pady=20)
+
+        self.current_focus_label = ctk.CTkLabel(
+            self.active_page,
+            text="",
+            font=('Arial', 16),
+            wraplength=400
+        )
+        self.current_focus_label.pack(pady=20)
+
+        button_frame = ctk.CTkFrame(self.active_page)
+        button_frame.pack(pady=20)
+
+        end_btn = ctk.CTkButton(
+            button_frame,
+            text="End Focus Session",
+            command=self._on_cancel,
+            fg_color="red",
+            hover_color="darkred"
+        )
+        end_btn.pack(side='left', padx=10)
+
+        keep_btn = ctk.CTkButton(
+            button_frame,
+            text="Keep Focusing",
+            command=self._hide
+        )
+        keep_btn.pack(side='left', padx=10)
+
+    def _show(self, is_active, current_focus, requested_at):
+        """Switch to the right page and show the window (UI thread)"""
+        if is_active:
+            self.start_page.pack_forget()
+            self.current_focus_label.configure(text=current_focus or "")
+            self.active_page.pack(fill='both', expand=True)
         else:
-            # Show active focus session dialog
-            label = ctk.CTkLabel(
-                window,
-                text="Current Focus Session",
-                font=('Arial', 20, 'bold')
-            )
-            label.pack(pady=20)
-            
-            current_focus_label = ctk.CTkLabel(
-                window,
-                text=current_focus,
-                font=('Arial', 16),
-                wraplength=400
-            )
-            current_focus_label.pack(pady=20)
-            
-            # Add buttons
-            button_frame = ctk.CTkFrame(window)
-            button_frame.pack(pady=20)
-            
-            end_btn = ctk.CTkButton(
-                button_frame,
-                text="End Focus Session",
-                command=self._on_cancel,
-                fg_color="red",
-                hover_color="darkred"
-            )
-            end_btn.pack(side='left', padx=10)
-            
-            keep_btn = ctk.CTkButton(
-                button_frame,
-                text="Keep Focusing",
-                command=window.destroy
-            )
-            keep_btn.pack(side='left', padx=10)
-        
-        window.mainloop()
-    
+            self.active_page.pack_forget()
+            self.text_area.delete("1.0", "end")
+            self.start_page.pack(fill='both', expand=True)
+
+        self.window.deiconify()
+        self.window.attributes('-topmost', True)
+        self.window.lift()
+        self.window.focus_force()
+        if not is_active:
+            self.text_area.focus_set()
+        self.last_time_to_visible = record_time_to_visible(self.window, requested_at, "focus_dialog")
+
+    def _hide(self):
+        self.window.withdraw()
+
     def cleanup(self):
-        """Cleanup method to properly close the dialog"""
-        if self.window and self.window.winfo_exists():
-            self.window.quit()
-            self.window.destroy()
-            self.window = None
-    
-    def _safe_destroy(self):
-        """Safely destroy the window"""
-        try:
-            if self.window and self.window.winfo_exists():
-                self.window.quit()
-                self.window.destroy()
-                self.window = None
-        except Exception as e:
-            print(f"Error destroying focus dialog: {e}")
-    
+        """Hide the dialog, it stays built for the next time"""
+        self.engine.submit(self._hide)
+
     def _on_submit(self):
         """Handle focus session submission"""
         focus_description = self.text_area.get("1.0", "end-1c")
+        self._hide()
         if self.callback:
             self.callback(focus_description)
-        self._safe_destroy()
-    
+
     def _on_cancel(self):
         """Handle focus session cancellation"""
+        self._hide()
         if self.cancel_callback:
             self.cancel_callback()
-        self._safe_destroy() 
\ No newline at end of file
@@ -0,0 +1,498 @@
+import ctypes
+import ctypes.util
+import os
+import platform
+import queue
+import select
+import threading
+import time
+
+from utils.metrics import Histogram, metrics
+
+MODIFIERS = ("ctrl", "alt", "shift", "super")
+MODIFIER_ALIASES = {"control": "ctrl", "win": "super", "cmd": "super", "meta": "super"}
+
+
+def parse_hotkey(combo):
+    """'ctrl+alt+f' -> (frozenset of modifiers, key)"""
+    parts = [part.strip().lower() for part in combo.split("+") if part.strip()]
+    if not parts:
+        raise ValueError(f"Empty hotkey '{combo}'")
+    *modifiers, key = parts
+    modifiers = frozenset(MODIFIER_ALIASES.get(m, m) for m in modifiers)
+    unknown = modifiers - set(MODIFIERS)
+    if unknown:
+        raise ValueError(f"Unknown modifier {', '.join(sorted(unknown))} in hotkey '{combo}'")
+    return modifiers, key
+
+
+class HotkeyBackend:
+    """
+    Base class for global hotkey sources.
+
+    start() runs the backend on its own "hotkeys" thread, which registers the
+    combinations and then blocks until one is pressed, calling
+    handler(hotkey_id, received_at) for every key event that reaches the
+    process. Backends that register with the OS only ever see their own
+    combinations; the rest of the user's typing never enters Python.
+    """
+
+    name = "base"
+    # Whether every key event system-wide passes through this process
+    sees_all_keys = False
+
+    def __init__(self):
+        self.hotkeys = {}
+        self.handler = None
+        self.thread = None
+        self.registered = []
+
+    def available(self):
+        return False
+
+    def start(self, hotkeys, handler):
+        """hotkeys maps an id to the (modifiers, key) of parse_hotkey"""
+        self.hotkeys = hotkeys
+        self.handler = handler
+        self.thread = threading.Thread(target=self._run, name="hotkeys", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        raise NotImplementedError
+
+    def stop(self):
+        if self.thread:
+            self.thread.join(timeout=2)
+
+
+class XKeyEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("serial", ctypes.c_ulong),
+        ("send_event", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("window", ctypes.c_ulong),
+        ("root", ctypes.c_ulong),
+        ("subwindow", ctypes.c_ulong),
+        ("time", ctypes.c_ulong),
+        ("x", ctypes.c_int),
+        ("y", ctypes.c_int),
+        ("x_root", ctypes.c_int),
+        ("y_root", ctypes.c_int),
+        ("state", ctypes.c_uint),
+        ("keycode", ctypes.c_uint),
+        ("same_screen", ctypes.c_int),
+    ]
+
+
+class XEvent(ctypes.Union):
+    _fields_ = [("type", ctypes.c_int), ("xkey", XKeyEvent), ("pad", ctypes.c_long * 24)]
+
+
+X_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+
+
+class X11HotkeyBackend(HotkeyBackend):
+    """
+    XGrabKey on the root window through libX11 via ctypes, on a display
+    connection of its own. The X server only sends this client the grabbed
+    combinations; the thread sleeps in select() on the connection until then.
+    """
+
+    name = "x11"
+
+    KEY_PRESS = 2
+    GRAB_MODE_ASYNC = 1
+    MASKS = {"shift": 1 << 0, "ctrl": 1 << 2, "alt": 1 << 3, "super": 1 << 6}
+    # Caps Lock and Num Lock change the event state, so each combination is grabbed with them too
+    LOCK_MASKS = (0, 1 << 1, 1 << 4, (1 << 1) | (1 << 4))
+
+    def available(self):
+        if platform.system() != "Linux" or not os.environ.get("DISPLAY"):
+            return False
+        x11_path = ctypes.util.find_library("X11")
+        if not x11_path:
+            return False
+        try:
+            xlib = ctypes.cdll.LoadLibrary(x11_path)
+        except OSError:
+            return False
+
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XConnectionNumber.argtypes = [ctypes.c_void_p]
+        xlib.XStringToKeysym.restype = ctypes.c_ulong
+        xlib.XStringToKeysym.argtypes = [ctypes.c_char_p]
+        xlib.XKeysymToKeycode.restype = ctypes.c_ubyte
+        xlib.XKeysymToKeycode.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        xlib.XGrabKey.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_uint, ctypes.c_ulong,
+                                  ctypes.c_int, ctypes.c_int, ctypes.c_int]
+        xlib.XUngrabKey.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_uint, ctypes.c_ulong]
+        xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XPending.argtypes = [ctypes.c_void_p]
+        xlib.XNextEvent.argtypes = [ctypes.c_void_p, ctypes.POINTER(XEvent)]
+        xlib.XSetErrorHandler.restype = ctypes.c_void_p
+        xlib.XSetErrorHandler.argtypes = [ctypes.c_void_p]
+
+        display = xlib.XOpenDisplay(None)
+        if not display:
+            return False
+        self.xlib = xlib
+        self.display = display
+        self.root = xlib.XDefaultRootWindow(display)
+        self.wake_read, self.wake_write = os.pipe()
+        self.grabs = {}  # (keycode, modifier mask) -> hotkey id
+        return True
+
+    def _grab(self):
+        """Grab every hotkey, dropping those another client already holds"""
+        failed = []
+
+        def on_error(display, event):
+            failed.append(True)
+            return 0
+
+        # Xlib's default handler exits the process on BadAccess; this one is only installed around the grabs
+        handler = X_ERROR_HANDLER(on_error)
+        previous = self.xlib.XSetErrorHandler(ctypes.cast(handler, ctypes.c_void_p))
+        try:
+            for hotkey_id, (modifiers, key) in self.hotkeys.items():
+                keysym = self.xlib.XStringToKeysym(key.encode())
+                keycode = self.xlib.XKeysymToKeycode(self.display, keysym) if keysym else 0
+                if not keycode:
+                    print(f"Hotkey key '{key}' is not on this keyboard")
+                    continue
+                mask = 0
+                for modifier in modifiers:
+                    mask |= self.MASKS[modifier]
+                del failed[:]
+                for lock in self.LOCK_MASKS:
+                    self.xlib.XGrabKey(self.display, keycode, mask | lock, self.root, False,
+                                       self.GRAB_MODE_ASYNC, self.GRAB_MODE_ASYNC)
+                self.xlib.XSync(self.display, False)
+                if failed:
+                    print(f"Hotkey {'+'.join(sorted(modifiers) + [key])} is taken by another application")
+                    for lock in self.LOCK_MASKS:
+                        self.xlib.XUngrabKey(self.display, keycode, mask | lock, self.root)
+                    continue
+                for lock in self.LOCK_MASKS:
+                    self.grabs[(keycode, mask | lock)] = hotkey_id
+                self.registered.append(hotkey_id)
+            self.xlib.XSync(self.display, False)
+        finally:
+            self.xlib.XSetErrorHandler(previous)
+
+    def _run(self):
+        self._grab()
+        connection = self.xlib.XConnectionNumber(self.display)
+        event = XEvent()
+        relevant = sum(self.MASKS.values()) | sum(self.LOCK_MASKS)
+        try:
+            while True:
+                while self.xlib.XPending(self.display):
+                    self.xlib.XNextEvent(self.display, ctypes.byref(event))
+                    if event.type != self.KEY_PRESS:
+                        continue
+                    received_at = time.perf_counter()
+                    key = (event.xkey.keycode, event.xkey.state & relevant)
+                    self.handler(self.grabs.get(key), received_at)
+                ready, _, _ = select.select([connection, self.wake_read], [], [])
+                if self.wake_read in ready:
+                    return
+        finally:
+            for keycode, mask in self.grabs:
+                self.xlib.XUngrabKey(self.display, keycode, mask, self.root)
+            self.xlib.XCloseDisplay(self.display)
+            os.close(self.wake_read)
+
+    def stop(self):
+        if self.thread:
+            os.write(self.wake_write, b"x")
+            super().stop()
+            os.close(self.wake_write)
+
+
+class Win32HotkeyBackend(HotkeyBackend):
+    """
+    RegisterHotKey with no window: Windows posts WM_HOTKEY to the registering
+    thread's message queue, which GetMessage waits on.
+    """
+
+    name = "win32"
+
+    WM_HOTKEY = 0x0312
+    WM_QUIT = 0x0012
+    MOD_NOREPEAT = 0x4000
+    MASKS = {"alt": 0x1, "ctrl": 0x2, "shift": 0x4, "super": 0x8}
+    KEYS = {"space": 0x20, "enter": 0x0D, "tab": 0x09, "escape": 0x1B, "esc": 0x1B}
+
+    def available(self):
+        if platform.system() != "Windows":
+            return False
+        from ctypes import wintypes
+        self.wintypes = wintypes
+        self.user32 = ctypes.windll.user32
+        self.kernel32 = ctypes.windll.kernel32
+        self.thread_id = None
+        self.loop_ready = threading.Event()
+        return True
+
+    def _virtual_key(self, key):
+        if key in self.KEYS:
+            return self.KEYS[key]
+        if len(key) == 1 and key.isalnum():
+            return ord(key.upper())
+        if key.startswith("f") and key[1:].isdigit() and 1 <= int(key[1:]) <= 24:
+            return 0x70 + int(key[1:]) - 1
+        return None
+
+    def _run(self):
+        # Hotkeys belong to the thread that registers them, so it has to be this one
+        self.thread_id = self.kernel32.GetCurrentThreadId()
+        for hotkey_id, (modifiers, key) in self.hotkeys.items():
+            vk = self._virtual_key(key)
+            if vk is None:
+                print(f"Hotkey key '{key}' is not supported")
+                continue
+            mask = self.MOD_NOREPEAT
+            for modifier in modifiers:
+                mask |= self.MASKS[modifier]
+            if not self.user32.RegisterHotKey(None, hotkey_id, mask, vk):
+                print(f"Hotkey {'+'.join(sorted(modifiers) + [key])} is taken by another application")
+                continue
+            self.registered.append(hotkey_id)
+        self.loop_ready.set()
+
+        msg = self.wintypes.MSG()
+        try:
+            while self.user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+                if msg.message == self.WM_HOTKEY:
+                    self.handler(msg.wParam, time.perf_counter())
+        finally:
+            for hotkey_id in self.registered:
+                self.user32.UnregisterHotKey(None, hotkey_id)
+
+    def stop(self):
+        if self.thread:
+            self.loop_ready.wait(timeout=2)
+            self.user32.PostThreadMessageW(self.thread_id, self.WM_QUIT, 0, 0)
+            super().stop()
+
+
+class KeyboardHookBackend(HotkeyBackend):
+    """
+    The keyboard package's global hook, where nothing lighter is available
+    (macOS). Every key event system-wide runs Python code in this process.
+    """
+
+    name = "keyboard"
+    sees_all_keys = True
+
+    def available(self):
+        try:
+            import keyboard
+        except ImportError:
+            return False
+        self.keyboard = keyboard
+        self.stopped = threading.Event()
+        return True
+
+    def _match(self, event):
+        for hotkey_id, (modifiers, key) in self.hotkeys.items():
+            if event.name == key and all(self.keyboard.is_pressed(m) for m in modifiers):
+                return hotkey_id
+        return None
+
+    def _on_event(self, event):
+        received_at = time.perf_counter()
+        self.handler(self._match(event) if event.event_type == "down" else None, received_at)
+
+    def _run(self):
+        self.keyboard.hook(self._on_event)
+        self.registered = list(self.hotkeys)
+        self.stopped.wait()
+        self.keyboard.unhook(self._on_event)
+
+    def stop(self):
+        if self.thread:
+            self.stopped.set()
+            super().stop()
+
+
+class NullHotkeyBackend(HotkeyBackend):
+    """Used when no backend works, e.g. no display"""
+
+    name = "none"
+
+    def available(self):
+        return True
+
+    def start(self, hotkeys, handler):
+        self.hotkeys = hotkeys
+        self.handler = handler
+
+
+class FakeHotkeyBackend(HotkeyBackend):
+    """
+    Key events injected with press() and type_text(), for tests and
+    benchmarks. They reach the "hotkeys" thread through a queue, the way the
+    OS delivers them; with sees_all_keys=True every keystroke does, as with a
+    global hook, otherwise only the registered combinations.
+    """
+
+    name = "fake"
+
+    def __init__(self, sees_all_keys=False):
+        super().__init__()
+        self.sees_all_keys = sees_all_keys
+        self.events = queue.Queue()
+
+    def available(self):
+        return True
+
+    def _run(self):
+        self.registered = list(self.hotkeys)
+        while True:
+            item = self.events.get()
+            try:
+                if item is None:
+                    return
+                hotkey_id, sent_at = item
+                self.handler(hotkey_id, sent_at)
+            finally:
+                self.events.task_done()
+
+    def press(self, combo):
+        """Press a combination; delivered if it is registered (or every key is)"""
+        parsed = parse_hotkey(combo)
+        hotkey_id = next((i for i, hotkey in self.hotkeys.items() if hotkey == parsed), None)
+        if hotkey_id is not None or self.sees_all_keys:
+            self.events.put((hotkey_id, time.perf_counter()))
+
+    def type_text(self, text):
+        """Type ordinary keys, which only a global hook sees"""
+        if self.sees_all_keys:
+            for _ in text:
+                self.events.put((None, time.perf_counter()))
+
+    def wait_idle(self):
+        """Block until every injected event has been handled"""
+        self.events.join()
+
+    def stop(self):
+        if self.thread:
+            self.events.put(None)
+            super().stop()
+
+
+HOTKEY_BACKENDS = {
+    "win32": Win32HotkeyBackend,
+    "x11": X11HotkeyBackend,
+    "keyboard": KeyboardHookBackend,
+}
+# Only used when asked for by name, never picked automatically
+EXPLICIT_HOTKEY_BACKENDS = {
+    "fake": FakeHotkeyBackend,
+}
+
+
+def select_hotkey_backend(name=None):
+    """
+    Return a working backend. If name (or SCREEN_NANNY_HOTKEY_BACKEND) is set,
+    only that backend is tried.
+    """
+    name = name or os.getenv("SCREEN_NANNY_HOTKEY_BACKEND")
+    if name:
+        known = {**HOTKEY_BACKENDS, **EXPLICIT_HOTKEY_BACKENDS}
+        if name not in known:
+            raise ValueError(f"Unknown hotkey backend '{name}', expected one of {', '.join(known)}")
+        candidates = [known[name]]
+    else:
+        candidates = HOTKEY_BACKENDS.values()
+
+    for backend_class in candidates:
+        backend = backend_class()
+        try:
+            if backend.available():
+                return backend
+        except Exception as e:
+            print(f"Hotkey backend {backend.name} failed to start: {e}")
+    print("Warning: no hotkey backend available, hotkeys are disabled")
+    return NullHotkeyBackend()
+
+
+class HotkeyManager:
+    """
+    Global hotkeys whose callbacks run through dispatch (the UI engine's
+    submit) rather than on the thread the key event arrived on, so a callback
+    can open a window and the backend goes straight back to waiting.
+
+    Measures what each key event delivered to the process costs on the
+    hotkeys thread (hotkey_keystroke_seconds) and how long a press takes to
+    reach its callback (hotkey_dispatch_seconds).
+    """
+
+    def __init__(self, backend=None, dispatch=None):
+        self.backend = backend or select_hotkey_backend()
+        self.dispatch = dispatch or (lambda fn, *args: fn(*args))
+        self.callbacks = {}
+        self.hotkeys = {}
+        self.keystrokes = 0
+        self.presses = 0
+        self.overhead = Histogram()
+        self.latency = Histogram()
+        self.started = False
+
+    def add(self, combo, callback):
+        """Register callback for combo, e.g. 'ctrl+alt+f'; before start()"""
+        if self.started:
+            raise RuntimeError("Hotkeys have to be added before start()")
+        hotkey_id = len(self.hotkeys) + 1
+        self.hotkeys[hotkey_id] = parse_hotkey(combo)
+        self.callbacks[hotkey_id] = callback
+        return hotkey_id
+
+    def start(self):
+        self.started = True
+        self.backend.start(self.hotkeys, self._on_key)
+
+    def stop(self):
+        self.backend.stop()
+
+    def _on_key(self, hotkey_id, received_at):
+        """Runs on the hotkeys thread for every key event the backend receives"""
+        self.keystrokes += 1
+        callback = self.callbacks.get(hotkey_id)
+        if callback is not None:
+            self.presses += 1
+            try:
+                self.dispatch(self._run_callback, callback, received_at)
+            except Exception as e:
+                print(f"Error dispatching hotkey: {e}")
+        elapsed = time.perf_counter() - received_at
+        self.overhead.observe(elapsed)
+        metrics.histogram("hotkey_keystroke_seconds", "Time spent on each key event delivered to the process",
+                          backend=self.backend.name).observe(elapsed)
+
+    def _run_callback(self, callback, received_at):
+        elapsed = time.perf_counter() - received_at
+        self.latency.observe(elapsed)
+        metrics.histogram("hotkey_dispatch_seconds", "Time from a hotkey press until its callback runs",
+                          backend=self.backend.name).observe(elapsed)
+        callback()
+
+    def stats(self):
+        return {
+            "backend": self.backend.name,
+            "sees_all_keys": self.backend.sees_all_keys,
+            "registered": len(self.backend.registered),
+            "keystrokes": self.keystrokes,
+            "presses": self.presses,
+            "keystroke_mean_us": self.overhead.sum / self.overhead.count * 1e6 if self.overhead.count else 0.0,
+            "keystroke_p99_us": self.overhead.percentile(0.99) * 1e6,
+            "dispatch_p50_ms": self.latency.percentile(0.5) * 1e3,
+            "dispatch_max_ms": max(self.latency.recent, default=0.0) * 1e3,
+        }
@@ -0,0 +1,394 @@
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from utils.focus_sessions import FocusSessionStore
+from utils.json_stream import INDEX_BLOCK_SIZE, ArrayIndex, iter_json_array_offsets
+from utils.rollups import RollupStore, _add_to_bucket
+from utils.search_index import SearchIndex
+
+# Element starts in the logger's, retention's and merge's layout (and json.dump with indent=2)
+ELEMENT_START = b"\n  {"
+# Byte ranges parsed per index chunk, when the offset index has to be built first
+INDEX_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+class RollupAggregate:
+    """
+    Rollups, one day of buckets per partition. A window sample only lasts
+    until the next event on the same day, so days are independent apart from
+    focus sessions, which are replayed from their start and end events when
+    the days are merged.
+    """
+
+    name = "rollups"
+
+    def __init__(self, log_dir):
+        self.path = os.path.join(log_dir, "rollups.json")
+
+    def partial(self, day, entries):
+        store = RollupStore(path=os.devnull, flush_interval=float("inf"))
+        focus_events = []
+        for entry in entries:
+            if entry.get("type") in ("focus_mode_start", "focus_mode_end"):
+                focus_events.append(entry)
+                # Still ends the window sample before it
+                entry = {**entry, "type": "focus_marker"}
+            store.add_event(entry)
+        return {
+            "levels": store.levels,
+            "pending_windows": {
+                device: [start.isoformat(), process_name]
+                for device, (start, process_name) in store.pending_windows.items()
+            },
+            "focus_events": focus_events,
+            "devices": sorted({entry.get("device", "") for entry in entries}),
+            "last_timestamp": store.last_timestamp.isoformat() if store.last_timestamp else None,
+        }
+
+    def begin(self):
+        self.store = RollupStore(self.path, flush_interval=float("inf"))
+
+    def add(self, day, partial):
+        store = self.store
+        for level, buckets in partial["levels"].items():
+            # Buckets never span two days, so partitions rarely share keys
+            merged = store.levels[level]
+            for key, bucket in buckets.items():
+                if key in merged:
+                    _add_to_bucket(merged[key], bucket)
+                else:
+                    merged[key] = bucket
+        # A device's last sample of an earlier day was closed by its first event of this one
+        for device in partial["devices"]:
+            store.pending_windows.pop(device, None)
+        for device, (start, process_name) in partial["pending_windows"].items():
+            store.pending_windows[device] = (datetime.fromisoformat(start), process_name)
+        for entry in partial["focus_events"]:
+            store.add_focus_event(entry["type"], entry.get("device", ""),
+                                  datetime.fromisoformat(entry["timestamp"]), entry.get("data") or {})
+        if partial["last_timestamp"]:
+            store.last_timestamp = datetime.fromisoformat(partial["last_timestamp"])
+
+    def finish(self):
+        self.store.dirty = True
+        self.store.flush()
+        return self.store
+
+
+class SearchIndexAggregate:
+    """Search index, one day of runs per partition, chained into each window's runs in day order"""
+
+    name = "search_index"
+
+    def __init__(self, log_dir):
+        self.path = os.path.join(log_dir, "search_index.json")
+
+    def partial(self, day, entries):
+        index = SearchIndex(path=os.devnull, flush_interval=float("inf"))
+        for entry in entries:
+            index.add_event(entry)
+        return {
+            "docs": index.docs,
+            "runs": [
+                [[start, end, total - (cumulative[i - 1] if i else 0.0)]
+                 for i, (start, end, total) in enumerate(zip(starts, ends, cumulative))]
+                for starts, ends, cumulative in zip(index.starts, index.ends, index.cumulative)
+            ],
+            "pending": {
+                device: [start.isoformat(), doc_id] for device, (start, doc_id) in index.pending.items()
+            },
+            "devices": sorted({entry.get("device", "") for entry in entries}),
+            "last_timestamp": index.last_timestamp.isoformat() if index.last_timestamp else None,
+        }
+
+    def begin(self):
+        self.index = SearchIndex(self.path, flush_interval=float("inf"))
+
+    def add(self, day, partial):
+        index = self.index
+        doc_ids = [
+            index._doc({"process_name": process_name, "window_title": window_title})
+            for process_name, window_title in partial["docs"]
+        ]
+        for doc_id, runs in zip(doc_ids, partial["runs"]):
+            for start, end, seconds in runs:
+                # Runs a minute apart across midnight join up as they would in one pass
+                index._add_run(doc_id, start, end, seconds)
+        for device in partial["devices"]:
+            index.pending.pop(device, None)
+        for device, (start, doc_id) in partial["pending"].items():
+            index.pending[device] = (datetime.fromisoformat(start), doc_ids[doc_id])
+        if partial["last_timestamp"]:
+            index.last_timestamp = datetime.fromisoformat(partial["last_timestamp"])
+
+    def finish(self):
+        self.index.dirty = True
+        self.index.flush()
+        return self.index
+
+
+class FocusSessionAggregate:
+    """
+    Focus sessions. Each partition keeps only the events that change a
+    session (starts, ends, distractions), plus the latest other event per
+    device before each of them to move last_seen along; replayed in day
+    order they give the same sessions as the whole log.
+    """
+
+    name = "focus_sessions"
+
+    def __init__(self, log_dir):
+        self.path = os.path.join(log_dir, "focus_sessions.json")
+
+    def partial(self, day, entries):
+        store = FocusSessionStore(path=os.devnull)
+        events = []
+        latest = {}  # device -> latest event since the last kept one
+        for entry in entries:
+            entry_type = entry.get("type")
+            data = entry.get("data") or {}
+            if entry_type in ("focus_mode_start", "focus_mode_end") or store._is_distraction(entry_type, data):
+                events.extend(sorted(latest.values(), key=lambda marker: marker["timestamp"]))
+                latest = {}
+                events.append(entry)
+                continue
+            device = entry.get("device", "")
+            if device not in latest or entry["timestamp"] > latest[device]["timestamp"]:
+                latest[device] = {"timestamp": entry["timestamp"], "type": "activity", "device": device}
+        events.extend(sorted(latest.values(), key=lambda marker: marker["timestamp"]))
+        return {"events": events}
+
+    def begin(self):
+        self.store = FocusSessionStore(self.path)
+        self.store.autosave = False
+
+    def add(self, day, partial):
+        for entry in partial["events"]:
+            self.store.on_event(entry)
+
+    def finish(self):
+        self.store.dirty = True
+        self.store.save()
+        return self.store
+
+
+AGGREGATES = {
+    aggregate.name: aggregate
+    for aggregate in (RollupAggregate, SearchIndexAggregate, FocusSessionAggregate)
+}
+
+
+def _element_start(f, position, limit):
+    """Offset of the first element starting at or after position, or None before limit"""
+    f.seek(max(0, position - len(ELEMENT_START)))
+    window = f.read(min(1024 * 1024, limit - f.tell()))
+    found = window.find(ELEMENT_START)
+    if found == -1:
+        return None
+    return f.tell() - len(window) + found + len(ELEMENT_START) - 1
+
+
+def _index_chunk(log_path, start, stop, block_size):
+    """Index blocks for the elements starting in [start, stop)"""
+    blocks = []
+    block = None
+    for offset, entry in iter_json_array_offsets(log_path, start, strict=False):
+        if stop is not None and offset >= stop:
+            break
+        if block is None or block[1] >= block_size:
+            block = [offset, 0, None, None, []]
+            blocks.append(block)
+        ArrayIndex.add_to_block(block, entry)
+    return blocks
+
+
+def _run_partition(log_path, day, ranges, names, checkpoint_path, signature):
+    """Worker: read one day's entries from its byte ranges and write the aggregates' partials"""
+    entries = []
+    for start, stop in ranges:
+        for offset, entry in iter_json_array_offsets(log_path, start, strict=False):
+            if offset >= stop:
+                break
+            timestamp = entry.get("timestamp") if isinstance(entry, dict) else None
+            if isinstance(timestamp, str) and timestamp[:10] == day:
+                entries.append(entry)
+    # The same order a full rebuild sorts the log into
+    entries.sort(key=lambda entry: entry["timestamp"])
+    log_dir = os.path.dirname(log_path)
+    checkpoint = {
+        "signature": signature,
+        "entries": len(entries),
+        "partials": {name: AGGREGATES[name](log_dir).partial(day, entries) for name in names},
+    }
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, separators=(",", ":"))
+    os.replace(tmp_path, checkpoint_path)
+    return day, len(entries)
+
+
+class Backfill:
+    """
+    Rebuilds the stores derived from the activity log (rollups, search index,
+    focus sessions, or any aggregate in AGGREGATES) on every core.
+
+    The log is split into one partition per day using its offset index,
+    which is built in parallel first if it's missing. Workers in a
+    ProcessPoolExecutor read their day's byte ranges and write the partial
+    aggregates to a checkpoint file per day; the partials are then merged in
+    day order, so the result doesn't depend on which worker finished first
+    and matches a single-threaded rebuild.
+
+    Checkpoints live in logs/backfill/ until the merge is done. An
+    interrupted backfill picks up from them, redoing only days whose part of
+    the log has changed since. Run it while the monitor is stopped, since
+    the stores are written over at the end; the monitor's state checkpoint
+    is removed so it loads them on its next start.
+    """
+
+    def __init__(self, log_dir="logs", aggregates=None, workers=None, checkpoint_dir=None, progress=None):
+        self.log_dir = log_dir
+        self.log_path = os.path.join(log_dir, "activity_data.json")
+        self.names = list(aggregates or AGGREGATES)
+        unknown = [name for name in self.names if name not in AGGREGATES]
+        if unknown:
+            raise ValueError(f"Unknown aggregates: {', '.join(unknown)}, expected some of {', '.join(AGGREGATES)}")
+        self.workers = workers or os.cpu_count() or 1
+        self.checkpoint_dir = checkpoint_dir or os.path.join(log_dir, "backfill")
+        self.progress = progress or _print_progress
+
+    def _index(self, pool):
+        """The log's offset index, built chunk by chunk on the pool if there isn't an up to date one"""
+        index = ArrayIndex(self.log_path)
+        index._load()
+        stat = os.stat(self.log_path)
+        if index.blocks and index._still_valid(stat):
+            index.refresh()
+            return index
+
+        size = stat.st_size
+        chunks = max(self.workers, size // INDEX_CHUNK_SIZE, 1)
+        starts = [0]
+        with open(self.log_path, "rb") as f:
+            for i in range(1, chunks):
+                start = _element_start(f, i * size // chunks, size)
+                if start is not None and start > starts[-1]:
+                    starts.append(start)
+        bounds = list(zip(starts, starts[1:] + [None]))
+        chunks = pool.map(_index_chunk, [self.log_path] * len(bounds), [start for start, _ in bounds],
+                          [stop for _, stop in bounds], [INDEX_BLOCK_SIZE] * len(bounds))
+        index.blocks = [block for blocks in chunks for block in blocks]
+        index.identity = index._identity(stat)
+        index.indexed_size = size
+        index._save()
+        return index
+
+    def partitions(self, index):
+        """[(day, [(start, stop)], signature)] with the byte ranges of the blocks holding each day"""
+        blocks = index.blocks
+        block_ends = [block[0] for block in blocks[1:]] + [index.indexed_size]
+        days = {}
+        for i, block in enumerate(blocks):
+            for day in block[4]:
+                days.setdefault(day, []).append(i)
+        partitions = []
+        for day in sorted(days):
+            ranges = []
+            for i in days[day]:
+                if ranges and ranges[-1][1] == blocks[i][0]:
+                    ranges[-1][1] = block_ends[i]
+                else:
+                    ranges.append([blocks[i][0], block_ends[i]])
+            signature = [index.identity, self.names, [[blocks[i][0], blocks[i][1]] for i in days[day]]]
+            partitions.append((day, ranges, signature))
+        return partitions
+
+    def _checkpoint_path(self, day):
+        return os.path.join(self.checkpoint_dir, f"{day}.json")
+
+    def _load_checkpoint(self, day):
+        try:
+            with open(self._checkpoint_path(day), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def run(self):
+        """Backfill every aggregate, returns stats, or None if there is no log"""
+        if not os.path.exists(self.log_path):
+            return None
+        started = time.perf_counter()
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        stats = {"partitions": 0, "resumed": 0, "entries": 0, "workers": self.workers}
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            index = self._index(pool)
+            partitions = self.partitions(index)
+            stats["partitions"] = len(partitions)
+
+            todo = []
+            for day, ranges, signature in partitions:
+                checkpoint = self._load_checkpoint(day)
+                # JSON turns the signature's tuples into lists, compare it the same way
+                if checkpoint and checkpoint.get("signature") == json.loads(json.dumps(signature)):
+                    stats["resumed"] += 1
+                    stats["entries"] += checkpoint["entries"]
+                else:
+                    todo.append((day, ranges, signature))
+
+            futures = [
+                pool.submit(_run_partition, self.log_path, day, ranges, self.names,
+                            self._checkpoint_path(day), signature)
+                for day, ranges, signature in todo
+            ]
+            done_entries = 0
+            for done, future in enumerate(as_completed(futures), 1):
+                _, count = future.result()
+                done_entries += count
+                self.progress({
+                    "done": done + stats["resumed"],
+                    "total": len(partitions),
+                    "entries": done_entries,
+                    "elapsed": time.perf_counter() - started,
+                })
+            stats["entries"] += done_entries
+
+        stats["merge_seconds"] = self._merge(partitions)
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        # The monitor's state checkpoint would restore the stores as they were before
+        state_checkpoint = os.path.join(self.log_dir, "state.ckpt")
+        if os.path.exists(state_checkpoint):
+            os.remove(state_checkpoint)
+        stats["seconds"] = time.perf_counter() - started
+        stats["entries_per_second"] = stats["entries"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+    def _merge(self, partitions):
+        """Fold the partials into the stores in day order, one checkpoint in memory at a time"""
+        started = time.perf_counter()
+        aggregates = [AGGREGATES[name](self.log_dir) for name in self.names]
+        for aggregate in aggregates:
+            aggregate.begin()
+        for day, _, _ in partitions:
+            checkpoint = self._load_checkpoint(day)
+            for aggregate in aggregates:
+                aggregate.add(day, checkpoint["partials"][aggregate.name])
+        for aggregate in aggregates:
+            aggregate.finish()
+        return time.perf_counter() - started
+
+
+def _print_progress(progress):
+    elapsed = progress["elapsed"]
+    rate = progress["entries"] / elapsed if elapsed else 0.0
+    remaining = progress["total"] - progress["done"]
+    # Throttled to about one line a second
+    now = time.monotonic()
+    if remaining and now - getattr(_print_progress, "last", 0.0) < 1:
+        return
+    _print_progress.last = now
+    print(f"Backfill: {progress['done']}/{progress['total']} days, {progress['entries']:,} entries, "
+          f"{rate:,.0f} entries/s")
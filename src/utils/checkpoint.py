@@ -0,0 +1,121 @@
+import json
+import os
+import struct
+import time
+import zlib
+
+from utils.json_stream import iter_json_array_offsets
+
+MAGIC = b"SNCK"
+VERSION = 1
+# Magic, format version and the length of the compressed payload that follows
+HEADER = struct.Struct("<4sBI")
+
+
+class StateCheckpoint:
+    """
+    Snapshots of in-memory aggregates, with the position in the activity log
+    they cover, so a restart only replays the entries logged after it.
+
+    Components register a function returning their state as plain data and
+    one taking it back. A checkpoint is a short binary header followed by the
+    states as zlib-compressed JSON, written atomically to logs/state.ckpt.
+    The position is the log file's identity and the byte offset and id of
+    the last entry folded in; if the log was since replaced (retention,
+    merges) or no longer has that entry there, the checkpoint is ignored and
+    the caller rebuilds as before.
+    """
+
+    def __init__(self, path, log_path):
+        self.path = path
+        self.log_path = log_path
+        self.components = {}  # name -> (save, restore)
+
+    def register(self, name, save, restore):
+        self.components[name] = (save, restore)
+
+    # --- Saving ---
+
+    def snapshot(self, position):
+        """The states of every component as JSON bytes, taken while nothing else is logged"""
+        state = {
+            "position": position,
+            "states": {name: save() for name, (save, _) in self.components.items()},
+        }
+        return json.dumps(state, separators=(",", ":")).encode("utf-8")
+
+    def write(self, snapshot):
+        """Compress and write a snapshot, returns the checkpoint's size in bytes"""
+        payload = zlib.compress(snapshot, 1)
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, len(payload)))
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving state checkpoint: {e}")
+            return None
+        return HEADER.size + len(payload)
+
+    # --- Restoring ---
+
+    def load(self):
+        """The saved {"position", "states"}, or None if there is no readable checkpoint"""
+        try:
+            with open(self.path, "rb") as f:
+                magic, version, length = HEADER.unpack(f.read(HEADER.size))
+                if magic != MAGIC or version != VERSION:
+                    return None
+                payload = f.read(length)
+            return json.loads(zlib.decompress(payload))
+        except FileNotFoundError:
+            return None
+        except (OSError, struct.error, zlib.error, ValueError) as e:
+            print(f"Ignoring unreadable state checkpoint: {e}")
+            return None
+
+    def tail(self, position):
+        """(offset, entry) for the entries logged after position, or None if the log doesn't have it"""
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return None
+        if [stat.st_ino, stat.st_dev] != position.get("identity") or stat.st_size <= position["offset"]:
+            return None
+        entries = iter_json_array_offsets(self.log_path, position["offset"], strict=False)
+        try:
+            offset, first = next(entries)
+        except (StopIteration, ValueError):
+            return None
+        if offset != position["offset"] or not isinstance(first, dict) or first.get("id") != position["id"]:
+            return None
+        return entries
+
+    def restore(self, replay):
+        """
+        Restore every component from the checkpoint and pass each entry logged
+        after it to replay. Returns {"position", "tail_entries", "seconds"},
+        or None without touching the components if there is no usable
+        checkpoint.
+        """
+        started = time.perf_counter()
+        saved = self.load()
+        if saved is None or not saved.get("position"):
+            return None
+        states = saved.get("states", {})
+        missing = [name for name in self.components if name not in states]
+        tail = self.tail(saved["position"])
+        if missing or tail is None:
+            print("State checkpoint doesn't match the activity log, rebuilding instead")
+            return None
+
+        for name, (_, restore) in self.components.items():
+            restore(states[name])
+        position = saved["position"]
+        count = 0
+        for offset, entry in tail:
+            replay(entry)
+            count += 1
+            position = {"identity": position["identity"], "offset": offset, "id": entry.get("id")}
+        return {"position": position, "tail_entries": count, "seconds": time.perf_counter() - started}
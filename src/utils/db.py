@@ -7,16 +7,17 @@ class Database:
     _instance = None
     _lock = threading.Lock()
     
-    def __new__(cls):
+    def __new__(cls, db_path=None):
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super(Database, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self):
+    def __init__(self, db_path=None):
+        # db_path only applies to the first instance, later calls share it
         if not hasattr(self, 'initialized'):
-            self.db_path = Path(__file__).parent.parent / 'db.json'
+            self.db_path = Path(db_path) if db_path else Path(__file__).parent.parent / 'db.json'
             self.ensure_db_exists()
             self.initialized = True
 
@@ -49,9 +50,11 @@ class Database:
                 # Update data
                 data[key] = value
                 
-                # Write back to file
-                with open(self.db_path, 'w') as f:
+                # Write back through a temporary file, so another process never reads half of it
+                tmp_path = self.db_path.with_name(f"{self.db_path.name}.{os.getpid()}.tmp")
+                with open(tmp_path, 'w') as f:
                     json.dump(data, f, indent=2)
+                os.replace(tmp_path, self.db_path)
                     
                 return True
             except Exception as e:
@@ -0,0 +1,146 @@
+import json
+import struct
+from multiprocessing import shared_memory
+
+MAGIC = 0x534E5247  # "SNRG"
+MAX_CONSUMERS = 8
+# magic, record size, capacity, write sequence, then one saved cursor per consumer
+HEADER = struct.Struct(f"<III4xQ{MAX_CONSUMERS}Q")
+SLOT_HEADER = struct.Struct("<QI4x")  # sequence, payload length
+WRITE_SEQ_OFFSET = 16
+CURSORS_OFFSET = 24
+
+
+class RecordTooLarge(ValueError):
+    pass
+
+
+def _attach(name):
+    """Open an existing segment without letting this process's resource tracker unlink it on exit"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always tracks it, but workers share the supervisor's
+        # tracker, which already holds the segment until the owner unlinks it
+        return shared_memory.SharedMemory(name=name)
+
+
+class EventRing:
+    """
+    Fixed-size JSON records in a multiprocessing.shared_memory ring buffer.
+
+    Records are numbered from 1. The writer marks a slot busy (sequence 0),
+    copies the record in, then stamps the slot and the header with its
+    sequence number, so a reader that finds a different number before or after
+    copying knows the slot was overwritten and counts the record as lost.
+    Readers never block the writer: one that falls more than a ring behind
+    skips ahead.
+
+    There is one writer per ring unless a lock is given to publish(). Each
+    consumer has a slot in the header to save its cursor, so a consumer
+    process that is restarted carries on where it stopped.
+    """
+
+    def __init__(self, name=None, capacity=4096, record_size=1024, create=False):
+        if create:
+            record_size = (record_size + 7) // 8 * 8  # keep every slot 8-byte aligned
+            size = HEADER.size + capacity * (SLOT_HEADER.size + record_size)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            HEADER.pack_into(self.shm.buf, 0, MAGIC, record_size, capacity, 0, *([0] * MAX_CONSUMERS))
+        else:
+            self.shm = _attach(name)
+        magic, self.record_size, self.capacity = HEADER.unpack_from(self.shm.buf, 0)[:3]
+        if magic != MAGIC:
+            raise ValueError(f"Shared memory {self.shm.name} is not an event ring")
+        self.slot_size = SLOT_HEADER.size + self.record_size
+        self.owner = create
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _slot_offset(self, seq):
+        return HEADER.size + ((seq - 1) % self.capacity) * self.slot_size
+
+    def write_seq(self):
+        return struct.unpack_from("<Q", self.shm.buf, WRITE_SEQ_OFFSET)[0]
+
+    def publish(self, record, lock=None):
+        """Append a record, raises RecordTooLarge if it doesn't fit in a slot"""
+        payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+        if len(payload) > self.record_size:
+            raise RecordTooLarge(f"{len(payload)} byte record, slots hold {self.record_size}")
+        if lock is not None:
+            with lock:
+                return self._write(payload)
+        return self._write(payload)
+
+    def _write(self, payload):
+        buf = self.shm.buf
+        seq = self.write_seq() + 1
+        offset = self._slot_offset(seq)
+        SLOT_HEADER.pack_into(buf, offset, 0, 0)
+        start = offset + SLOT_HEADER.size
+        buf[start:start + len(payload)] = payload
+        SLOT_HEADER.pack_into(buf, offset, seq, len(payload))
+        struct.pack_into("<Q", buf, WRITE_SEQ_OFFSET, seq)
+        return seq
+
+    def reader(self, consumer=None):
+        """A reader starting at the consumer's saved cursor, or at the next record if consumer is None"""
+        return RingReader(self, consumer)
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class RingReader:
+    """One consumer's position in an EventRing"""
+
+    def __init__(self, ring, consumer=None):
+        if consumer is not None and not 0 <= consumer < MAX_CONSUMERS:
+            raise ValueError(f"consumer must be between 0 and {MAX_CONSUMERS - 1}")
+        self.ring = ring
+        self.consumer = consumer
+        if consumer is None:
+            self.cursor = ring.write_seq()
+        else:
+            self.cursor = struct.unpack_from("<Q", ring.shm.buf, CURSORS_OFFSET + 8 * consumer)[0]
+        self.lost = 0
+
+    def pending(self):
+        return self.ring.write_seq() - self.cursor
+
+    def read(self, limit=256):
+        """Records published since the last read, oldest first"""
+        ring = self.ring
+        buf = ring.shm.buf
+        write_seq = ring.write_seq()
+        if write_seq - self.cursor > ring.capacity:
+            self.lost += write_seq - self.cursor - ring.capacity
+            self.cursor = write_seq - ring.capacity
+        records = []
+        while self.cursor < write_seq and len(records) < limit:
+            seq = self.cursor + 1
+            self.cursor = seq
+            offset = ring._slot_offset(seq)
+            stamped, length = SLOT_HEADER.unpack_from(buf, offset)
+            if stamped != seq:
+                self.lost += 1
+                continue
+            start = offset + SLOT_HEADER.size
+            payload = bytes(buf[start:start + length])
+            if SLOT_HEADER.unpack_from(buf, offset)[0] != seq:
+                # Overwritten while we were copying it
+                self.lost += 1
+                continue
+            records.append(json.loads(payload))
+        return records
+
+    def commit(self):
+        """Save the cursor so a restarted consumer resumes after the records it has handled"""
+        if self.consumer is not None:
+            struct.pack_into("<Q", self.ring.shm.buf, CURSORS_OFFSET + 8 * self.consumer, self.cursor)
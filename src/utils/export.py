@@ -0,0 +1,407 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from importlib.util import find_spec
+
+from utils.focus_sessions import FocusSessionStore
+from utils.json_stream import iter_log
+
+# Rows handed to a writer at a time, what bounds the memory of an export
+CHUNK_SIZE = 10000
+
+FORMATS = ("csv", "parquet", "npz")
+
+# (name, kind) of each dataset's columns; kinds are str, time, float, int and bool
+COLUMNS = {
+    "events": [
+        ("id", "str"), ("timestamp", "time"), ("type", "str"), ("device", "str"),
+        ("window_title", "str"), ("process_name", "str"), ("data", "str"),
+    ],
+    "window_runs": [
+        ("device", "str"), ("start", "time"), ("end", "time"), ("duration", "float"),
+        ("samples", "int"), ("window_title", "str"), ("process_name", "str"),
+    ],
+    "focus_sessions": [
+        ("id", "str"), ("device", "str"), ("start", "time"), ("end", "time"), ("last_seen", "time"),
+        ("duration", "float"), ("description", "str"), ("interruptions", "int"), ("recovered", "bool"),
+    ],
+    "verdicts": [
+        ("timestamp", "time"), ("device", "str"), ("source", "str"), ("window_title", "str"),
+        ("process_name", "str"), ("is_distracted", "bool"), ("reason", "str"), ("timeout", "float"),
+        ("action", "str"), ("strikes", "float"), ("total_tokens", "float"),
+    ],
+}
+DATASETS = tuple(COLUMNS)
+
+WINDOW_TYPES = ("window_info", "window_run")
+VERDICT_TYPES = ("ai_analysis", "warning")
+
+
+def columnar_format():
+    """Parquet when pyarrow is installed, NumPy .npz otherwise"""
+    return "parquet" if find_spec("pyarrow") else "npz"
+
+
+def resolve_format(export_format=None, path=None):
+    """The format to write: given explicitly, "columnar", or taken from the path's extension"""
+    if not export_format and path:
+        export_format = os.path.splitext(path)[1].lstrip(".").lower()
+    if not export_format or export_format == "columnar":
+        return columnar_format()
+    if export_format not in FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}, expected one of {', '.join(FORMATS)}")
+    return export_format
+
+
+def _day(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def _time(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# --- Writers ---
+
+class CsvWriter:
+    """Rows as CSV with a header line; empty cells for missing values, times in ISO format"""
+
+    def __init__(self, f, columns):
+        self.f = f
+        self.writer = csv.writer(f)
+        self.writer.writerow([name for name, _ in columns])
+
+    def write(self, rows):
+        self.writer.writerows(
+            ["" if value is None else value.isoformat() if isinstance(value, datetime) else value for value in row]
+            for row in rows
+        )
+
+    def close(self):
+        pass
+
+
+class ParquetWriter:
+    """Rows as a Parquet file, one row group per chunk"""
+
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {"str": pa.string(), "time": pa.timestamp("us"), "float": pa.float64(),
+                 "int": pa.int64(), "bool": pa.bool_()}
+        self.pa = pa
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        arrays = [self.pa.array(list(values), type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        self.writer.write_batch(self.pa.record_batch(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class NpzWriter:
+    """
+    Rows as a NumPy .npz with one array per column, as np.load reads it.
+
+    A .npz is a zip that can't be appended to, so chunks are spooled to a
+    temporary file per array and copied into the archive on close. Times
+    become datetime64[us] with NaT and floats NaN where a value is missing.
+    A string column is stored as its values' UTF-8 bytes one after another
+    (uint8) plus a "<column>_offsets" int64 array of rows + 1 offsets into
+    them, so one long value doesn't pad every row; npz_strings reads one
+    back as a list.
+    """
+
+    def __init__(self, path, columns):
+        import numpy as np
+
+        self.np = np
+        self.path = path
+        self.columns = columns
+        self.rows = 0
+        self.spool_dir = tempfile.mkdtemp(prefix="screen-nanny-npz-")
+        self.spools = [open(os.path.join(self.spool_dir, f"{i}.spool"), "wb") for i in range(len(columns))]
+        # End offset of each string value, and the bytes written so far, per string column
+        self.offset_spools = {i: open(os.path.join(self.spool_dir, f"{i}.offsets"), "wb")
+                              for i, (_, kind) in enumerate(columns) if kind == "str"}
+        self.string_bytes = [0] * len(columns)
+
+    def _array(self, kind, values):
+        np = self.np
+        if kind == "time":
+            return np.array([value or np.datetime64("NaT") for value in values], dtype="datetime64[us]")
+        if kind == "float":
+            return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        if kind == "int":
+            return np.array([value or 0 for value in values], dtype=np.int64)
+        return np.array([bool(value) for value in values], dtype=np.bool_)
+
+    def write(self, rows):
+        np = self.np
+        for i, ((_, kind), values) in enumerate(zip(self.columns, zip(*rows))):
+            if kind == "str":
+                encoded = [b"" if value is None else str(value).encode("utf-8") for value in values]
+                self.spools[i].write(b"".join(encoded))
+                ends = np.cumsum([len(value) for value in encoded], dtype=np.int64) + self.string_bytes[i]
+                ends.tofile(self.offset_spools[i])
+                self.string_bytes[i] = int(ends[-1])
+            else:
+                self._array(kind, values).tofile(self.spools[i])
+        self.rows += len(rows)
+
+    def close(self):
+        np = self.np
+        try:
+            with zipfile.ZipFile(self.path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+                for i, (name, kind) in enumerate(self.columns):
+                    self.spools[i].close()
+                    if kind != "str":
+                        dtype = self._array(kind, []).dtype
+                        self._write_array(archive, name, dtype, (self.rows,), [f"{i}.spool"])
+                        continue
+                    self.offset_spools[i].close()
+                    self._write_array(archive, name, np.dtype(np.uint8), (self.string_bytes[i],), [f"{i}.spool"])
+                    with open(os.path.join(self.spool_dir, "zero.offsets"), "wb") as zero:
+                        np.zeros(1, dtype=np.int64).tofile(zero)
+                    self._write_array(archive, f"{name}_offsets", np.dtype(np.int64), (self.rows + 1,),
+                                      ["zero.offsets", f"{i}.offsets"])
+        finally:
+            for spool in self.spools + list(self.offset_spools.values()):
+                spool.close()
+            for name in os.listdir(self.spool_dir):
+                os.remove(os.path.join(self.spool_dir, name))
+            os.rmdir(self.spool_dir)
+
+    def _write_array(self, archive, name, dtype, shape, spool_names):
+        """One .npy member whose data is the spools' contents, copied a block at a time"""
+        with archive.open(f"{name}.npy", "w", force_zip64=True) as out:
+            self.np.lib.format.write_array_header_1_0(
+                out, {"descr": self.np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": shape})
+            for spool_name in spool_names:
+                with open(os.path.join(self.spool_dir, spool_name), "rb") as spool:
+                    while True:
+                        block = spool.read(CHUNK_SIZE * 64)
+                        if not block:
+                            break
+                        out.write(block)
+
+
+def npz_strings(archive, name):
+    """A string column of an .npz export (from np.load) as a list of str"""
+    data = archive[name].tobytes()
+    offsets = archive[f"{name}_offsets"].tolist()
+    return [data[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+
+
+# --- Export ---
+
+class Exporter:
+    """
+    Flattens the activity log into one of DATASETS as CSV, Parquet or .npz.
+
+    - events: every log entry, with window_title/process_name pulled out and
+      the rest of its data as a JSON string
+    - window_runs: stretches of the same window on a device, where a sample
+      lasts until the next event from that device on the same day (the
+      dashboard's rule), including runs already merged by retention
+    - focus_sessions: the focus session records
+    - verdicts: AI analyses and reused verdicts that warned, with the window
+      they were about
+
+    The log is streamed through the offset index, limited to the days
+    between start and end (inclusive, YYYY-MM-DD or dates), and handed to
+    the writer in chunks of chunk_size rows, so memory stays flat however
+    much is exported. types limits the events dataset to those entry types.
+    """
+
+    def __init__(self, log_dir="logs", dataset="events", start=None, end=None, types=None, chunk_size=CHUNK_SIZE):
+        if dataset not in COLUMNS:
+            raise ValueError(f"Unknown dataset: {dataset}, expected one of {', '.join(DATASETS)}")
+        if types and dataset != "events":
+            raise ValueError("Type filters only apply to the events dataset")
+        self.log_dir = log_dir
+        self.log_path = os.path.join(log_dir, "activity_data.json")
+        self.dataset = dataset
+        self.columns = COLUMNS[dataset]
+        self.start = _day(start)
+        self.end = _day(end) + timedelta(days=1) if end else None
+        if self.start and self.end and self.start >= self.end:
+            raise ValueError("The start date must not be after the end date")
+        self.types = set(types) if types else None
+        self.chunk_size = chunk_size
+        self.entries_read = 0
+
+    def _entries(self):
+        """Log entries within the date range, oldest block first"""
+        start = self.start.isoformat() if self.start else None
+        end = self.end.isoformat() if self.end else None
+        for entry in iter_log(self.log_path, start, end):
+            self.entries_read += 1
+            timestamp = entry.get("timestamp") if isinstance(entry, dict) else None
+            if not isinstance(timestamp, str):
+                continue
+            if (start and timestamp < start) or (end and timestamp >= end):
+                continue
+            yield entry
+
+    def rows(self):
+        return getattr(self, f"_{self.dataset}_rows")()
+
+    def chunks(self):
+        """Rows in lists of at most chunk_size"""
+        chunk = []
+        for row in self.rows():
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _events_rows(self):
+        for entry in self._entries():
+            if self.types and entry.get("type") not in self.types:
+                continue
+            data = entry.get("data")
+            data = data if isinstance(data, dict) else {}
+            rest = {key: value for key, value in data.items() if key not in ("window_title", "process_name")}
+            yield (entry.get("id"), _time(entry["timestamp"]), entry.get("type"), entry.get("device", ""),
+                   data.get("window_title"), data.get("process_name"),
+                   json.dumps(rest, separators=(",", ":")) if rest else None)
+
+    def _window_runs_rows(self):
+        runs = {}  # device -> open run
+        pending = {}  # device -> (timestamp, run) of the last sample, credited by the next event
+        for entry in self._entries():
+            ts = _time(entry["timestamp"])
+            if ts is None:
+                continue
+            device = entry.get("device", "")
+            sample = pending.pop(device, None)
+            if sample and sample[0].date() == ts.date() and ts > sample[0]:
+                sample[1]["duration"] += (ts - sample[0]).total_seconds()
+                sample[1]["end"] = max(sample[1]["end"], ts)
+
+            entry_type = entry.get("type")
+            if entry_type not in WINDOW_TYPES:
+                continue
+            data = entry.get("data") or {}
+            key = (data.get("window_title"), data.get("process_name"))
+            run = runs.get(device)
+            if run is None or run["key"] != key or run["start"].date() != ts.date():
+                if run:
+                    yield self._run_row(device, run)
+                run = runs[device] = {"key": key, "start": ts, "end": ts, "duration": 0.0, "samples": 0}
+            if entry_type == "window_info":
+                run["samples"] += 1
+                run["end"] = max(run["end"], ts)
+                pending[device] = (ts, run)
+            else:
+                # Samples already merged by retention, with their time summed up
+                duration = data.get("duration", 0) or 0
+                run["duration"] += duration
+                run["samples"] += data.get("samples", 0) or 0
+                run["end"] = max(run["end"], _time(data.get("last_sample")) or ts, ts + timedelta(seconds=duration))
+        for device, run in sorted(runs.items(), key=lambda item: item[1]["start"]):
+            yield self._run_row(device, run)
+
+    def _run_row(self, device, run):
+        title, process_name = run["key"]
+        return (device, run["start"], run["end"], run["duration"], run["samples"], title, process_name)
+
+    def _focus_sessions_rows(self):
+        store = FocusSessionStore(os.path.join(self.log_dir, "focus_sessions.json"))
+        if not store.load():
+            # No saved sessions, fold the whole log in without writing a store
+            store.autosave = False
+            for entry in iter_log(self.log_path):
+                self.entries_read += 1
+                store.on_event(entry)
+        for session in store.sessions:
+            end = session["end"]
+            # Sessions overlapping the range, like sessions_between but open ended on either side
+            if self.end and session["start"] >= self.end:
+                continue
+            if self.start and (end or session["last_seen"]) < self.start:
+                continue
+            yield (session.get("id"), session.get("device", ""), session["start"], end, session["last_seen"],
+                   (end - session["start"]).total_seconds() if end else None, session.get("description"),
+                   session.get("interruptions", 0), bool(session.get("recovered")))
+
+    def _verdicts_rows(self):
+        windows = {}  # device -> (title, process) of its latest window sample
+        for entry in self._entries():
+            device = entry.get("device", "")
+            data = entry.get("data") or {}
+            entry_type = entry.get("type")
+            if entry_type in WINDOW_TYPES:
+                windows[device] = (data.get("window_title"), data.get("process_name"))
+                continue
+            if entry_type not in VERDICT_TYPES:
+                continue
+            analysis = data.get("analysis") or {}
+            warning = data.get("warning") or {}
+            title, process_name = windows.get(device, (None, None))
+            yield (_time(entry["timestamp"]), device, entry_type, title, process_name,
+                   bool(analysis.get("is_distracted")), analysis.get("reason"), analysis.get("timeout"),
+                   warning.get("action"), warning.get("strikes"),
+                   (data.get("token_usage") or {}).get("total_tokens"))
+
+    def write(self, path, export_format=None):
+        """Export to path, returns stats"""
+        export_format = resolve_format(export_format, path)
+        started = time.perf_counter()
+        stats = {"dataset": self.dataset, "format": export_format, "path": path, "rows": 0, "chunks": 0}
+        if export_format == "csv":
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                self._write_to(CsvWriter(f, self.columns), stats)
+        else:
+            writer_class = ParquetWriter if export_format == "parquet" else NpzWriter
+            module = "pyarrow" if export_format == "parquet" else "numpy"
+            if not find_spec(module):
+                raise ValueError(f"{export_format} export needs {module}, install it or export to csv")
+            self._write_to(writer_class(path, self.columns), stats)
+        stats["bytes"] = os.path.getsize(path)
+        stats["seconds"] = time.perf_counter() - started
+        stats["entries"] = self.entries_read
+        stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+        stats["entries_per_second"] = self.entries_read / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+    def _write_to(self, writer, stats):
+        try:
+            for chunk in self.chunks():
+                writer.write(chunk)
+                stats["rows"] += len(chunk)
+                stats["chunks"] += 1
+        finally:
+            writer.close()
+
+    def iter_csv(self):
+        """The CSV export as text blocks of a chunk each, for streaming responses"""
+        buffer = io.StringIO()
+        writer = CsvWriter(buffer, self.columns)
+        for chunk in self.chunks():
+            writer.write(chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
@@ -0,0 +1,216 @@
+import json
+import os
+import time
+import uuid
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from utils.json_stream import iter_in_time_order
+
+
+def _parse(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+class FocusSessionStore:
+    """
+    Focus sessions as records (start, end, description, interruptions) kept in
+    logs/focus_sessions.json.
+
+    Sessions are built from the focus_mode_start/end events as they are
+    logged, so they survive midnight and restarts. The list is kept sorted by
+    start, and together with the longest session seen so far that gives
+    O(log n) range lookups. An open session's last_seen is refreshed by every
+    event so a crash can be told apart from a quick restart.
+    """
+
+    def __init__(self, path=None, save_interval=60):
+        self.path = path or os.path.join("logs", "focus_sessions.json")
+        self.save_interval = save_interval
+        self.sessions = []
+        self.starts = []
+        self.open = {}  # device -> open session
+        self.max_duration = timedelta()
+        self.last_save = time.monotonic()
+        self.dirty = False
+        self.autosave = True
+
+    # --- Ingestion ---
+
+    def on_event(self, entry):
+        """Logger listener"""
+        try:
+            ts = datetime.fromisoformat(entry["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return
+        device = entry.get("device", "")
+        data = entry.get("data") or {}
+        entry_type = entry.get("type")
+        session = self.open.get(device)
+
+        if entry_type == "focus_mode_start":
+            if session:
+                self._close(session, session["last_seen"])
+            self._start(ts, data.get("description"), device)
+        elif entry_type == "focus_mode_end":
+            if session:
+                end = _parse(data.get("ended_at")) or ts
+                self._close(session, max(end, session["start"]), recovered=bool(data.get("recovered")))
+        elif session:
+            session["last_seen"] = max(session["last_seen"], ts)
+            if self._is_distraction(entry_type, data):
+                session["interruptions"] += 1
+            self.dirty = True
+            if self.autosave and time.monotonic() - self.last_save >= self.save_interval:
+                self.save()
+
+    def _is_distraction(self, entry_type, data):
+        if entry_type == "warning":
+            return True
+        return entry_type == "ai_analysis" and bool((data.get("analysis") or {}).get("is_distracted"))
+
+    def _start(self, ts, description, device=""):
+        session = {
+            "id": uuid.uuid4().hex,
+            "device": device,
+            "start": ts,
+            "end": None,
+            "last_seen": ts,
+            "description": description,
+            "interruptions": 0,
+            "recovered": False,
+        }
+        index = bisect_left(self.starts, ts)
+        self.starts.insert(index, ts)
+        self.sessions.insert(index, session)
+        self.open[device] = session
+        self.dirty = True
+        if self.autosave:
+            self.save()
+
+    def _close(self, session, end, recovered=False):
+        session["end"] = end
+        session["last_seen"] = max(session["last_seen"], end)
+        session["recovered"] = recovered
+        self.max_duration = max(self.max_duration, end - session["start"])
+        self.open.pop(session["device"], None)
+        self.dirty = True
+        if self.autosave:
+            self.save()
+
+    def rebuild(self, entries):
+        """Reset the store and fold in a full history of entries"""
+        self.sessions = []
+        self.starts = []
+        self.open = {}
+        self.max_duration = timedelta()
+        self.autosave = False
+        try:
+            for entry in iter_in_time_order(entries):
+                self.on_event(entry)
+        finally:
+            self.autosave = True
+        self.dirty = True
+
+    # --- Crash recovery ---
+
+    def stale_sessions(self, now, stale_after=900):
+        """Open sessions whose last activity is older than stale_after seconds"""
+        return [
+            session for session in self.open.values()
+            if (now - session["last_seen"]).total_seconds() > stale_after
+        ]
+
+    # --- Queries ---
+
+    def current(self, device=""):
+        return self.open.get(device)
+
+    def sessions_between(self, start, end):
+        """Sessions overlapping [start, end), ordered by start"""
+        lo = bisect_left(self.starts, start - self.max_duration)
+        hi = bisect_left(self.starts, end)
+        found = [
+            session for session in self.sessions[lo:hi]
+            if session["end"] is None or session["end"] > start
+        ]
+        # Open sessions aren't covered by max_duration yet
+        older_open = [session for session in self.open.values() if session["start"] < start - self.max_duration]
+        return sorted(older_open, key=lambda session: session["start"]) + found
+
+    def sessions_on(self, date):
+        day_start = datetime.combine(date, datetime.min.time())
+        return self.sessions_between(day_start, day_start + timedelta(days=1))
+
+    def dates(self):
+        """Dates with at least one session"""
+        days = set()
+        for session in self.sessions:
+            day = session["start"].date()
+            last = (session["end"] or session["last_seen"]).date()
+            while day <= last:
+                days.add(day)
+                day += timedelta(days=1)
+        return sorted(days)
+
+    # --- Persistence ---
+
+    def save(self):
+        """Write the sessions to disk if anything changed"""
+        self.last_save = time.monotonic()
+        if not self.dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.to_state(), f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            print(f"Error saving focus sessions: {e}")
+
+    def to_state(self):
+        """The sessions as plain data"""
+        return {
+            "sessions": [
+                {
+                    **session,
+                    "start": session["start"].isoformat(),
+                    "end": session["end"].isoformat() if session["end"] else None,
+                    "last_seen": session["last_seen"].isoformat(),
+                }
+                for session in self.sessions
+            ],
+        }
+
+    def load(self):
+        """Load sessions from disk, returns False if there is nothing usable to load"""
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        self.load_state(state)
+        self.dirty = False
+        return True
+
+    def load_state(self, state):
+        """Replace the sessions with ones from to_state"""
+        self.sessions = []
+        self.open = {}
+        self.max_duration = timedelta()
+        for raw in state.get("sessions", []):
+            session = {
+                **raw,
+                "start": _parse(raw["start"]),
+                "end": _parse(raw.get("end")),
+                "last_seen": _parse(raw.get("last_seen")) or _parse(raw["start"]),
+            }
+            self.sessions.append(session)
+            if session["end"] is None:
+                self.open[session.get("device", "")] = session
+            else:
+                self.max_duration = max(self.max_duration, session["end"] - session["start"])
+        self.sessions.sort(key=lambda session: session["start"])
+        self.starts = [session["start"] for session in self.sessions]
@@ -0,0 +1,166 @@
+import os
+
+from utils.metrics import metrics
+from utils.scheduler import MonotonicClock
+
+NORMAL = "normal"
+REDUCED = "reduced"
+MINIMAL = "minimal"
+LEVELS = (NORMAL, REDUCED, MINIMAL)
+
+# Averaged fields of SystemMonitor.get_system_metrics
+AVERAGED = ("cpu_percent", "memory_percent", "process_cpu_percent", "process_rss_mb")
+
+
+class ResourceGovernor:
+    """
+    Scales back the monitor's optional work while the machine, or the monitor
+    itself, is under pressure, and restores it afterwards.
+
+    Every sample_interval seconds it reads get_system_metrics (psutil's
+    non-blocking counters, so a sample never sleeps) and folds it into an
+    exponential moving average. The averages decide the level:
+
+    - reduced: system CPU over high_cpu %, memory over high_memory %, or the
+      monitor's RSS over rss_budget MB. No screenshots, AI checks twice as
+      far apart, store flushes and retention passes deferred.
+    - minimal: system CPU over critical_cpu %, or the monitor's own CPU over
+      cpu_budget % of a core, a hard budget. On top of the above, AI checks
+      four times as far apart and sampling at twice the slow interval.
+
+    Pressure raises the level straight away; it comes back down one level at
+    a time once every average has stayed recover_margin under its threshold
+    for recover_after seconds. on_change is called with each change.
+    """
+
+    ANALYZE_MULTIPLIERS = {NORMAL: 1, REDUCED: 2, MINIMAL: 4}
+    SAMPLE_MULTIPLIERS = {NORMAL: 1, REDUCED: 1, MINIMAL: 2}
+    FLUSH_MULTIPLIERS = {NORMAL: 1, REDUCED: 5, MINIMAL: 10}
+
+    def __init__(self, sample, clock=None, on_change=None, sample_interval=5, smoothing=0.3,
+                 cpu_budget=10, rss_budget=300, high_cpu=85, critical_cpu=95, high_memory=90,
+                 recover_margin=10, recover_after=60):
+        self.sample = sample
+        self.clock = clock or MonotonicClock()
+        self.on_change = on_change
+        self.sample_interval = sample_interval
+        self.smoothing = smoothing
+        self.cpu_budget = cpu_budget
+        self.rss_budget = rss_budget
+        self.high_cpu = high_cpu
+        self.critical_cpu = critical_cpu
+        self.high_memory = high_memory
+        self.recover_margin = recover_margin
+        self.recover_after = recover_after
+
+        self.level = NORMAL
+        self.reason = None
+        self.averages = {}
+        self.last_sample_at = None
+        self.calm_since = None
+        self.primed = False
+        metrics.register_collector(self._collect_metrics)
+
+    @classmethod
+    def from_env(cls, sample, **kwargs):
+        """Budgets from SCREEN_NANNY_CPU_BUDGET (% of a core, default 10) and SCREEN_NANNY_RSS_BUDGET_MB (default 300)"""
+        return cls(
+            sample,
+            cpu_budget=float(os.getenv("SCREEN_NANNY_CPU_BUDGET", "10")),
+            rss_budget=float(os.getenv("SCREEN_NANNY_RSS_BUDGET_MB", "300")),
+            **kwargs
+        )
+
+    def update(self):
+        """Sample if one is due and re-evaluate the level, returns the level"""
+        now = self.clock.now()
+        if self.last_sample_at is not None and now - self.last_sample_at < self.sample_interval:
+            return self.level
+        self.last_sample_at = now
+        try:
+            sample = self.sample()
+        except Exception as e:
+            print(f"Error sampling system metrics: {e}")
+            return self.level
+        if not self.primed:
+            # psutil's first CPU reading covers everything since startup, it only sets the baseline
+            self.primed = True
+            return self.level
+        for key in AVERAGED:
+            value = sample.get(key)
+            if value is None:
+                continue
+            previous = self.averages.get(key)
+            self.averages[key] = value if previous is None else previous + self.smoothing * (value - previous)
+
+        target, reason = self._target(0)
+        if LEVELS.index(target) > LEVELS.index(self.level):
+            self.calm_since = None
+            self._set_level(target, reason)
+        elif LEVELS.index(self._target(self.recover_margin)[0]) < LEVELS.index(self.level):
+            if self.calm_since is None:
+                self.calm_since = now
+            elif now - self.calm_since >= self.recover_after:
+                self.calm_since = now
+                self._set_level(LEVELS[LEVELS.index(self.level) - 1], "recovered")
+        else:
+            self.calm_since = None
+        return self.level
+
+    def _target(self, margin):
+        """(level, reason) the averages call for, with every threshold lowered by margin"""
+        averages = self.averages
+        if averages.get("process_cpu_percent", 0) > self.cpu_budget - margin * self.cpu_budget / 100:
+            return MINIMAL, "self_cpu"
+        cpu = averages.get("cpu_percent", 0)
+        if cpu > self.critical_cpu - margin:
+            return MINIMAL, "system_cpu"
+        if cpu > self.high_cpu - margin:
+            return REDUCED, "system_cpu"
+        if averages.get("memory_percent", 0) > self.high_memory - margin:
+            return REDUCED, "memory"
+        if averages.get("process_rss_mb", 0) > self.rss_budget - margin * self.rss_budget / 100:
+            return REDUCED, "self_rss"
+        return NORMAL, None
+
+    def _set_level(self, level, reason):
+        previous = self.level
+        self.level = level
+        self.reason = reason
+        metrics.counter("throttle_changes_total", "Governor level changes", level=level).inc()
+        if self.on_change:
+            self.on_change(level, previous, reason)
+
+    def state(self):
+        """The level and the averages behind it, as logged with throttle events"""
+        return {
+            "level": self.level,
+            "reason": self.reason,
+            **{key: round(value, 1) for key, value in self.averages.items()},
+        }
+
+    # --- What the level allows ---
+
+    def allows_screenshots(self):
+        return self.level == NORMAL
+
+    def defer_background(self):
+        """Whether work that can wait (store flushes, retention) should"""
+        return self.level != NORMAL
+
+    @property
+    def analyze_multiplier(self):
+        return self.ANALYZE_MULTIPLIERS[self.level]
+
+    @property
+    def sample_multiplier(self):
+        return self.SAMPLE_MULTIPLIERS[self.level]
+
+    @property
+    def flush_multiplier(self):
+        return self.FLUSH_MULTIPLIERS[self.level]
+
+    def _collect_metrics(self):
+        gauges = [("governor_level", LEVELS.index(self.level), {})]
+        gauges.extend((f"governor_avg_{key}", value, {}) for key, value in self.averages.items())
+        return gauges
@@ -0,0 +1,383 @@
+import codecs
+import heapq
+import json
+import os
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+from utils.metrics import metrics
+
+READ_CHUNK_SIZE = 64 * 1024
+# Entries per block of the offset index
+INDEX_BLOCK_SIZE = 1000
+# Entries held back to put a log that is almost in time order (concurrent writers) back in order
+REORDER_BUFFER_SIZE = 1000
+
+
+def _byte_length(text, is_ascii):
+    return len(text) if is_ascii else len(text.encode("utf-8"))
+
+
+def _is_day(text):
+    try:
+        date.fromisoformat(text)
+        return True
+    except ValueError:
+        return False
+
+
+def iter_json_array_offsets(path, start=0, strict=True, chunk_size=READ_CHUNK_SIZE, stop=None):
+    """
+    Yield (byte offset, element) for the elements of a top-level JSON array.
+
+    Only a chunk and the element being decoded are held in memory. start is
+    the offset of an element (from an earlier pass or an ArrayIndex) to
+    resume from. stop is an offset just past an element, e.g. from
+    find_array_end, to read no further than; appends only write after it.
+    With strict=False a cut-off last element, as left by an append in
+    progress, ends the array instead of raising ValueError.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+
+    def read(f):
+        if stop is None:
+            return f.read(chunk_size)
+        return f.read(max(0, min(chunk_size, stop - f.tell())))
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        buffer = ""
+        is_ascii = True
+        pos = 0
+        # Offset of buffer[0], and of buffer[counted] as counted is moved forward
+        base = start
+        counted = 0
+        counted_offset = start
+        started = start > 0
+        eof = False
+        while True:
+            # Skip whitespace and separators between elements
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer) and not eof:
+                chunk = read(f)
+                base += _byte_length(buffer[:pos], is_ascii)
+                buffer = buffer[pos:] + utf8.decode(chunk, final=not chunk)
+                is_ascii = buffer.isascii()
+                pos = counted = 0
+                counted_offset = base
+                eof = not chunk
+                continue
+            if pos >= len(buffer):
+                return
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"{path} does not contain a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    if strict:
+                        raise
+                    return
+                # The element is cut off at the end of the buffer, read more
+                chunk = read(f)
+                base += _byte_length(buffer[:pos], is_ascii)
+                buffer = buffer[pos:] + utf8.decode(chunk, final=not chunk)
+                is_ascii = buffer.isascii()
+                pos = counted = 0
+                counted_offset = base
+                eof = not chunk
+                continue
+            counted_offset += _byte_length(buffer[counted:pos], is_ascii)
+            counted = pos
+            yield counted_offset, item
+            pos = end
+
+
+def iter_json_array(path, start=0, strict=True, chunk_size=READ_CHUNK_SIZE, stop=None):
+    """Yield the elements of a top-level JSON array one at a time"""
+    for _, item in iter_json_array_offsets(path, start, strict, chunk_size, stop):
+        yield item
+
+
+def find_array_end(f):
+    """Offset just past the array's last element (or its opening bracket), and whether the array is empty"""
+    end = f.seek(0, os.SEEK_END)
+    tail = b""
+    position = end
+    while position > 0:
+        step = min(4096, position)
+        position -= step
+        f.seek(position)
+        tail = f.read(step) + tail
+        stripped = tail.rstrip()
+        if not stripped:
+            continue
+        if not stripped.endswith(b"]"):
+            raise ValueError("JSON log does not end with ']'")
+        before = stripped[:-1].rstrip()
+        if before or position == 0:
+            return position + len(before), before.endswith(b"[")
+    raise ValueError("JSON log is empty")
+
+
+def _repair_array_end(f, path):
+    """
+    Cut a log that lost its closing bracket (a crash mid-append) back to its
+    last complete element and close it again. Returns what find_array_end
+    would for the repaired file.
+    """
+    last = None
+    for last, _ in iter_json_array_offsets(path, strict=False):
+        pass
+    if last is None:
+        f.seek(0)
+        head = f.read(READ_CHUNK_SIZE)
+        end = head.find(b"[") + 1
+        if end == 0:
+            raise ValueError(f"{path} does not contain a JSON array")
+        empty = True
+    else:
+        f.seek(last)
+        text = f.read().decode("utf-8", errors="replace")
+        _, length = json.JSONDecoder().raw_decode(text)
+        end = last + len(text[:length].encode("utf-8"))
+        empty = False
+    size = f.seek(0, os.SEEK_END)
+    f.truncate(end)
+    f.seek(end)
+    f.write(b"\n]")
+    f.flush()
+    print(f"Repaired {path}: dropped {size - end} bytes after the last complete entry")
+    metrics.counter("log_repairs_total", "Logs closed again after losing their closing bracket").inc()
+    return end, empty
+
+
+def append_to_json_array(path, entries):
+    """
+    Append entries to a JSON array file in place, creating it if needed.
+
+    Only the closing bracket is overwritten, so an append costs the size of the
+    entries instead of the size of the file. Entries are written in the same
+    layout as the retention rewrite, one per line. Returns the byte offset of
+    the last entry written, or None if there were none.
+    """
+    lines = ",\n  ".join(json.dumps(entry) for entry in entries).encode("utf-8")
+    if not lines:
+        return None
+    last_length = len(json.dumps(entries[-1]).encode("utf-8"))
+    try:
+        f = open(path, "r+b")
+    except FileNotFoundError:
+        with open(path, "wb") as f:
+            f.write(b"[\n  " + lines + b"\n]")
+        return 4 + len(lines) - last_length
+    with f:
+        try:
+            end, empty = find_array_end(f)
+        except ValueError:
+            if f.seek(0, os.SEEK_END) != 0:
+                end, empty = _repair_array_end(f, path)
+                lines = (b"\n  " if empty else b",\n  ") + lines
+            else:
+                end, empty = 0, True
+                lines = b"[\n  " + lines
+        else:
+            lines = (b"\n  " if empty else b",\n  ") + lines
+        f.seek(end)
+        # Entries and the new closing bracket go out in one write, a reader rarely sees them half written
+        f.write(lines + b"\n]")
+        f.truncate()
+    return end + len(lines) - last_length
+
+
+class ArrayIndex:
+    """
+    Sparse offset index of a JSON array log, kept in a sidecar file next to it.
+
+    Every INDEX_BLOCK_SIZE entries make a block, recorded with its byte
+    offset, earliest and latest timestamp and the days it has entries for.
+    That is enough to start reading at the first block that can hold entries
+    from a given time and stop at the first block after which every entry is
+    later than another, without assuming the log is sorted. Available days
+    come from the index without reading the log.
+
+    The index is extended from the last block whenever the log has grown, and
+    rebuilt if the log was replaced (retention, merges) since it was written.
+    """
+
+    def __init__(self, path, block_size=INDEX_BLOCK_SIZE):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.block_size = block_size
+        self.blocks = []  # [offset, count, min timestamp, max timestamp, days]
+        self.identity = None
+        self.indexed_size = 0
+
+    def _identity(self, stat):
+        return [stat.st_ino, stat.st_dev]
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if state.get("block_size") == self.block_size:
+            self.blocks = state.get("blocks", [])
+            self.identity = state.get("identity")
+            self.indexed_size = state.get("indexed_size", 0)
+
+    def _save(self):
+        state = {
+            "block_size": self.block_size,
+            "identity": self.identity,
+            "indexed_size": self.indexed_size,
+            "blocks": self.blocks,
+        }
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(state, f, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Error saving log index: {e}")
+
+    def _still_valid(self, stat):
+        if self.identity != self._identity(stat) or stat.st_size < self.indexed_size:
+            return False
+        if not self.blocks:
+            return True
+        # A log rewritten in place would no longer have an entry where the last block starts
+        with open(self.path, "rb") as f:
+            f.seek(self.blocks[-1][0])
+            return f.read(1) == b"{"
+
+    def refresh(self):
+        """Bring the index up to date with the log, returns False if there is no log"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if self.identity is None:
+            self._load()
+        if not self._still_valid(stat):
+            self.blocks = []
+        elif stat.st_size == self.indexed_size:
+            return True
+
+        full_blocks = sum(1 for block in self.blocks if block[1] >= self.block_size)
+        # Re-read the last, partly filled block and carry on from there
+        start = self.blocks.pop()[0] if self.blocks else 0
+        block = None
+        for offset, entry in iter_json_array_offsets(self.path, start, strict=False):
+            if block is None or block[1] >= self.block_size:
+                block = [offset, 0, None, None, []]
+                self.blocks.append(block)
+            self.add_to_block(block, entry)
+
+        self.identity = self._identity(stat)
+        self.indexed_size = stat.st_size
+        if full_blocks != sum(1 for block in self.blocks if block[1] >= self.block_size):
+            self._save()
+        return True
+
+    @staticmethod
+    def add_to_block(block, entry):
+        block[1] += 1
+        timestamp = entry.get("timestamp") if isinstance(entry, dict) else None
+        if not isinstance(timestamp, str):
+            return
+        if block[2] is None or timestamp < block[2]:
+            block[2] = timestamp
+        if block[3] is None or timestamp > block[3]:
+            block[3] = timestamp
+        day = timestamp[:10]
+        if day not in block[4] and _is_day(day):
+            block[4].append(day)
+
+    def offset_range(self, start=None, end=None):
+        """(offset to start reading from, offset to stop at or None) for timestamps in [start, end]"""
+        if not self.blocks:
+            return 0, None
+        first = 0
+        if start:
+            # Latest timestamp before each block, the first block that may hold start comes after those below it
+            latest = []
+            running = ""
+            for block in self.blocks:
+                latest.append(running)
+                running = max(running, block[3] or "")
+            first = max(0, bisect_left(latest, start) - 1)
+        stop = None
+        if end:
+            # Earliest timestamp from each block onwards
+            earliest = [None] * len(self.blocks)
+            running = None
+            for i in range(len(self.blocks) - 1, -1, -1):
+                low = self.blocks[i][2]
+                if low is not None and (running is None or low < running):
+                    running = low
+                earliest[i] = running or "\uffff"
+            last = bisect_right(earliest, end)
+            if last < len(self.blocks):
+                stop = self.blocks[last][0]
+        return self.blocks[first][0], stop
+
+    def days(self):
+        """Days with at least one entry, as YYYY-MM-DD"""
+        found = set()
+        for block in self.blocks:
+            found.update(block[4])
+        return found
+
+
+def iter_log(path, start=None, end=None, index=None):
+    """
+    Yield the entries of a JSON array log that may fall within [start, end].
+
+    start and end are datetimes or ISO strings. The read starts and stops at
+    the blocks of the ArrayIndex (refreshed here unless one is passed in)
+    that bound the range; entries just outside it can still be yielded, so
+    callers filter exactly. A missing log yields nothing.
+    """
+    if not os.path.exists(path):
+        return
+    start = start.isoformat() if hasattr(start, "isoformat") else start
+    end = end.isoformat() if hasattr(end, "isoformat") else end
+    offset, stop = 0, None
+    if start or end:
+        if index is None:
+            index = ArrayIndex(path)
+            index.refresh()
+        offset, stop = index.offset_range(start, end)
+    for entry_offset, entry in iter_json_array_offsets(path, offset, strict=False):
+        if stop is not None and entry_offset >= stop:
+            return
+        yield entry
+
+
+def iter_in_time_order(entries, buffer_size=REORDER_BUFFER_SIZE):
+    """
+    Yield entries by timestamp, holding at most buffer_size of them.
+
+    The log is appended in time order apart from entries a few places out
+    (processes logging at the same moment), which a small heap puts back,
+    so rebuilding a store never needs the whole log in memory. An entry
+    more than buffer_size places out is yielded late rather than in order.
+    Entries with equal timestamps keep their log order.
+    """
+    heap = []
+    for seq, entry in enumerate(entries):
+        heapq.heappush(heap, (entry.get("timestamp", ""), seq, entry))
+        if len(heap) > buffer_size:
+            yield heapq.heappop(heap)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
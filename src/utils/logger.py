@@ -1,78 +1,99 @@
 import json
 import logging
+import logging.handlers
+import threading
 from datetime import datetime
 import os
+import uuid
+
+from utils.json_stream import append_to_json_array, iter_log
+
+# Days of rotated activity.log files kept next to the current one
+TEXT_LOG_DAYS = 7
 
 class ActivityLogger:
-    def __init__(self, log_dir="logs"):
+    def __init__(self, log_dir="logs", now=None):
         self.log_dir = log_dir
+        # Source of entry timestamps, replays pass one that follows virtual time
+        self.now = now or datetime.now
         os.makedirs(log_dir, exist_ok=True)
         
-        # Set up file logging
-        logging.basicConfig(
-            filename=os.path.join(log_dir, 'activity.log'),
-            level=logging.INFO,
-            format='%(asctime)s - %(message)s'
-        )
+        # Set up file logging, rotated at midnight so old days are deleted
+        if not logging.getLogger().handlers:
+            logging.basicConfig(
+                handlers=[logging.handlers.TimedRotatingFileHandler(
+                    os.path.join(log_dir, 'activity.log'), when='midnight', backupCount=TEXT_LOG_DAYS
+                )],
+                level=logging.INFO,
+                format='%(asctime)s - %(message)s'
+            )
         
         # Set up JSON logging for structured data
         self.json_log_path = os.path.join(log_dir, 'activity_data.json')
+        
+        # Held while the JSON log is written, retention rewrites it under the same lock
+        self.lock = threading.Lock()
+        # Held from writing an entry until the listeners have it, so a state checkpoint sees both or neither
+        self.notify_lock = threading.RLock()
+        # Where the last entry written is in the log: {"identity", "offset", "id"}
+        self.position = None
+        
+        # Callbacks that receive every entry after it is written
+        self.listeners = []
     
-    def log_activity(self, activity_type, data):
-        """Log an activity with its associated data"""
-        timestamp = datetime.now().isoformat()
+    def add_listener(self, callback):
+        """Register a callback that is called with each new log entry"""
+        self.listeners.append(callback)
+    
+    def log_activity(self, activity_type, data, timestamp=None, entry_id=None):
+        """Log an activity with its associated data, stamped now unless it happened elsewhere earlier"""
+        timestamp = timestamp or self.now().isoformat()
         
         # Log to text file
         logging.info(f"{activity_type}: {json.dumps(data)}")
         
         # Log to JSON file
         log_entry = {
+            "id": entry_id or uuid.uuid4().hex,
             "timestamp": timestamp,
             "type": activity_type,
             "data": data
         }
         
-        self._append_to_json(log_entry)
+        with self.notify_lock:
+            with self.lock:
+                self._append_to_json(log_entry)
+            self.notify(log_entry)
+    
+    def notify(self, entry):
+        """Pass an entry to the listeners"""
+        for listener in self.listeners:
+            try:
+                listener(entry)
+            except Exception as e:
+                logging.error(f"Activity listener failed: {str(e)}")
     
     def _append_to_json(self, entry):
         """Append an entry to the JSON log file"""
         try:
-            if os.path.exists(self.json_log_path):
-                with open(self.json_log_path, 'r+') as f:
-                    try:
-                        data = json.load(f)
-                    except json.JSONDecodeError:
-                        data = []
-                    data.append(entry)
-                    f.seek(0)
-                    json.dump(data, f, indent=2)
-            else:
-                with open(self.json_log_path, 'w') as f:
-                    json.dump([entry], f, indent=2)
+            offset = append_to_json_array(self.json_log_path, [entry])
+            stat = os.stat(self.json_log_path)
+            self.position = {"identity": [stat.st_ino, stat.st_dev], "offset": offset, "id": entry["id"]}
         except Exception as e:
             logging.error(f"Failed to write to JSON log: {str(e)}")
 
-    def get_logs(self, start_time=None, end_time=None, activity_type=None):
+    def iter_logs(self, start_time=None, end_time=None, activity_type=None):
         """
-        Retrieve logs within a specified time range and/or activity type
+        Yield logs within a specified time range and/or activity type, reading
+        the log incrementally and only around the time range
         
         Args:
             start_time (datetime, optional): Start time for filtering logs
             end_time (datetime, optional): End time for filtering logs
             activity_type (str, optional): Filter by activity type
-            
-        Returns:
-            list: List of log entries matching the criteria
         """
         try:
-            if not os.path.exists(self.json_log_path):
-                return []
-                
-            with open(self.json_log_path, 'r') as f:
-                logs = json.load(f)
-            
-            filtered_logs = []
-            for log in logs:
+            for log in iter_log(self.json_log_path, start_time, end_time):
                 log_time = datetime.fromisoformat(log['timestamp'])
                 
                 # Apply time filters if specified
@@ -85,10 +106,21 @@ class ActivityLogger:
                 if activity_type and log['type'] != activity_type:
                     continue
                     
-                filtered_logs.append(log)
+                yield log
                 
-            return filtered_logs
-            
         except Exception as e:
             logging.error(f"Failed to read logs: {str(e)}")
-            return []
\ No newline at end of file
+
+    def get_logs(self, start_time=None, end_time=None, activity_type=None):
+        """
+        Retrieve logs within a specified time range and/or activity type
+        
+        Args:
+            start_time (datetime, optional): Start time for filtering logs
+            end_time (datetime, optional): End time for filtering logs
+            activity_type (str, optional): Filter by activity type
+            
+        Returns:
+            list: List of log entries matching the criteria
+        """
+        return list(self.iter_logs(start_time, end_time, activity_type))
@@ -0,0 +1,185 @@
+import hashlib
+import heapq
+import json
+import os
+from pathlib import Path
+
+from utils.focus_sessions import FocusSessionStore
+from utils.json_stream import iter_json_array
+from utils.rollups import RollupStore
+from utils.search_index import SearchIndex
+
+
+def event_id(entry, device):
+    """Return the entry's id, deriving a stable one for entries logged without it"""
+    if entry.get("id"):
+        return entry["id"]
+    payload = json.dumps(
+        [device, entry.get("timestamp"), entry.get("type"), entry.get("data")],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class DeviceSource:
+    """
+    One machine's screen-nanny data, read from a local directory.
+
+    The directory can be a full checkout (logs/activity_data.json and
+    src/db.json), a bare export holding activity_data.json and db.json, or a
+    single exported activity_data.json file.
+    """
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = Path(path)
+
+    @property
+    def activity_path(self):
+        if self.path.is_file():
+            return self.path
+        for candidate in (self.path / "logs" / "activity_data.json", self.path / "activity_data.json"):
+            if candidate.exists():
+                return candidate
+        return None
+
+    @property
+    def db_path(self):
+        if self.path.is_file():
+            return None
+        for candidate in (self.path / "db.json", self.path / "src" / "db.json"):
+            if candidate.exists():
+                return candidate
+        return None
+
+    def iter_events(self):
+        """Yield this device's events tagged with their device and id"""
+        activity_path = self.activity_path
+        if activity_path is None:
+            return
+        for entry in iter_json_array(activity_path):
+            if not isinstance(entry, dict) or "timestamp" not in entry:
+                continue
+            # Entries from an earlier merge keep the device they came from
+            device = entry.get("device", self.name)
+            yield {**entry, "id": event_id(entry, device), "device": device}
+
+    def load_db(self):
+        db_path = self.db_path
+        if db_path is None:
+            return {}
+        try:
+            with open(db_path, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Skipping db for device {self.name}: {e}")
+            return {}
+
+
+class ActivityMerger:
+    """
+    K-way merge of several devices' activity logs into one per-user store.
+
+    Each device log is already in timestamp order, so the merge keeps only one
+    pending entry per device in memory and streams the result to disk. Events
+    are deduplicated by id, which lets the same device or an earlier merged
+    store be ingested again without doubling anything.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = Path(store_dir)
+        self.stats = {"read": 0, "written": 0, "duplicates": 0, "out_of_order": 0, "per_device": {}}
+
+    @property
+    def activity_path(self):
+        return self.store_dir / "logs" / "activity_data.json"
+
+    def merge(self, sources, include_existing=True):
+        """
+        Merge device sources into the store
+
+        Args:
+            sources (list): DeviceSource objects to merge
+            include_existing (bool): Also merge the events already in the store
+
+        Returns:
+            dict: Counts of read, written and duplicate events
+        """
+        sources = list(sources)
+        if include_existing and self.activity_path.exists():
+            sources.append(DeviceSource("merged", self.activity_path))
+
+        os.makedirs(self.activity_path.parent, exist_ok=True)
+        rollups = RollupStore(str(self.store_dir / "logs" / "rollups.json"), flush_interval=float("inf"))
+        focus_sessions = FocusSessionStore(str(self.store_dir / "logs" / "focus_sessions.json"))
+        focus_sessions.autosave = False
+        search_index = SearchIndex(str(self.store_dir / "logs" / "search_index.json"), flush_interval=float("inf"))
+        tmp_path = str(self.activity_path) + ".tmp"
+
+        streams = [self._counted(source) for source in sources]
+        merged = heapq.merge(*streams, key=lambda entry: entry["timestamp"])
+
+        # Duplicates share a timestamp, so only ids at the current one are kept
+        current_timestamp = None
+        seen_ids = set()
+        last_timestamp = ""
+        with open(tmp_path, "w") as out:
+            out.write("[")
+            first = True
+            for entry in merged:
+                if entry["timestamp"] != current_timestamp:
+                    current_timestamp = entry["timestamp"]
+                    seen_ids = set()
+                if entry["id"] in seen_ids:
+                    self.stats["duplicates"] += 1
+                    continue
+                seen_ids.add(entry["id"])
+                if entry["timestamp"] < last_timestamp:
+                    self.stats["out_of_order"] += 1
+                last_timestamp = entry["timestamp"]
+
+                out.write("\n  " if first else ",\n  ")
+                out.write(json.dumps(entry))
+                first = False
+                rollups.add_event(entry)
+                focus_sessions.on_event(entry)
+                search_index.add_event(entry)
+                self.stats["written"] += 1
+            out.write("\n]")
+        os.replace(tmp_path, self.activity_path)
+
+        rollups.dirty = True
+        rollups.flush()
+        focus_sessions.dirty = True
+        focus_sessions.save()
+        search_index.dirty = True
+        search_index.flush()
+        self._merge_dbs(sources)
+        return self.stats
+
+    def _counted(self, source):
+        count = 0
+        for entry in source.iter_events():
+            count += 1
+            self.stats["read"] += 1
+            yield entry
+        self.stats["per_device"][source.name] = count
+
+    def _merge_dbs(self, sources):
+        """Keep each device's db.json side by side under its device name"""
+        db_path = self.store_dir / "db.json"
+        try:
+            with open(db_path, "r") as f:
+                merged = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            merged = {}
+        devices = merged.setdefault("devices", {})
+        for source in sources:
+            if source.name == "merged":
+                continue
+            db = source.load_db()
+            if db:
+                devices[source.name] = db
+        with open(db_path, "w") as f:
+            json.dump(merged, f, indent=2)
@@ -0,0 +1,274 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+PREFIX = "screen_nanny_"
+
+# Latency buckets in seconds, from sub-millisecond loop work up to slow API calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _metric_key(name, labels):
+    if not labels:
+        return name
+    rendered = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """Fixed-bucket histogram that also keeps recent samples for percentiles"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, reservoir_size=1024):
+        self.bounds = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=reservoir_size)
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def time(self):
+        return _Timer(self)
+
+    def percentile(self, fraction):
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def snapshot(self):
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.bounds + ("+Inf",), self.bucket_counts):
+            running += count
+            cumulative.append([bound, running])
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": cumulative,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+        }
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NullMetric:
+    """Stands in for every metric type when metrics are disabled"""
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_METRIC = _NullMetric()
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges and histograms.
+
+    Metrics are looked up by name (plus optional labels) and created on first
+    use. When the registry is disabled every lookup returns the same no-op
+    object, so instrumented code only pays for a method call.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.metrics = {}
+        self.types = {}
+        self.help = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, help_text, labels, factory):
+        if not self.enabled:
+            return NULL_METRIC
+        key = _metric_key(PREFIX + name, labels)
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self.metrics.get(key)
+                if metric is None:
+                    metric = factory()
+                    self.metrics[key] = metric
+                    self.types[PREFIX + name] = kind
+                    if help_text:
+                        self.help[PREFIX + name] = help_text
+        return metric
+
+    def counter(self, name, help_text="", **labels):
+        return self._get("counter", name, help_text, labels, Counter)
+
+    def gauge(self, name, help_text="", **labels):
+        return self._get("gauge", name, help_text, labels, Gauge)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS, **labels):
+        return self._get("histogram", name, help_text, labels, lambda: Histogram(buckets))
+
+    def timer(self, name, help_text="", **labels):
+        """Context manager that records the elapsed seconds into a histogram"""
+        if not self.enabled:
+            return NULL_METRIC
+        return self.histogram(name, help_text, **labels).time()
+
+    def register_collector(self, collector):
+        """
+        Register a callable polled on snapshot. It returns {gauge_name: value}
+        or a list of (gauge_name, value, labels_dict) tuples.
+        """
+        self.collectors.append(collector)
+
+    def snapshot(self):
+        """Return all metrics as plain data"""
+        if self.enabled:
+            for collector in self.collectors:
+                try:
+                    collected = collector()
+                    if isinstance(collected, dict):
+                        collected = [(name, value, {}) for name, value in collected.items()]
+                    for name, value, labels in collected:
+                        self.gauge(name, **labels).set(value)
+                except Exception as e:
+                    self.counter("collector_errors_total").inc()
+                    print(f"Metrics collector failed: {e}")
+
+        snapshot = {"timestamp": datetime.now().isoformat(), "counters": {}, "gauges": {}, "histograms": {}}
+        for key, metric in list(self.metrics.items()):
+            if isinstance(metric, Histogram):
+                snapshot["histograms"][key] = metric.snapshot()
+            elif isinstance(metric, Counter):
+                snapshot["counters"][key] = metric.value
+            else:
+                snapshot["gauges"][key] = metric.value
+        snapshot["types"] = dict(self.types)
+        snapshot["help"] = dict(self.help)
+        return snapshot
+
+    def compact_snapshot(self):
+        """Smaller snapshot for the activity log: totals and latency percentiles only"""
+        snapshot = self.snapshot()
+        return {
+            "counters": snapshot["counters"],
+            "gauges": snapshot["gauges"],
+            "histograms": {
+                key: {field: round(hist[field], 6) for field in ("count", "p50", "p99")}
+                for key, hist in snapshot["histograms"].items()
+            },
+        }
+
+    def write_snapshot(self, path):
+        """Write the snapshot to a file other processes (the dashboard) can read"""
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.snapshot(), f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing metrics snapshot: {e}")
+
+
+def _split_key(key):
+    """Split 'name{a="b"}' into ('name', 'a="b"')"""
+    name, _, labels = key.partition("{")
+    return name, labels.rstrip("}")
+
+
+def _series(name, labels, extra=""):
+    labels = ",".join(part for part in (labels, extra) if part)
+    return f"{name}{{{labels}}}" if labels else name
+
+
+def render_prometheus(snapshot):
+    """Render a snapshot in the Prometheus text exposition format"""
+    lines = []
+    described = set()
+    types = snapshot.get("types", {})
+    help_texts = snapshot.get("help", {})
+
+    def describe(name, kind):
+        if name in described:
+            return
+        described.add(name)
+        if name in help_texts:
+            lines.append(f"# HELP {name} {help_texts[name]}")
+        lines.append(f"# TYPE {name} {types.get(name, kind)}")
+
+    for key, value in sorted(snapshot.get("counters", {}).items()):
+        describe(_split_key(key)[0], "counter")
+        lines.append(f"{key} {value}")
+    for key, value in sorted(snapshot.get("gauges", {}).items()):
+        describe(_split_key(key)[0], "gauge")
+        lines.append(f"{key} {value}")
+
+    histograms = sorted(snapshot.get("histograms", {}).items())
+    for key, hist in histograms:
+        name, labels = _split_key(key)
+        describe(name, "histogram")
+        for bound, count in hist["buckets"]:
+            lines.append(f"{_series(name + '_bucket', labels, 'le=' + json.dumps(str(bound)))} {count}")
+        lines.append(f"{_series(name + '_sum', labels)} {hist['sum']}")
+        lines.append(f"{_series(name + '_count', labels)} {hist['count']}")
+    # Percentiles from the recent-sample reservoir, exported as gauges
+    for key, hist in histograms:
+        name, labels = _split_key(key)
+        describe(name + "_quantile", "gauge")
+        for field, quantile in (("p50", "0.5"), ("p90", "0.9"), ("p99", "0.99")):
+            lines.append(f"{_series(name + '_quantile', labels, 'quantile=' + json.dumps(quantile))} {hist[field]}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+# Shared registry for the monitor process; set SCREEN_NANNY_METRICS=0 to disable
+metrics = MetricsRegistry(enabled=os.getenv("SCREEN_NANNY_METRICS", "1") != "0")
@@ -0,0 +1,300 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from utils.json_stream import find_array_end, iter_json_array
+
+DAY_FORMAT = "%Y-%m-%d"
+
+# Entry types that are only kept as raw samples, then as runs, then only in the rollups
+WINDOW_TYPES = ("window_info", "window_run")
+
+
+class RetentionPolicy:
+    """
+    Ages out the activity log in stages:
+
+    - window_info samples are kept as they are for raw_days,
+    - then merged into window_run entries, one per stretch of the same window
+      within a minute, carrying the time the samples covered,
+    - and after run_days window entries are dropped, leaving only the rollups.
+
+    AI analyses, focus and other events are never touched. A run's duration
+    follows the dashboard's rule (a sample lasts until the next event that
+    day), so per-day totals are the same before and after downsampling.
+
+    How far each stage got is kept in logs/retention.json, so a run only
+    rewrites the log when a new day has aged into a stage.
+
+    The rewrite reads the log up to where it ended when the run started,
+    without holding the logger's lock; the lock is only taken at the end to
+    copy over what was appended meanwhile and swap the files, so appends
+    (and the sampler) are held up for that long rather than the whole pass.
+    """
+
+    def __init__(self, log_dir="logs", raw_days=7, run_days=90, lock=None, rollups=None, now=None):
+        self.log_path = os.path.join(log_dir, "activity_data.json")
+        self.state_path = os.path.join(log_dir, "retention.json")
+        self.raw_days = raw_days
+        self.run_days = max(run_days, raw_days)
+        self.lock = lock or threading.Lock()
+        # Days are only expired once the rollups hold their totals
+        self.rollups = rollups
+        self.now = now or datetime.now
+        self.state = self._load_state()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Stages from SCREEN_NANNY_RAW_DAYS (default 7) and SCREEN_NANNY_RUN_DAYS (default 90)"""
+        return cls(
+            raw_days=int(os.getenv("SCREEN_NANNY_RAW_DAYS", "7")),
+            run_days=int(os.getenv("SCREEN_NANNY_RUN_DAYS", "90")),
+            **kwargs
+        )
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"downsampled_through": "", "expired_through": ""}
+
+    def _save_state(self):
+        try:
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            print(f"Error saving retention state: {e}")
+
+    def cutoffs(self):
+        """(last day to downsample, last day to expire) as YYYY-MM-DD"""
+        today = self.now().date()
+        return (
+            (today - timedelta(days=self.raw_days + 1)).strftime(DAY_FORMAT),
+            (today - timedelta(days=self.run_days + 1)).strftime(DAY_FORMAT),
+        )
+
+    def pending(self):
+        """True if some day has aged into a stage since the last run"""
+        downsample_through, expire_through = self.cutoffs()
+        return (downsample_through > self.state["downsampled_through"]
+                or expire_through > self.state["expired_through"])
+
+    def run(self):
+        """Apply the policy to the log, returns stats or None if there was nothing to do"""
+        if not self.pending() or not os.path.exists(self.log_path):
+            return None
+        downsample_through, expire_through = self.cutoffs()
+        stats = {"entries_before": 0, "entries_after": 0, "runs": 0, "expired": 0,
+                 "bytes_before": 0, "bytes_after": 0, "lock_seconds": 0.0}
+        tmp_path = self.log_path + ".retention"
+        try:
+            # Appends only ever write past the end of the last entry, so everything before it can be read unlocked
+            with self.lock:
+                identity = _identity(self.log_path)
+                with open(self.log_path, "rb") as f:
+                    snapshot_end, _ = find_array_end(f)
+            with open(tmp_path, "w", encoding="utf-8") as out:
+                writer = _ArrayWriter(out)
+                for entry in self._apply(iter_json_array(self.log_path, stop=snapshot_end), downsample_through,
+                                         expire_through, stats):
+                    writer.write(entry)
+
+                locked_at = time.perf_counter()
+                with self.lock:
+                    if _identity(self.log_path) != identity:
+                        raise ValueError("the activity log was replaced during the rewrite")
+                    # Entries logged meanwhile are copied as they are
+                    with open(self.log_path, "rb") as f:
+                        end, _ = find_array_end(f)
+                        stats["bytes_before"] = f.seek(0, os.SEEK_END)
+                        f.seek(snapshot_end)
+                        appended = f.read(end - snapshot_end).lstrip(b", \t\r\n")
+                    if appended:
+                        writer.write_raw(appended.decode("utf-8"))
+                    writer.close()
+                    out.close()
+                    os.replace(tmp_path, self.log_path)
+                stats["lock_seconds"] = time.perf_counter() - locked_at
+        except (OSError, ValueError) as e:
+            print(f"Error applying retention: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+        stats["bytes_after"] = os.path.getsize(self.log_path)
+        self.state["downsampled_through"] = downsample_through
+        self.state["expired_through"] = max(self.state["expired_through"], self._expirable(expire_through))
+        self._save_state()
+        return stats
+
+    def _expirable(self, expire_through):
+        """
+        Last day window samples can be expired through: the latest day up to
+        expire_through with a day rollup, or what was already expired if none
+        is newer. Days without a rollup before it, like days with no activity
+        or with rollups lost, are expired with it.
+        """
+        if self.rollups is None:
+            return expire_through
+        days = self.rollups.levels["day"]
+        covered = self.state["expired_through"]
+        for day in sorted(list(days)):
+            if day > expire_through:
+                break
+            if day > covered:
+                covered = day
+        return covered
+
+    def _apply(self, entries, downsample_through, expire_through, stats):
+        expire_through = self._expirable(expire_through)
+        day = None
+        day_entries = []
+        for entry in entries:
+            stats["entries_before"] += 1
+            entry_day = (entry.get("timestamp") or "")[:10]
+            if entry_day != day:
+                yield from self._flush_day(day_entries, stats)
+                day_entries = []
+                day = entry_day
+
+            if entry_day <= expire_through:
+                if entry.get("type") in WINDOW_TYPES:
+                    stats["expired"] += 1
+                    continue
+            elif self.state["downsampled_through"] < entry_day <= downsample_through:
+                # Buffered until the day ends, its samples are merged into runs
+                day_entries.append(entry)
+                continue
+            stats["entries_after"] += 1
+            yield entry
+        yield from self._flush_day(day_entries, stats)
+
+    def _flush_day(self, entries, stats):
+        downsampled = downsample_day(entries)
+        stats["runs"] += sum(1 for entry in downsampled if entry.get("type") == "window_run")
+        stats["entries_after"] += len(downsampled)
+        return downsampled
+
+
+def _identity(path):
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_dev
+
+
+class _Run:
+    __slots__ = ("key", "entry", "duration", "samples", "last")
+
+    def __init__(self, key, entry):
+        self.key = key
+        self.entry = entry
+        self.duration = timedelta()
+        self.samples = 0
+        self.last = entry["timestamp"]
+
+    def to_entry(self):
+        data = {k: v for k, v in (self.entry.get("data") or {}).items() if k != "timestamp"}
+        data.update({
+            "duration": self.duration.total_seconds(),
+            "samples": self.samples,
+            "last_sample": self.last,
+        })
+        entry = {"id": self.entry.get("id"), "timestamp": self.entry["timestamp"], "type": "window_run", "data": data}
+        if "device" in self.entry:
+            entry["device"] = self.entry["device"]
+        return entry
+
+
+def downsample_day(entries):
+    """Merge one day's window_info samples into window_run entries, other events are kept"""
+    output = []
+    run = None
+    pending = None  # (timestamp, run) of the last sample, credited by the next event
+    for entry in entries:
+        try:
+            ts = datetime.fromisoformat(entry["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            output.append(entry)
+            continue
+        if pending:
+            sample_ts, sample_run = pending
+            if ts > sample_ts:
+                sample_run.duration += ts - sample_ts
+            pending = None
+
+        if entry.get("type") != "window_info":
+            run = None
+            output.append(entry)
+            continue
+
+        data = entry.get("data") or {}
+        key = (entry.get("device"), data.get("window_title"), data.get("process_name"), entry["timestamp"][:16])
+        if run is None or run.key != key:
+            run = _Run(key, entry)
+            output.append(run)
+        run.samples += 1
+        run.last = entry["timestamp"]
+        pending = (ts, run)
+
+    return [item.to_entry() if isinstance(item, _Run) else item for item in output]
+
+
+class _ArrayWriter:
+    """Writes entries as a JSON array, one element at a time"""
+
+    def __init__(self, f):
+        self.f = f
+        self.first = True
+        f.write("[")
+
+    def write(self, entry):
+        self.write_raw(json.dumps(entry))
+
+    def write_raw(self, text):
+        """Already serialized elements, comma separated"""
+        self.f.write("\n  " if self.first else ",\n  ")
+        self.f.write(text)
+        self.first = False
+
+    def close(self):
+        self.f.write("\n]" if not self.first else "]")
+
+
+class RetentionWorker:
+    """
+    Runs a RetentionPolicy on a background thread every interval seconds.
+
+    While defer() returns True (the governor is throttling) a pass is put off
+    and tried again after retry_interval.
+    """
+
+    def __init__(self, policy, interval=3600, defer=None, retry_interval=300):
+        self.policy = policy
+        self.interval = interval
+        self.defer = defer
+        self.retry_interval = retry_interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="retention", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            if self.defer and self.defer():
+                self.stopped.wait(self.retry_interval)
+                continue
+            try:
+                stats = self.policy.run()
+                if stats:
+                    print(f"Retention: {stats['entries_before']} -> {stats['entries_after']} log entries "
+                          f"({stats['runs']} window runs, {stats['expired']} expired)")
+            except Exception as e:
+                print(f"Error in retention worker: {e}")
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
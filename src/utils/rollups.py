@@ -0,0 +1,277 @@
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from utils.json_stream import iter_in_time_order
+
+MINUTE_FORMAT = "%Y-%m-%dT%H:%M"
+HOUR_FORMAT = "%Y-%m-%dT%H"
+DAY_FORMAT = "%Y-%m-%d"
+
+GRANULARITIES = ("minute", "hour", "day", "week")
+
+
+def _empty_bucket():
+    return {"screen": 0.0, "focus": 0.0, "distractions": 0, "analyses": 0, "apps": {}}
+
+
+def _add_to_bucket(bucket, other):
+    """Add the contents of one bucket to another in place"""
+    bucket["screen"] += other.get("screen", 0.0)
+    bucket["focus"] += other.get("focus", 0.0)
+    bucket["distractions"] += other.get("distractions", 0)
+    bucket["analyses"] += other.get("analyses", 0)
+    for app_name, seconds in other.get("apps", {}).items():
+        bucket["apps"][app_name] = bucket["apps"].get(app_name, 0.0) + seconds
+
+
+class RollupStore:
+    """
+    Pre-aggregated activity totals kept at minute, hour and day resolution.
+
+    Events are folded in one at a time as they are logged, so range queries
+    only touch the buckets they cover instead of rescanning the whole log.
+    Window time follows the dashboard's rule: a window_info sample lasts until
+    the next logged event on the same day (from the same device, when events
+    of several machines are merged).
+    """
+
+    # How long each level is kept before it is pruned on flush
+    MINUTE_RETENTION = timedelta(days=2)
+    HOUR_RETENTION = timedelta(days=400)
+
+    def __init__(self, path=None, flush_interval=60):
+        self.path = path or os.path.join("logs", "rollups.json")
+        self.flush_interval = flush_interval
+        self.levels = {"minute": {}, "hour": {}, "day": {}}
+        self.pending_windows = {}  # device -> (timestamp, process_name) awaiting its end
+        self.open_focus_starts = {}  # device -> focus session start
+        self.last_timestamp = None
+        self.last_flush = time.monotonic()
+        self.dirty = False
+
+    # --- Ingestion ---
+
+    def add_event(self, entry):
+        """Fold a single activity log entry into the buckets"""
+        try:
+            ts = datetime.fromisoformat(entry["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return
+
+        device = entry.get("device", "")
+
+        # Close the device's previous window sample at this event
+        pending = self.pending_windows.pop(device, None)
+        if pending:
+            start, process_name = pending
+            if start.date() == ts.date() and ts > start:
+                self._add_span(start, ts, "screen", process_name)
+
+        event_type = entry.get("type")
+        data = entry.get("data") or {}
+
+        if event_type == "window_info":
+            self.pending_windows[device] = (ts, data.get("process_name", "Unknown Process"))
+        elif event_type == "window_run":
+            # Samples merged by retention, with the time they covered already summed up
+            duration = timedelta(seconds=data.get("duration", 0))
+            if duration > timedelta():
+                self._add_span(ts, ts + duration, "screen", data.get("process_name", "Unknown Process"))
+        elif event_type == "ai_analysis":
+            analysis = data.get("analysis") or {}
+            self._bump(ts, "analyses")
+            if analysis.get("is_distracted", False):
+                self._bump(ts, "distractions")
+        elif event_type in ("focus_mode_start", "focus_mode_end"):
+            self.add_focus_event(event_type, device, ts, data)
+
+        self.last_timestamp = ts
+        self.dirty = True
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def add_focus_event(self, event_type, device, ts, data):
+        """Open or close a device's focus session, crediting focus time when it ends"""
+        if event_type == "focus_mode_start":
+            self.open_focus_starts[device] = ts
+        elif event_type == "focus_mode_end" and device in self.open_focus_starts:
+            focus_start = self.open_focus_starts.pop(device)
+            # Sessions closed by crash recovery end where activity stopped, not at restart
+            focus_end = datetime.fromisoformat(data["ended_at"]) if data.get("ended_at") else ts
+            if focus_end > focus_start:
+                self._add_span(focus_start, focus_end, "focus")
+
+    def rebuild(self, entries):
+        """Reset the store and fold in a full history of entries"""
+        self.levels = {"minute": {}, "hour": {}, "day": {}}
+        self.pending_windows = {}
+        self.open_focus_starts = {}
+        self.last_timestamp = None
+        for entry in iter_in_time_order(entries):
+            self.add_event(entry)
+        self.dirty = True
+
+    def _buckets_for(self, ts):
+        return (
+            self._bucket("minute", ts.strftime(MINUTE_FORMAT)),
+            self._bucket("hour", ts.strftime(HOUR_FORMAT)),
+            self._bucket("day", ts.strftime(DAY_FORMAT)),
+        )
+
+    def _bucket(self, level, key):
+        buckets = self.levels[level]
+        if key not in buckets:
+            buckets[key] = _empty_bucket()
+        return buckets[key]
+
+    def _bump(self, ts, field):
+        for bucket in self._buckets_for(ts):
+            bucket[field] += 1
+
+    def _add_span(self, start, end, field, process_name=None):
+        """Spread a duration over every minute bucket it touches"""
+        cursor = start
+        while cursor < end:
+            next_minute = cursor.replace(second=0, microsecond=0) + timedelta(minutes=1)
+            piece_end = min(next_minute, end)
+            seconds = (piece_end - cursor).total_seconds()
+            for bucket in self._buckets_for(cursor):
+                bucket[field] += seconds
+                if process_name is not None:
+                    bucket["apps"][process_name] = bucket["apps"].get(process_name, 0.0) + seconds
+            cursor = piece_end
+
+    # --- Queries ---
+
+    def query(self, start_date, end_date, granularity="day"):
+        """
+        Aggregate buckets between two dates (inclusive)
+
+        Args:
+            start_date (date): First day of the range
+            end_date (date): Last day of the range
+            granularity (str): One of minute, hour, day or week
+
+        Returns:
+            dict: Per-bucket series plus totals for the whole range
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        if end_date < start_date:
+            start_date, end_date = end_date, start_date
+
+        start_key = start_date.strftime(DAY_FORMAT)
+        # The end key is exclusive, so step one day past the last one
+        end_key = (end_date + timedelta(days=1)).strftime(DAY_FORMAT)
+
+        if granularity == "week":
+            series = defaultdict(_empty_bucket)
+            for key, bucket in self._range("day", start_key, end_key):
+                day = datetime.strptime(key, DAY_FORMAT).date()
+                week_start = day - timedelta(days=day.weekday())
+                _add_to_bucket(series[week_start.strftime(DAY_FORMAT)], bucket)
+            series = sorted(series.items())
+        else:
+            series = list(self._range(granularity, start_key, end_key))
+
+        totals = _empty_bucket()
+        for _, bucket in self._range("day", start_key, end_key):
+            _add_to_bucket(totals, bucket)
+
+        return {"series": series, "totals": totals}
+
+    def _range(self, level, start_key, end_key):
+        buckets = self.levels[level]
+        day = datetime.strptime(start_key, DAY_FORMAT)
+        last_day = datetime.strptime(end_key, DAY_FORMAT)
+        if level == "day":
+            while day < last_day:
+                key = day.strftime(DAY_FORMAT)
+                if key in buckets:
+                    yield key, buckets[key]
+                day += timedelta(days=1)
+            return
+        # Finer levels are walked day by day so days without data are skipped
+        step = timedelta(hours=1) if level == "hour" else timedelta(minutes=1)
+        fmt = HOUR_FORMAT if level == "hour" else MINUTE_FORMAT
+        day_buckets = self.levels["day"]
+        while day < last_day:
+            next_day = day + timedelta(days=1)
+            if day.strftime(DAY_FORMAT) in day_buckets:
+                cursor = day
+                while cursor < next_day:
+                    key = cursor.strftime(fmt)
+                    if key in buckets:
+                        yield key, buckets[key]
+                    cursor += step
+            day = next_day
+
+    # --- Persistence ---
+
+    def prune(self, now=None):
+        """Drop fine-grained buckets that are older than their retention"""
+        now = now or datetime.now()
+        minute_cutoff = (now - self.MINUTE_RETENTION).strftime(MINUTE_FORMAT)
+        hour_cutoff = (now - self.HOUR_RETENTION).strftime(HOUR_FORMAT)
+        self.levels["minute"] = {k: v for k, v in self.levels["minute"].items() if k >= minute_cutoff}
+        self.levels["hour"] = {k: v for k, v in self.levels["hour"].items() if k >= hour_cutoff}
+
+    def flush(self):
+        """Write the buckets to disk if anything changed"""
+        self.last_flush = time.monotonic()
+        if not self.dirty:
+            return
+        self.prune()
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.to_state(), f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            print(f"Error saving rollups: {e}")
+
+    def to_state(self):
+        """The buckets and pending spans as plain data"""
+        return {
+            "levels": self.levels,
+            "pending_windows": {
+                device: [start.isoformat(), process_name]
+                for device, (start, process_name) in self.pending_windows.items()
+            },
+            "open_focus_starts": {
+                device: start.isoformat() for device, start in self.open_focus_starts.items()
+            },
+            "last_timestamp": self.last_timestamp.isoformat() if self.last_timestamp else None,
+        }
+
+    def load(self):
+        """Load buckets from disk, returns False if there is nothing to load"""
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        self.load_state(state)
+        self.dirty = False
+        return True
+
+    def load_state(self, state):
+        """Replace the buckets with ones from to_state"""
+        self.levels = state.get("levels", self.levels)
+        for level in ("minute", "hour", "day"):
+            self.levels.setdefault(level, {})
+        self.pending_windows = {
+            device: (datetime.fromisoformat(start), process_name)
+            for device, (start, process_name) in state.get("pending_windows", {}).items()
+        }
+        self.open_focus_starts = {
+            device: datetime.fromisoformat(start)
+            for device, start in state.get("open_focus_starts", {}).items()
+        }
+        last = state.get("last_timestamp")
+        self.last_timestamp = datetime.fromisoformat(last) if last else None
@@ -0,0 +1,134 @@
+import time
+
+from utils.metrics import metrics
+
+
+class MonotonicClock:
+    """Real clock based on time.monotonic"""
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class VirtualClock:
+    """Clock that only moves when slept on or advanced, for tests and replays"""
+
+    def __init__(self, start=0.0):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.current += seconds
+
+    def advance(self, seconds):
+        self.sleep(seconds)
+
+
+class AdaptiveScheduler:
+    """
+    Decides when to sample the active window and when to ask the AI.
+
+    Sampling runs at min_interval right after the window changes and backs off
+    towards max_interval while the same window stays in front. While the user
+    is idle only the cheap idle check runs, every idle_poll_interval, so their
+    return is noticed within a second or so.
+
+    Analysis is driven by window changes instead of wall-clock: a new window is
+    analyzed once it has stayed in front for settle_delay seconds, and the same
+    window is re-checked after analyze_interval if it was judged distracting,
+    or after analyze_interval * calm_multiplier if it was fine.
+
+    Deadlines are kept on a monotonic clock and advanced by whole intervals so
+    the loop does not drift with the time spent doing work.
+    """
+
+    def __init__(self, clock=None, min_interval=1, max_interval=5, idle_poll_interval=1,
+                 stable_after=30, analyze_interval=60, settle_delay=3, calm_multiplier=5):
+        self.clock = clock or MonotonicClock()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_poll_interval = idle_poll_interval
+        self.stable_after = stable_after
+        self.analyze_interval = analyze_interval
+        self.settle_delay = settle_delay
+        self.calm_multiplier = calm_multiplier
+
+        self.interval = min_interval
+        self.last_deadline = self.clock.now()
+        self.idle = False
+        self.current_window = None
+        self.window_since = None
+        self.analyzed_window = None
+        self.last_analysis_at = None
+        self.last_distracted = False
+
+    # --- Events ---
+
+    def on_sample(self, window_key):
+        """Record a window sample, returns True if the window changed"""
+        now = self.clock.now()
+        changed = window_key != self.current_window
+        woke_up = self.idle
+        self.idle = False
+
+        if changed:
+            self.current_window = window_key
+            self.window_since = now
+
+        if changed or woke_up:
+            self.interval = self.min_interval
+        elif now - self.window_since >= self.stable_after:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return changed
+
+    def on_idle(self):
+        """Record that the user is idle, returns True on the transition into idle"""
+        entered = not self.idle
+        self.idle = True
+        self.interval = self.idle_poll_interval
+        return entered
+
+    def on_analyzed(self, is_distracted):
+        """Record the verdict for the current window"""
+        self.analyzed_window = self.current_window
+        self.last_analysis_at = self.clock.now()
+        self.last_distracted = bool(is_distracted)
+
+    # --- Decisions ---
+
+    def analysis_due(self):
+        """Whether the current window should be sent for analysis now"""
+        if self.idle or self.current_window is None:
+            return False
+        now = self.clock.now()
+        if now - self.window_since < self.settle_delay:
+            return False
+        if self.current_window != self.analyzed_window:
+            return True
+        recheck_after = self.analyze_interval
+        if not self.last_distracted:
+            recheck_after *= self.calm_multiplier
+        return now - self.last_analysis_at >= recheck_after
+
+    def time_until_next(self):
+        return max(0.0, self.last_deadline + self.interval - self.clock.now())
+
+    def wait(self):
+        """Sleep until the next deadline, one interval after the previous one, returns how late it woke up"""
+        deadline = self.last_deadline + self.interval
+        self.clock.sleep(deadline - self.clock.now())
+        now = self.clock.now()
+        # How late we woke up compared to the deadline (sleep overshoot, slow ticks)
+        lag = max(0.0, now - deadline)
+        metrics.histogram("tick_lag_seconds", "Lateness of each tick versus its deadline").observe(lag)
+        # If we fell more than a whole interval behind, don't try to catch up
+        self.last_deadline = deadline if now - deadline < self.interval else now
+        return lag
+
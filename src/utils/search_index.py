@@ -0,0 +1,344 @@
+import heapq
+import json
+import os
+import re
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+
+from utils.json_stream import iter_in_time_order
+
+EPOCH = datetime(1970, 1, 1)
+TOKEN_PATTERN = re.compile(r"\w+")
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def _seconds(ts):
+    """Naive datetime as seconds since EPOCH, stored instead of the ISO string"""
+    return (ts - EPOCH).total_seconds()
+
+
+def _datetime(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def _same_day(a, b):
+    """Whether two times in seconds since EPOCH fall on the same (local) day"""
+    return a // 86400 == b // 86400
+
+
+def parse_query(query):
+    """
+    Split a query into clauses of (tokens, prefix), all of which must match.
+
+    Words are matched as whole tokens, word* as a prefix, and "quoted words"
+    (or words joined by punctuation, like screen-nanny) as a phrase.
+    """
+    clauses = []
+    for quoted, word in QUERY_PATTERN.findall(query or ""):
+        text = quoted if quoted else word
+        prefix = not quoted and text.endswith("*")
+        tokens = tokenize(text)
+        if tokens:
+            clauses.append((tokens, prefix))
+    return clauses
+
+
+class SearchIndex:
+    """
+    Inverted index from window_title and process_name tokens to time runs.
+
+    Every distinct (process, title) pair is a document with its own list of
+    runs (start, end, seconds), where a run is a stretch of samples of that
+    window on one day with gaps of at most RUN_GAP seconds. Like the rollups,
+    a sample lasts until the next event from the same device on the same day,
+    and runs are split at midnight the same way. Runs carry cumulative
+    seconds, so the time in a date range is two bisects.
+
+    Events are folded in as they are logged and the index is written to
+    logs/search_index.json; the token postings are rebuilt from the document
+    list on load.
+    """
+
+    RUN_GAP = 60
+
+    def __init__(self, path=None, flush_interval=60):
+        self.path = path or os.path.join("logs", "search_index.json")
+        self.flush_interval = flush_interval
+        self._reset()
+        self.last_flush = time.monotonic()
+        self.dirty = False
+
+    def _reset(self):
+        self.docs = []  # doc id -> (process_name, window_title)
+        self.doc_ids = {}
+        self.doc_tokens = []
+        self.starts = []  # per doc, run starts in seconds since EPOCH
+        self.ends = []
+        self.cumulative = []  # per doc, seconds up to and including each run
+        self.postings = {}  # token -> set of doc ids
+        self.vocabulary = []  # sorted tokens, for prefix queries
+        self.pending = {}  # device -> (timestamp, doc id) of the last window sample
+        self.last_timestamp = None
+
+    # --- Ingestion ---
+
+    def add_event(self, entry):
+        """Logger listener"""
+        try:
+            ts = datetime.fromisoformat(entry["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return
+        device = entry.get("device", "")
+        data = entry.get("data") or {}
+
+        pending = self.pending.pop(device, None)
+        if pending:
+            start, doc_id = pending
+            if start.date() == ts.date() and ts > start:
+                self._add_run(doc_id, _seconds(start), _seconds(ts))
+
+        entry_type = entry.get("type")
+        if entry_type == "window_info":
+            self.pending[device] = (ts, self._doc(data))
+        elif entry_type == "window_run":
+            # Samples merged by retention, with the time they covered already summed up
+            duration = data.get("duration", 0)
+            if duration > 0:
+                start = _seconds(ts)
+                self._add_run(self._doc(data), start, start + duration)
+
+        self.last_timestamp = ts
+        self.dirty = True
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def rebuild(self, entries):
+        """Reset the index and fold in a full history of entries"""
+        self._reset()
+        for entry in iter_in_time_order(entries):
+            self.add_event(entry)
+        self.dirty = True
+
+    def _doc(self, data):
+        key = (data.get("process_name") or "Unknown Process", data.get("window_title") or "")
+        doc_id = self.doc_ids.get(key)
+        if doc_id is None:
+            doc_id = len(self.docs)
+            self.docs.append(key)
+            self.doc_ids[key] = doc_id
+            self.starts.append([])
+            self.ends.append([])
+            self.cumulative.append([])
+            self._index_doc(doc_id)
+        return doc_id
+
+    def _index_doc(self, doc_id):
+        process_name, window_title = self.docs[doc_id]
+        # None keeps phrases from running from the title into the process name
+        tokens = tokenize(window_title) + [None] + tokenize(process_name)
+        self.doc_tokens.append(tokens)
+        for token in tokens:
+            if token is None:
+                continue
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = set()
+                insort(self.vocabulary, token)
+            postings.add(doc_id)
+
+    def _add_run(self, doc_id, start, end, seconds=None):
+        """Add a run of the doc, seconds defaults to its whole length (less for runs merged from gaps)"""
+        starts, ends, cumulative = self.starts[doc_id], self.ends[doc_id], self.cumulative[doc_id]
+        if seconds is None:
+            seconds = end - start
+        if starts and starts[-1] <= start:
+            if start - ends[-1] <= self.RUN_GAP and _same_day(starts[-1], start):
+                ends[-1] = max(ends[-1], end)
+                cumulative[-1] += seconds
+                return
+            starts.append(start)
+            ends.append(end)
+            cumulative.append(cumulative[-1] + seconds)
+            return
+        # Older than the latest run (merged logs): joined to its neighbours the same way,
+        # so the runs don't depend on the order samples arrive in
+        index = bisect_right(starts, start)
+        if index and start - ends[index - 1] <= self.RUN_GAP and _same_day(starts[index - 1], start):
+            index -= 1
+            ends[index] = max(ends[index], end)
+        else:
+            starts.insert(index, start)
+            ends.insert(index, end)
+            cumulative.insert(index, cumulative[index - 1] if index else 0.0)
+        # Later runs still hold totals without it
+        for i in range(index, len(cumulative)):
+            cumulative[i] += seconds
+        while (index + 1 < len(starts) and starts[index + 1] - ends[index] <= self.RUN_GAP
+               and _same_day(starts[index], starts[index + 1])):
+            ends[index] = max(ends[index], ends[index + 1])
+            cumulative[index] = cumulative[index + 1]
+            del starts[index + 1], ends[index + 1], cumulative[index + 1]
+
+    # --- Queries ---
+
+    def _clause_docs(self, tokens, prefix):
+        candidates = None
+        for i, token in enumerate(tokens):
+            if prefix and i == len(tokens) - 1:
+                docs = set()
+                index = bisect_left(self.vocabulary, token)
+                while index < len(self.vocabulary) and self.vocabulary[index].startswith(token):
+                    docs |= self.postings[self.vocabulary[index]]
+                    index += 1
+            else:
+                docs = self.postings.get(token, set())
+            candidates = docs if candidates is None else candidates & docs
+            if not candidates:
+                return set()
+        if len(tokens) > 1:
+            candidates = {doc_id for doc_id in candidates if self._has_phrase(doc_id, tokens, prefix)}
+        return candidates
+
+    def _has_phrase(self, doc_id, tokens, prefix):
+        doc_tokens = self.doc_tokens[doc_id]
+        last = len(tokens) - 1
+        for offset in range(len(doc_tokens) - last):
+            for i, token in enumerate(tokens):
+                doc_token = doc_tokens[offset + i]
+                if doc_token is None:
+                    break
+                if doc_token != token and not (prefix and i == last and doc_token.startswith(token)):
+                    break
+            else:
+                return True
+        return False
+
+    def matching_docs(self, query):
+        clauses = parse_query(query)
+        if not clauses:
+            return set()
+        # Smallest set first, so the intersections stay small
+        found = None
+        for docs in sorted((self._clause_docs(tokens, prefix) for tokens, prefix in clauses), key=len):
+            found = docs if found is None else found & docs
+        return found
+
+    def _range(self, doc_id, lo, hi):
+        """(first run, end run, seconds) for runs starting in [lo, hi)"""
+        starts, cumulative = self.starts[doc_id], self.cumulative[doc_id]
+        first = bisect_left(starts, lo) if lo is not None else 0
+        last = bisect_left(starts, hi) if hi is not None else len(starts)
+        if last <= first:
+            return first, last, 0.0
+        return first, last, cumulative[last - 1] - (cumulative[first - 1] if first else 0.0)
+
+    def search(self, query, start=None, end=None, limit=50, span_limit=20):
+        """
+        Windows matching a query, with their time between two datetimes
+
+        Args:
+            query (str): Words, word* prefixes and "quoted phrases"
+            start (datetime, optional): Only count runs starting at or after this
+            end (datetime, optional): Only count runs starting before this
+            limit (int): Windows to return, longest first
+            span_limit (int): Latest runs to return per window
+
+        Returns:
+            dict: Total seconds, number of matching windows and the top ones with their spans
+        """
+        lo = _seconds(start) if start else None
+        hi = _seconds(end) if end else None
+        totals = []
+        total_seconds = 0.0
+        for doc_id in self.matching_docs(query):
+            first, last, seconds = self._range(doc_id, lo, hi)
+            if seconds > 0:
+                totals.append((seconds, doc_id, first, last))
+                total_seconds += seconds
+
+        matches = []
+        for seconds, doc_id, first, last in heapq.nlargest(limit, totals):
+            process_name, window_title = self.docs[doc_id]
+            starts, ends = self.starts[doc_id], self.ends[doc_id]
+            spans = [
+                {"start": _datetime(starts[i]).isoformat(), "end": _datetime(ends[i]).isoformat()}
+                for i in range(last - 1, max(first, last - span_limit) - 1, -1)
+            ]
+            matches.append({
+                "process_name": process_name,
+                "window_title": window_title,
+                "total_seconds": seconds,
+                "runs": last - first,
+                "spans": spans,
+            })
+        return {"total_seconds": total_seconds, "window_count": len(totals), "matches": matches}
+
+    # --- Persistence ---
+
+    def flush(self):
+        """Write the index to disk if anything changed"""
+        self.last_flush = time.monotonic()
+        if not self.dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.to_state(), f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            print(f"Error saving search index: {e}")
+
+    def to_state(self):
+        """Documents and their runs as plain data, postings are rebuilt from the documents"""
+        runs = []
+        for starts, ends, cumulative in zip(self.starts, self.ends, self.cumulative):
+            previous = 0.0
+            doc_runs = []
+            for start, end, total in zip(starts, ends, cumulative):
+                doc_runs.append([round(start, 3), round(end - start, 3), round(total - previous, 3)])
+                previous = total
+            runs.append(doc_runs)
+        return {
+            "docs": self.docs,
+            "runs": runs,
+            "pending": {
+                device: [start.isoformat(), doc_id] for device, (start, doc_id) in self.pending.items()
+            },
+            "last_timestamp": self.last_timestamp.isoformat() if self.last_timestamp else None,
+        }
+
+    def load(self):
+        """Load the index from disk, returns False if there is nothing to load"""
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        self.load_state(state)
+        self.dirty = False
+        return True
+
+    def load_state(self, state):
+        """Replace the index with one from to_state"""
+        self._reset()
+        for (process_name, window_title), doc_runs in zip(state.get("docs", []), state.get("runs", [])):
+            doc_id = self._doc({"process_name": process_name, "window_title": window_title})
+            total = 0.0
+            for start, length, seconds in doc_runs:
+                total += seconds
+                self.starts[doc_id].append(start)
+                self.ends[doc_id].append(start + length)
+                self.cumulative[doc_id].append(total)
+        self.pending = {
+            device: (datetime.fromisoformat(start), doc_id)
+            for device, (start, doc_id) in state.get("pending", {}).items()
+        }
+        last = state.get("last_timestamp")
+        self.last_timestamp = datetime.fromisoformat(last) if last else None
@@ -41,16 +41,13 @@ class UserStats:
     # ... (rest of your get_most_used_windows function, it should now work correctly with the updated parser)
     # Make sure to keep the debug prints for now, or remove them once you confirm it's working.
     def get_most_used_windows(self, mins_ago: int = 10, count: int = 3):
-        all_logs = self.logger.get_logs()
-        if not all_logs:
-            # print("Debug: No logs returned by logger.get_logs().") # Kept for example
-            return []
-
         now_utc = datetime.now(timezone.utc)
         time_filter_start_utc = now_utc - timedelta(minutes=mins_ago)
 
+        # Only the last few minutes of the log are read, with a minute to spare for the filter below
+        since = datetime.now() - timedelta(minutes=mins_ago + 1)
         all_parsed_window_events = []
-        for log_entry in all_logs:
+        for log_entry in self.logger.iter_logs(start_time=since, activity_type="window_info"):
             if not isinstance(log_entry, dict) or log_entry.get("type") != "window_info":
                 continue
             data = log_entry.get("data")
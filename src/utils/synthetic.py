@@ -0,0 +1,142 @@
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+
+DEFAULT_APPS = {
+    "Code.exe": ["main.py - screen-nanny - Visual Studio Code", "stats.py - screen-nanny - Visual Studio Code",
+                 "README.md - notes - Visual Studio Code"],
+    "chrome.exe": ["Pull requests - GitHub - Google Chrome", "Stack Overflow - Google Chrome",
+                   "YouTube - Google Chrome", "Reddit - Google Chrome", "Python docs - Google Chrome"],
+    "WindowsTerminal.exe": ["Windows PowerShell", "bash"],
+    "Spotify.exe": ["Spotify Premium"],
+    "Discord.exe": ["#general - Discord"],
+    "OUTLOOK.EXE": ["Inbox - Outlook"],
+}
+
+DISTRACTING_WORDS = ("YouTube", "Reddit", "Discord")
+
+
+class SyntheticActivity:
+    """
+    Deterministic generator of activity log entries in the logger's format.
+
+    Produces 1 Hz window_info samples during working hours with idle gaps,
+    an ai_analysis roughly every analyze_interval seconds, and a number of
+    focus sessions per day. The same seed always gives the same history.
+    """
+
+    def __init__(self, days=3, apps=None, title_churn=0.05, focus_sessions_per_day=2,
+                 distraction_rate=0.15, active_hours=8, analyze_interval=60, seed=42, end=None):
+        self.days = days
+        self.apps = apps or DEFAULT_APPS
+        self.title_churn = title_churn
+        self.focus_sessions_per_day = focus_sessions_per_day
+        self.distraction_rate = distraction_rate
+        self.active_hours = active_hours
+        self.analyze_interval = analyze_interval
+        self.seed = seed
+        # History ends just before `end` so "recent" queries have data
+        self.end = end or datetime.now().replace(microsecond=0)
+
+    def _entry(self, rng, ts, activity_type, data):
+        return {
+            "id": uuid.UUID(int=rng.getrandbits(128)).hex,
+            "timestamp": ts.isoformat(),
+            "type": activity_type,
+            "data": data,
+        }
+
+    def _pick_window(self, rng, distracted):
+        names = list(self.apps)
+        if distracted:
+            candidates = [(p, t) for p in names for t in self.apps[p] if any(w in t for w in DISTRACTING_WORDS)]
+            if candidates:
+                return rng.choice(candidates)
+        process_name = rng.choice(names)
+        title = rng.choice(self.apps[process_name])
+        # Title churn: occasionally a one-off title, like a new tab or file
+        if rng.random() < self.title_churn:
+            title = f"{title} ({rng.randrange(10000)})"
+        return process_name, title
+
+    def iter_entries(self):
+        """Yield entries in timestamp order"""
+        rng = random.Random(self.seed)
+        active_seconds = int(self.active_hours * 3600)
+        first_day = (self.end - timedelta(days=self.days - 1)).replace(hour=0, minute=0, second=0)
+
+        for day_index in range(self.days):
+            day = first_day + timedelta(days=day_index)
+            ts = day.replace(hour=9)
+            if day_index == self.days - 1:
+                # Make the last day run up to `end`
+                ts = max(day, self.end - timedelta(seconds=active_seconds))
+            day_end = ts + timedelta(seconds=active_seconds)
+
+            focus_starts = sorted(rng.sample(range(0, max(1, active_seconds - 3600), 60),
+                                             min(self.focus_sessions_per_day, max(1, active_seconds // 3600))))
+            focus_starts = [ts + timedelta(seconds=s) for s in focus_starts]
+            focus_end = None
+
+            process_name, title = self._pick_window(rng, False)
+            pid = rng.randrange(1000, 60000)
+            next_analysis = ts + timedelta(seconds=self.analyze_interval)
+
+            while ts < day_end:
+                if focus_end and ts >= focus_end:
+                    yield self._entry(rng, ts, "focus_mode_end", {})
+                    focus_end = None
+                # A session due while another is still open starts once that one has ended
+                if focus_starts and ts >= focus_starts[0] and not focus_end:
+                    focus_starts.pop(0)
+                    focus_end = ts + timedelta(minutes=rng.randrange(20, 60))
+                    yield self._entry(rng, ts, "focus_mode_start", {"description": "Work on screen-nanny"})
+
+                # Window switches every few minutes on average
+                if rng.random() < 1 / 180:
+                    distracted = rng.random() < self.distraction_rate
+                    process_name, title = self._pick_window(rng, distracted)
+                    pid = rng.randrange(1000, 60000)
+
+                yield self._entry(rng, ts, "window_info", {
+                    "window_title": title,
+                    "process_name": process_name,
+                    "app_name": process_name,
+                    "pid": pid,
+                    "timestamp": ts.isoformat(),
+                })
+
+                if ts >= next_analysis:
+                    is_distracted = any(w in title for w in DISTRACTING_WORDS)
+                    yield self._entry(rng, ts, "ai_analysis", {
+                        "analysis": {
+                            "is_distracted": is_distracted,
+                            "reason": "Synthetic verdict",
+                            "timeout": 10 if is_distracted else 0,
+                        },
+                        "token_usage": {"total_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0},
+                        "analysis_type": "window_title",
+                    })
+                    next_analysis = ts + timedelta(seconds=self.analyze_interval)
+
+                # Occasional idle gap, otherwise the next 1 Hz sample
+                if rng.random() < 1 / 1800:
+                    ts += timedelta(seconds=rng.randrange(60, 900))
+                else:
+                    ts += timedelta(seconds=1)
+
+            if focus_end:
+                yield self._entry(rng, ts, "focus_mode_end", {})
+
+    def write(self, path):
+        """Write the history as a JSON array in ActivityLogger's layout, one entry per line"""
+        count = 0
+        with open(path, "w") as f:
+            f.write("[")
+            for entry in self.iter_entries():
+                f.write("\n  " if count == 0 else ",\n  ")
+                f.write(json.dumps(entry))
+                count += 1
+            f.write("\n]" if count else "]")
+        return count
@@ -0,0 +1,88 @@
+from collections import deque
+
+from utils.scheduler import MonotonicClock
+
+
+class WarningPolicy:
+    """
+    Decides what to do with a distraction verdict before it reaches the modal.
+
+    - Coalesce: a repeat verdict for the window whose lockout is still on
+      screen doesn't restart the modal.
+    - Rate limit: at most one warning every min_warning_gap seconds.
+    - Escalate: each warning shown within escalation_window seconds doubles
+      (escalation_factor) the lockout, up to max_timeout.
+    - Reuse: a distracted verdict for the same window stays valid for
+      verdict_ttl seconds, so sustained distraction doesn't cost an AI call
+      every analyze_interval.
+
+    All state is a fixed-size ring buffer of recent decisions, so nothing is
+    re-read from the activity log.
+    """
+
+    SHOWN = "shown"
+    COALESCED = "coalesced"
+    RATE_LIMITED = "rate_limited"
+    NONE = "none"
+
+    def __init__(self, clock=None, history_size=64, min_warning_gap=30, escalation_window=1800,
+                 escalation_factor=2, default_timeout=10, max_timeout=300, verdict_ttl=300):
+        self.clock = clock or MonotonicClock()
+        self.history = deque(maxlen=history_size)  # (time, window_key, is_distracted, action, timeout)
+        self.min_warning_gap = min_warning_gap
+        self.escalation_window = escalation_window
+        self.escalation_factor = escalation_factor
+        self.default_timeout = default_timeout
+        self.max_timeout = max_timeout
+        self.verdict_ttl = verdict_ttl
+        self.last_verdict = None  # (window_key, analysis, time) of the last AI verdict
+
+    def _last_shown(self):
+        for record in reversed(self.history):
+            if record[3] == self.SHOWN:
+                return record
+        return None
+
+    def strikes(self, now=None):
+        """Warnings shown within the escalation window"""
+        now = self.clock.now() if now is None else now
+        return sum(
+            1 for t, _, _, action, _ in self.history
+            if action == self.SHOWN and now - t <= self.escalation_window
+        )
+
+    def cached_verdict(self, window_key):
+        """The last AI verdict if it was distracted, for this window and still fresh, else None"""
+        if self.last_verdict is None:
+            return None
+        key, analysis, analyzed_at = self.last_verdict
+        if key != window_key or not analysis.get("is_distracted"):
+            return None
+        if self.clock.now() - analyzed_at > self.verdict_ttl:
+            return None
+        return analysis
+
+    def decide(self, window_key, analysis, reused=False):
+        """Record a verdict and return {"action", "timeout", "strikes"}"""
+        now = self.clock.now()
+        is_distracted = bool(analysis.get("is_distracted"))
+        action = self.NONE
+        timeout = 0
+        strikes = self.strikes(now)
+        if not reused:
+            self.last_verdict = (window_key, analysis, now)
+
+        if is_distracted:
+            last = self._last_shown()
+            if last and last[1] == window_key and now < last[0] + last[4]:
+                action = self.COALESCED
+            elif last and now - last[0] < self.min_warning_gap:
+                action = self.RATE_LIMITED
+            else:
+                action = self.SHOWN
+                base = analysis.get("timeout") or self.default_timeout
+                timeout = int(min(self.max_timeout, base * self.escalation_factor ** strikes))
+                strikes += 1
+
+        self.history.append((now, window_key, is_distracted, action, timeout))
+        return {"action": action, "timeout": timeout, "strikes": strikes}
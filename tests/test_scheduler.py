@@ -0,0 +1,131 @@
+import pytest
+
+from utils.scheduler import AdaptiveScheduler, VirtualClock
+
+EDITOR = ("Editor", "code")
+BROWSER = ("Browser", "firefox")
+
+
+@pytest.fixture
+def clock():
+    return VirtualClock()
+
+
+@pytest.fixture
+def scheduler(clock):
+    return AdaptiveScheduler(clock=clock, min_interval=1, max_interval=5, idle_poll_interval=1,
+                             stable_after=3, analyze_interval=60, settle_delay=3, calm_multiplier=5)
+
+
+def run_ticks(clock, scheduler, windows):
+    """Sample each window in turn on its own tick, returns the tick times"""
+    ticks = []
+    for window in windows:
+        ticks.append(clock.now())
+        scheduler.on_sample(window)
+        scheduler.wait()
+    return ticks
+
+
+def gaps(ticks):
+    return [b - a for a, b in zip(ticks, ticks[1:])]
+
+
+def test_first_tick_runs_at_once_and_the_next_a_full_interval_later(clock, scheduler):
+    ticks = run_ticks(clock, scheduler, [EDITOR, EDITOR])
+    assert ticks == [0, 1]
+
+
+def test_backs_off_while_the_window_stays_in_front(clock, scheduler):
+    ticks = run_ticks(clock, scheduler, [EDITOR] * 12)
+    assert gaps(ticks)[:3] == [1, 1, 1]
+    assert all(b >= a for a, b in zip(gaps(ticks), gaps(ticks)[1:]))
+    assert gaps(ticks)[-1] == scheduler.max_interval
+
+
+def test_samples_fast_again_after_a_focus_change(clock, scheduler):
+    run_ticks(clock, scheduler, [EDITOR] * 12)
+    assert scheduler.interval == scheduler.max_interval
+
+    assert scheduler.on_sample(BROWSER)
+    assert scheduler.interval == scheduler.min_interval
+    assert scheduler.time_until_next() <= scheduler.min_interval
+    ticks = run_ticks(clock, scheduler, [BROWSER] * 3)
+    assert gaps(ticks) == [1, 1]
+
+
+def test_polls_idle_quickly_and_wakes_promptly_on_idle_exit(clock, scheduler):
+    run_ticks(clock, scheduler, [EDITOR] * 12)
+    assert scheduler.interval == scheduler.max_interval
+
+    assert scheduler.on_idle()
+    assert not scheduler.on_idle()
+    assert scheduler.time_until_next() <= scheduler.idle_poll_interval
+    scheduler.wait()
+    scheduler.wait()
+
+    # Back on the same window: no change, but sampling is fast again right away
+    assert not scheduler.on_sample(EDITOR)
+    assert not scheduler.idle
+    assert scheduler.interval == scheduler.min_interval
+
+
+def test_wait_does_not_drift_with_time_spent_working(clock, scheduler):
+    scheduler.wait()
+    start = clock.now()
+    for _ in range(5):
+        # Work that takes part of the interval
+        clock.advance(0.3)
+        assert scheduler.wait() == 0
+    assert clock.now() - start == pytest.approx(5 * scheduler.min_interval)
+
+
+def test_wait_reports_lag_and_does_not_catch_up(clock, scheduler):
+    scheduler.wait()
+    clock.advance(3.5)
+    assert scheduler.wait() == pytest.approx(2.5)
+    before = clock.now()
+    scheduler.wait()
+    assert clock.now() - before == scheduler.min_interval
+
+
+def test_analysis_waits_for_the_window_to_settle(clock, scheduler):
+    scheduler.on_sample(EDITOR)
+    assert not scheduler.analysis_due()
+    clock.advance(scheduler.settle_delay)
+    assert scheduler.analysis_due()
+
+
+def test_analysis_is_due_again_on_window_change(clock, scheduler):
+    scheduler.on_sample(EDITOR)
+    clock.advance(scheduler.settle_delay)
+    scheduler.on_analyzed(False)
+    assert not scheduler.analysis_due()
+
+    scheduler.on_sample(BROWSER)
+    assert not scheduler.analysis_due()
+    clock.advance(scheduler.settle_delay)
+    assert scheduler.analysis_due()
+
+
+def test_distracting_window_is_rechecked_sooner_than_a_fine_one(clock, scheduler):
+    scheduler.on_sample(BROWSER)
+    clock.advance(scheduler.settle_delay)
+    scheduler.on_analyzed(True)
+    clock.advance(scheduler.analyze_interval - 1)
+    assert not scheduler.analysis_due()
+    clock.advance(1)
+    assert scheduler.analysis_due()
+
+    scheduler.on_analyzed(False)
+    clock.advance(scheduler.analyze_interval)
+    assert not scheduler.analysis_due()
+    clock.advance(scheduler.analyze_interval * (scheduler.calm_multiplier - 1))
+    assert scheduler.analysis_due()
+
+
+def test_no_analysis_while_idle(clock, scheduler):
+    scheduler.on_sample(EDITOR)
+    clock.advance(scheduler.settle_delay)
+    scheduler.on_idle()
+    assert not scheduler.analysis_due()